@@ -0,0 +1,239 @@
+#adaptive_search.py
+#Adaptive parameter search for the SMA Crossover Strategy (successive halving)
+#instead of running every grid combination over all the data, a random sample of parameter sets
+#runs on a short first slice of the data, only the best 1/eta of them move on to a slice eta
+#times longer, and so on until a handful run over everything. Sets whose interim drawdown or loss
+#is already past the kill limits are dropped at the first rung they show it
+#
+#every rung is a batch of fast backtests spread over the same process pool, shared data and
+#indicator bank as param_sweep.py
+#
+#python adaptive_search.py MT5_GBPUSD_M15_data.csv --candidates 243 --pfast 2:30 --pslow 10:200
+
+import argparse
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import param_sweep
+from fast_backtest import DEFAULT_PARAMS, TREND_PERIOD, VOLUME_PERIOD, load_ohlcv
+from indicator_bank import build_bank, sweep_periods
+from param_sweep import data_key_for, release_data, share_data, summarize_cached
+
+#tuple = (low, high) range (ints if both ends are ints), list = the values to choose from
+DEFAULT_SPACE = {
+    "pfast": (2, 30),
+    "pslow": (10, 200),
+    "risk_per_trade": (0.1, 1.0),
+    "stop_loss_pct": (0.02, 0.5),
+    "take_profit_pct": (0.05, 1.0),
+}
+
+#fewest bars a first-rung slice may have, the slowest average needs room to warm up and trade
+MIN_BARS = 1000
+
+####################################################################################
+
+def sample_params(space, n, seed=None):
+    """n distinct random parameter sets from space (pfast always below pslow)"""
+    rng = np.random.default_rng(seed)
+    names = list(space)
+    seen = set()
+    combos = []
+    #give up once the space is clearly exhausted (small discrete spaces)
+    for _ in range(n * 20):
+        if len(combos) == n:
+            break
+        combo = {}
+        for name in names:
+            values = space[name]
+            if isinstance(values, list):
+                value = values[rng.integers(len(values))]
+            elif isinstance(values[0], int) and isinstance(values[1], int):
+                value = int(rng.integers(values[0], values[1] + 1))
+            else:
+                value = float(rng.uniform(values[0], values[1]))
+            combo[name] = value
+        if combo.get("pfast", 0) >= combo.get("pslow", float("inf")):
+            continue
+        key = tuple(combo.values())
+        if key not in seen:
+            seen.add(key)
+            combos.append(combo)
+    return combos
+
+def rung_bars(n_bars, n_candidates, eta=3, min_bars=MIN_BARS):
+    """Slice length (bars from the start) of every rung, the last one is all the data"""
+    rungs = int(math.log(max(n_candidates, 1), eta) + 1e-9) + 1
+    #no shorter first slice than min_bars
+    rungs = max(1, min(rungs, int(math.log(max(n_bars / min_bars, 1), eta) + 1e-9) + 1))
+    return [int(n_bars / eta ** (rungs - 1 - r)) for r in range(rungs)]
+
+def killed(row, max_drawdown=None, min_return=None, cash=100000.0):
+    """True when an interim result is already past the kill limits"""
+    if max_drawdown is not None and row["max_drawdown"] > max_drawdown:
+        return True
+    if min_return is not None and row["net_pnl"] / cash * 100 < min_return:
+        return True
+    return False
+
+####################################################################################
+
+def _evaluate(data, params, bars, config, data_key=None, bank=None):
+    row = dict(params)
+    #a slice from the start is named by the whole data's key and its length, and the first bars
+    #of a banked SMA are exactly the SMA of the first bars
+    row.update(summarize_cached({name: values[:bars] for name, values in data.items()}, params, config,
+                                None if data_key is None else f"{data_key}[:{bars}]",
+                                {name: line[:bars] for name, line in (bank or {}).items()}))
+    return row
+
+def _run_slice(task):
+    """Worker task - one parameter set over the first bars of the shared data"""
+    params, bars = task
+    return _evaluate(param_sweep._worker_data, params, bars, param_sweep._worker_config,
+                     param_sweep._worker_data_key, param_sweep._worker_bank)
+
+def successive_halving(data, param_sets, eta=3, min_bars=MIN_BARS, workers=None, cash=100000.0,
+                       commission=0.0001, slippage=0.00005, rank_by="sharpe", ascending=False,
+                       kill_drawdown=None, kill_return=None, cache=False):
+    """
+    Run param_sets through successive halving rungs
+
+    Every rung runs the survivors over a longer slice from the start of the data, kills the
+    ones past kill_drawdown (max drawdown %) or below kill_return (% return so far) and keeps
+    the best 1/eta by rank_by. With cache, slices already run with the same parameters are
+    read from the run cache. Returns (final, history): the last rung's table ranked best
+    first (run over all the data) and one row per evaluation with its rung and slice length.
+    """
+    data_key = data_key_for(data) if cache else None
+    if isinstance(data, (str, os.PathLike)):
+        data = load_ohlcv(data)
+
+    param_sets = [dict(p) for p in param_sets]
+    config = dict(cash=cash, commission=commission, slippage=slippage)
+    n_bars = len(data["close"])
+    #the slowest average has to be warm well before the first slice ends
+    slowest = max([p.get("pslow", DEFAULT_PARAMS["pslow"]) for p in param_sets] + [TREND_PERIOD, VOLUME_PERIOD])
+    schedule = rung_bars(n_bars, len(param_sets), eta, max(min_bars, 5 * slowest))
+    workers = workers or os.cpu_count() or 1
+    bank = build_bank(data, sweep_periods(param_sets))
+
+    pool = None
+    blocks = []
+    if workers > 1 and len(param_sets) > 1:
+        spec, blocks = share_data(data)
+        bank_spec, bank_blocks = share_data(bank)
+        blocks += bank_blocks
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=param_sweep._init_worker,
+                                   initargs=(spec, config, data_key, bank_spec))
+
+    history = []
+    survivors = param_sets
+    try:
+        for rung, bars in enumerate(schedule):
+            tasks = [(params, bars) for params in survivors]
+            if pool is None:
+                rows = [_evaluate(data, params, bars, config, data_key, bank) for params, bars in tasks]
+            else:
+                chunksize = max(1, len(tasks) // (workers * 4))
+                rows = list(pool.map(_run_slice, tasks, chunksize=chunksize))
+
+            table = pd.DataFrame(rows)
+            table["rung"] = rung
+            table["bars"] = bars
+            table["killed"] = [killed(row, kill_drawdown, kill_return, cash) for row in rows]
+            table = table.sort_values(rank_by, ascending=ascending, na_position="last").reset_index(drop=True)
+            history.append(table)
+
+            if rung == len(schedule) - 1:
+                break
+            alive = table[~table["killed"] & table[rank_by].notna()]
+            keep = max(1, len(table) // eta)
+            survivors = [{name: row[name] for name in survivors[0]} for row in alive.head(keep).to_dict("records")]
+            if not survivors:
+                break
+    finally:
+        if pool is not None:
+            pool.shutdown()
+            release_data(blocks)
+
+    history = pd.concat(history, ignore_index=True)
+    final = history[history["rung"] == history["rung"].max()]
+    #sets killed on the last rung rank behind every one that made it
+    final = final.sort_values("killed", kind="stable").reset_index(drop=True)
+    return final, history
+
+def compute_saving(history, n_bars):
+    """Bars simulated by the search against running every candidate over all n_bars"""
+    simulated = int(history["bars"].sum())
+    full = int((history["rung"] == 0).sum()) * n_bars
+    return simulated, full
+
+####################################################################################
+
+def _parse_space(text, cast):
+    """"2:30" -> (2, 30) range, "5,8,13" -> [5, 8, 13] choices"""
+    if ":" in text:
+        low, high = text.split(":")
+        return (cast(low), cast(high))
+    return [cast(x) for x in text.split(",") if x.strip()]
+
+if __name__ == "__main__":
+    import time
+
+    from config import load_config
+
+    parser = argparse.ArgumentParser(description="Successive halving parameter search for SmaCrossStrategy")
+    parser.add_argument("data_file", help="MT5_<symbol>_<tf>_data.csv export")
+    parser.add_argument("--candidates", type=int, default=243, help="random parameter sets in the first rung")
+    parser.add_argument("--eta", type=int, default=3, help="keep 1/eta of the sets per rung, slices grow eta times")
+    parser.add_argument("--seed", type=int, default=None)
+    for name, (low, high) in DEFAULT_SPACE.items():
+        parser.add_argument("--" + name.replace("_", "-"), default=f"{low}:{high}",
+                            help="low:high range or comma separated values")
+    parser.add_argument("--kill-drawdown", type=float, default=None, help="drop sets whose interim max drawdown %% exceeds this")
+    parser.add_argument("--kill-return", type=float, default=None, help="drop sets whose interim return %% is below this")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--rank-by", default="sharpe")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--out", default=None, help="save every evaluation to this CSV")
+    parser.add_argument("--db", default=None, help="results database to store the final rung in (default results_db.DB_PATH)")
+    parser.add_argument("--no-cache", action="store_true", help="re-run every slice instead of reading earlier runs from the run cache")
+    args = parser.parse_args()
+
+    space = {}
+    for name, (low, high) in DEFAULT_SPACE.items():
+        space[name] = _parse_space(getattr(args, name), int if isinstance(low, int) else float)
+    candidates = sample_params(space, args.candidates, args.seed)
+
+    settings = load_config()
+    data = load_ohlcv(args.data_file)
+    start = time.perf_counter()
+    final, history = successive_halving(data, candidates, args.eta, workers=args.workers, cash=settings["cash"],
+                                        commission=settings["commission"], slippage=settings["slippage"],
+                                        rank_by=args.rank_by,
+                                        ascending=args.rank_by == "max_drawdown",
+                                        kill_drawdown=args.kill_drawdown, kill_return=args.kill_return,
+                                        cache=not args.no_cache)
+    simulated, full = compute_saving(history, len(data["close"]))
+
+    print("=" * 50)
+    print(f"SUCCESSIVE HALVING ({len(candidates)} sets, {time.perf_counter() - start:.2f}s)")
+    print("=" * 50)
+    for rung, rows in history.groupby("rung"):
+        print(f"rung {rung}: {len(rows)} sets on {rows['bars'].iloc[0]} bars, {int(rows['killed'].sum())} killed")
+    print(f"Bars simulated: {simulated} ({simulated / full * 100:.1f}% of running every set on all the data)")
+    print(final.drop(columns=["rung", "bars", "killed"]).head(args.top).to_string())
+
+    if args.out:
+        history.to_csv(args.out, index=False)
+        print(f"\nEvery evaluation saved to {args.out}")
+
+    from results_db import save_sweep
+    ids = save_sweep(final, list(space), data_file=args.data_file, start_cash=settings["cash"],
+                     source="adaptive", path=args.db)
+    print(f"{len(ids)} runs stored in the results database")
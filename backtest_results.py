@@ -0,0 +1,114 @@
+#backtest_results.py
+#Compact on-disk artifact of one backtest run
+#sma_backtest.py writes it once, visualize_results.py draws the dashboard from it
+#without importing backtrader or re-running cerebro
+
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+
+from data_cache import from_bt_datenum
+from metrics import compute_metrics
+
+#analyzer datetimes are naive bar times, keep them as-is (no local timezone shift)
+EPOCH = datetime(1970, 1, 1)
+
+TRADE_FIELDS = ["open_time", "close_time", "price", "barlen", "pnl", "pnlcomm"]
+TRANSACTION_FIELDS = ["time", "size", "price", "value"]
+
+####################################################################################
+
+def results_path(symbol, timeframe, results_dir="."):
+    """Where the artifact for a symbol/timeframe lives"""
+    return os.path.join(results_dir, f"backtest_results_{symbol}_{timeframe}.npz")
+
+def to_plain(value):
+    """Analyzer output (AutoOrderedDicts, numpy scalars) -> plain JSON friendly values"""
+    if isinstance(value, dict):
+        return {str(k): to_plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_plain(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+def collect_results(strat, symbol, timeframe):
+    """Pull everything the dashboard needs out of a finished strategy"""
+    analyzers = {}
+    transactions = []
+    trades = None
+    recorded = {}
+    for name, analyzer in zip(strat.analyzers.getnames(), strat.analyzers):
+        analysis = analyzer.get_analysis()
+        if name == "equity":
+            #EquityRecorder arrays - one row per bar
+            recorded = analysis
+        elif name == "trades":
+            #spill.TradeSpill - rows already in TRADE_FIELDS order
+            trades = analysis
+        elif name == "txn" and isinstance(analysis, np.ndarray):
+            #spill.TransactionSpill - rows already in TRANSACTION_FIELDS order
+            transactions = analysis
+        elif name == "txn":
+            #{datetime: [[size, price, sid, symbol, value], ...]}
+            for dt, txns in analysis.items():
+                when = int((dt - EPOCH).total_seconds())
+                for txn in txns:
+                    transactions.append([when, float(txn[0]), float(txn[1]), float(txn[-1])])
+        else:
+            analyzers[name] = to_plain(analysis)
+
+    if trades is None:
+        trades = []
+        for dtopen, dtclose, price, barlen, pnl, pnlcomm in getattr(strat, "trades", []):
+            trades.append([int(from_bt_datenum(dtopen)), int(from_bt_datenum(dtclose)),
+                           float(price), int(barlen), float(pnl), float(pnlcomm)])
+
+    results = {
+        "symbol": symbol,
+        "timeframe": timeframe,
+        "params": to_plain(dict(strat.params._getkwargs())),
+        "start_cash": float(strat.broker.startingcash),
+        "final_value": float(strat.broker.getvalue()),
+        "equity": np.asarray(recorded.get("equity", []), dtype=np.float64),
+        "equity_time": np.asarray(recorded.get("time", []), dtype=np.int64),
+        "cash": np.asarray(recorded.get("cash", []), dtype=np.float64),
+        "position": np.asarray(recorded.get("position", []), dtype=np.float64),
+        "trades": trades,
+        "transactions": transactions,
+        "analyzers": analyzers,
+    }
+    results["metrics"] = run_metrics(results)
+    return results
+
+def run_metrics(results):
+    """metrics.compute_metrics over an artifact's equity curve and trades (None for non-finite values)"""
+    trades = np.asarray(results.get("trades", []), dtype=np.float64)
+    pnls = trades[:, TRADE_FIELDS.index("pnlcomm")] if len(trades) else []
+    equity_time = results.get("equity_time", [])
+    return to_plain(compute_metrics(results.get("equity", []), equity_time if len(equity_time) else None,
+                                    pnls, results.get("position"), results.get("start_cash")))
+
+####################################################################################
+
+def save_results(results, path):
+    """Write the artifact: arrays stored binary, everything else as one JSON blob"""
+    arrays = {k: v for k, v in results.items() if isinstance(v, np.ndarray)}
+    meta = {k: v for k, v in results.items() if not isinstance(v, np.ndarray)}
+    meta["trade_fields"] = TRADE_FIELDS
+    meta["transaction_fields"] = TRANSACTION_FIELDS
+    np.savez_compressed(path, meta=np.array(json.dumps(meta)), **arrays)
+    return path
+
+def load_results(path):
+    """Read an artifact back into the dict collect_results produced"""
+    with np.load(path, allow_pickle=False) as f:
+        results = json.loads(str(f["meta"]))
+        for name in f.files:
+            if name != "meta":
+                results[name] = f[name]
+    return results
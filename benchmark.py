@@ -0,0 +1,225 @@
+#benchmark.py
+#Reproducible benchmark suite for the backtesting pipeline
+#generates seeded synthetic OHLCV in the same CSV layout mt5_data_export writes, then times each stage
+#(CSV feed load, cache build, cached load, fast path, cerebro run, analyzer extraction, dashboard render) and writes a
+#JSON report of bars/sec and peak RSS so runs can be compared across changes and machines
+#
+#python benchmark.py --sizes 10000,100000,1000000 --out bench.json
+#python benchmark.py --compare bench_before.json bench.json
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+STAGES = ["csv_load", "cache_build", "cached_load", "fast_backtest", "cerebro_run", "analyzer_extraction", "dashboard"]
+
+####################################################################################
+
+def generate_ohlcv(n_bars, seed=42, bar_seconds=900, start="2020-01-06"):
+    """Seeded random-walk OHLCV with weekends left out, like an FX export"""
+    rng = np.random.default_rng(seed)
+
+    #5 trading days of bars per 7 calendar days - enough candidate slots, weekends dropped
+    per_day = 86400 // bar_seconds
+    slots = np.arange(int(n_bars * 7 / 5) + 2 * per_day, dtype=np.int64) * bar_seconds
+    slots += int(pd.Timestamp(start).timestamp())
+    weekday = (slots // 86400 + 3) % 7  # 1970-01-01 was a Thursday, 0 = Monday
+    times = slots[weekday < 5][:n_bars]
+
+    close = 1.25 * np.exp(np.cumsum(rng.normal(0, 0.001, n_bars)))
+    opens = np.empty(n_bars)
+    opens[0] = close[0]
+    opens[1:] = close[:-1]
+    wick = np.abs(rng.normal(0, 0.0005, (2, n_bars)))
+    high = np.maximum(opens, close) * (1 + wick[0])
+    low = np.minimum(opens, close) * (1 - wick[1])
+    volume = rng.integers(100, 1000, n_bars)
+
+    return pd.DataFrame(
+        {"Open": opens, "High": high, "Low": low, "Close": close, "Volume": volume},
+        index=pd.Index(pd.to_datetime(times, unit="s"), name="time"),
+    )
+
+def write_synthetic_csv(path, n_bars, seed=42):
+    """Write a synthetic export exactly the way mt5_data_export saves real ones"""
+    from mt5_data_export import save_csv
+    save_csv(generate_ohlcv(n_bars, seed), path, "M15")
+    return path
+
+####################################################################################
+
+def peak_rss_mb():
+    """Peak resident memory of this process so far (ru_maxrss is kB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def timed(stages, name, n_bars, func):
+    """Run one stage and record seconds, bars/sec and peak RSS after it"""
+    start = time.perf_counter()
+    value = func()
+    seconds = time.perf_counter() - start
+    stages[name] = {
+        "seconds": seconds,
+        "bars_per_sec": n_bars / seconds if seconds > 0 else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    return value
+
+def load_csv_feed(path):
+    """Load every bar through the GenericCSVData feed the backtest parses CSV exports with"""
+    import backtrader as bt
+    import sma_backtest
+
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.adddata(sma_backtest.csv_data_feed(path, "M15"))
+    cerebro.run()  # no strategy - the feed is only preloaded
+
+def bench_one(n_bars, seed, workdir, cerebro_max_bars):
+    """Every stage for one data size - run in its own process so peak RSS is per size"""
+    import data_cache
+
+    os.chdir(workdir)
+    data_cache.CACHE_ROOT = os.path.join(workdir, "cache")
+    path = os.path.join(workdir, f"MT5_BENCH_M15_{n_bars}_data.csv")
+    if not os.path.exists(path):
+        write_synthetic_csv(path, n_bars, seed)
+
+    stages = {}
+    #the backtrader CSV feed is as slow as cerebro itself, so it is skipped for the same sizes
+    if n_bars <= cerebro_max_bars:
+        timed(stages, "csv_load", n_bars, lambda: load_csv_feed(path))
+    else:
+        stages["csv_load"] = None
+    timed(stages, "cache_build", n_bars, lambda: data_cache.build_cache(path))
+    data = timed(stages, "cached_load", n_bars,
+                 lambda: {k: np.asarray(v) for k, v in data_cache.load_cached(path).items()})
+
+    from fast_backtest import run_fast_backtest
+    timed(stages, "fast_backtest", n_bars, lambda: run_fast_backtest(data))
+
+    if n_bars > cerebro_max_bars:
+        for name in ("cerebro_run", "analyzer_extraction", "dashboard"):
+            stages[name] = None
+        return {"bars": n_bars, "stages": stages}
+
+    import matplotlib
+    matplotlib.use("Agg")
+    import sma_backtest
+    from backtest_results import collect_results
+    from visualize_results import create_performance_dashboard
+
+    #the strategy prints every fill - keep that out of the timing
+    stdout = sys.stdout
+    sys.stdout = sma_backtest.Silent()
+    try:
+        cerebro, strat = timed(stages, "cerebro_run", n_bars, lambda: sma_backtest.run_backtest(path))
+        results = timed(stages, "analyzer_extraction", n_bars, lambda: collect_results(strat, "BENCH", "M15"))
+        timed(stages, "dashboard", n_bars, lambda: create_performance_dashboard(results, out_dir=workdir, show=False))
+    finally:
+        sys.stdout = stdout
+
+    return {"bars": n_bars, "stages": stages}
+
+####################################################################################
+
+def machine_info():
+    """Enough about the machine and library versions to compare reports fairly"""
+    import backtrader
+    import matplotlib
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "backtrader": backtrader.__version__,
+        "matplotlib": matplotlib.__version__,
+    }
+
+def run_suite(sizes, seed=42, workdir=None, cerebro_max_bars=1_000_000):
+    """Benchmark every size in a fresh subprocess, returns the report dict"""
+    workdir = os.path.abspath(workdir or tempfile.mkdtemp(prefix="bt_bench_"))
+    os.makedirs(workdir, exist_ok=True)
+    runs = []
+    for n_bars in sizes:
+        print(f"Benchmarking {n_bars} bars...")
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--one", str(n_bars), "--seed", str(seed),
+             "--workdir", workdir, "--cerebro-max-bars", str(cerebro_max_bars)],
+            capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        if out.returncode != 0:
+            raise RuntimeError(f"benchmark of {n_bars} bars failed:\n{out.stderr}")
+        #the report is the last line - anything printed before it is library chatter
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "seed": seed,
+        "machine": machine_info(),
+        "runs": runs,
+    }
+
+def compare_reports(old, new, tolerance=0.10):
+    """Print bars/sec old vs new per size and stage, returns the regressions beyond tolerance"""
+    old_runs = {run["bars"]: run["stages"] for run in old["runs"]}
+    regressions = []
+    print(f"{'bars':>10} {'stage':<20} {'old bars/s':>14} {'new bars/s':>14} {'change':>8}")
+    for run in new["runs"]:
+        before = old_runs.get(run["bars"])
+        if before is None:
+            continue
+        for stage in STAGES:
+            a = (before.get(stage) or {}).get("bars_per_sec")
+            b = (run["stages"].get(stage) or {}).get("bars_per_sec")
+            if not a or not b:
+                continue
+            change = b / a - 1
+            flag = "  REGRESSION" if change < -tolerance else ""
+            print(f"{run['bars']:>10} {stage:<20} {a:>14.0f} {b:>14.0f} {change:>+8.1%}{flag}")
+            if flag:
+                regressions.append((run["bars"], stage, change))
+    return regressions
+
+####################################################################################
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the backtesting pipeline on synthetic data")
+    parser.add_argument("--sizes", default=",".join(str(n) for n in DEFAULT_SIZES), help="comma separated bar counts")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=None, help="where synthetic files and the cache go (default: a temp dir)")
+    parser.add_argument("--cerebro-max-bars", type=int, default=1_000_000,
+                        help="skip the cerebro/analyzer/dashboard stages above this size")
+    parser.add_argument("--out", default="benchmark_report.json")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two reports instead of running")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="slowdown that counts as a regression")
+    parser.add_argument("--one", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.one is not None:
+        print(json.dumps(bench_one(args.one, args.seed, args.workdir, args.cerebro_max_bars)))
+    elif args.compare:
+        with open(args.compare[0]) as f:
+            old = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+        if compare_reports(old, new, args.tolerance):
+            sys.exit(1)
+    else:
+        sizes = [int(x) for x in args.sizes.split(",") if x.strip()]
+        report = run_suite(sizes, args.seed, args.workdir, args.cerebro_max_bars)
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {args.out}")
@@ -0,0 +1,90 @@
+#cli.py
+#One entry point for the whole pipeline - export, backtest, dashboard, sweep and watch run the
+#scripts' own command lines (python cli.py backtest --help shows the options of sma_backtest.py)
+#
+#nothing heavy is imported at the top: each command imports its module only once it is chosen, and
+#the modules import pandas and matplotlib only inside the functions that parse or draw - config and
+#status start in well under 100ms, export/dashboard/sweep/costs --help in a few hundred (numpy);
+#backtest and watch's workers still load backtrader, the strategy classes are built on it
+#
+#python cli.py config                     (settings in use and where they came from)
+#python cli.py status                     (exports waiting in data_save / in_use / archive)
+#python cli.py backtest --no-cache
+#python cli.py sweep MT5_GBPUSD_H4_data.csv --pfast 3,5,8 --pslow 10,20,30
+
+import os
+import sys
+
+from config import CONFIG_PATH, load_config
+
+#command -> (module with a main(argv), help)
+COMMANDS = {
+    "export": ("mt5_data_export", "download MT5 history into data_save (--symbols for a bulk export)"),
+    "backtest": ("sma_backtest", "backtest the latest export with cerebro and save its results"),
+    "dashboard": ("visualize_results", "performance dashboard of the latest backtest"),
+    "sweep": ("param_sweep", "parallel parameter sweep over one export"),
+    "costs": ("cost_sensitivity", "commission x slippage grid and breakeven costs of one parameter set"),
+    "watch": ("watch_scheduler", "backtest and archive every export dropped into data_save"),
+}
+
+####################################################################################
+
+def show_config(argv):
+    """Print the settings in use"""
+    source = CONFIG_PATH if os.path.exists(CONFIG_PATH) else f"defaults ({CONFIG_PATH} not found)"
+    print(f"Config: {source}")
+    for key, value in load_config().items():
+        print(f"  {key}: {value}")
+    return 0
+
+def show_status(argv):
+    """Count the exports in each stage of the data_save -> in_use -> archive pipeline"""
+    settings = load_config()
+    for stage in ("data_save_dir", "in_use_dir", "archive_dir"):
+        folder = settings[stage]
+        try:
+            names = sorted(n for n in os.listdir(folder) if n.startswith("MT5_") and n.endswith("_data.csv"))
+        except FileNotFoundError:
+            print(f"{stage}: {folder} (missing)")
+            continue
+        print(f"{stage}: {folder} ({len(names)} exports)")
+        for name in names:
+            print(f"  {name}")
+    return 0
+
+BUILTIN = {
+    "config": (show_config, "show the settings from backtest_config.json"),
+    "status": (show_status, "list the exports waiting in data_save, in_use and archive"),
+}
+
+def usage():
+    lines = ["usage: python cli.py <command> [options]", "", "commands:"]
+    for name, (_, text) in list(COMMANDS.items()) + list(BUILTIN.items()):
+        lines.append(f"  {name:<10} {text}")
+    lines.append("")
+    lines.append("python cli.py <command> --help shows the options of a command")
+    return "\n".join(lines)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return 0
+
+    command, rest = argv[0], argv[1:]
+    if command in BUILTIN:
+        return BUILTIN[command][0](rest)
+    if command not in COMMANDS:
+        print(f"Unknown command: {command}\n")
+        print(usage())
+        return 2
+
+    import importlib
+
+    #the module's own argparse names the command in its usage line
+    sys.argv[0] = f"cli.py {command}"
+    module = importlib.import_module(COMMANDS[command][0])
+    return module.main(rest)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+#config.py
+#Project settings - data folders and broker costs - read from one JSON config file
+#copy backtest_config.example.json to backtest_config.json (or point BT_CONFIG at your own file)
+#and change what you need, every setting left out keeps its default below
+#
+#relative paths are taken from the config file's own folder, not the current directory, so
+#scripts started by cron, the scheduler or pool workers all find the same data
+#
+#stdlib only - importing this must stay cheap (cli.py reads it before any heavy import)
+
+import json
+import os
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+#--- USER SETUP: set BT_CONFIG to use a config file somewhere else ---
+CONFIG_PATH = os.environ.get("BT_CONFIG", os.path.join(PROJECT_DIR, "backtest_config.json"))
+
+DEFAULTS = {
+    "data_save_dir": "data_save",   # where MT5 exports are saved
+    "in_use_dir": None,             # default <data_save_dir>/in_use
+    "archive_dir": None,            # default <data_save_dir>/archive
+    "results_dir": ".",             # results artifacts, dashboards and scheduler logs
+    "results_db": None,             # default <results_dir>/backtest_results.db
+    "cash": 100000.0,
+    "commission": 0.0001,           # fraction of the traded value
+    "slippage": 0.00005,            # fraction of the price
+}
+
+PATH_KEYS = ["data_save_dir", "in_use_dir", "archive_dir", "results_dir", "results_db"]
+
+_loaded = {}
+
+####################################################################################
+
+def load_config(path=None):
+    """DEFAULTS overlaid with the config file (when it exists), paths made absolute - read once per file"""
+    path = os.path.abspath(path or CONFIG_PATH)
+    if path in _loaded:
+        return _loaded[path]
+
+    settings = dict(DEFAULTS)
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            stored = json.load(f)
+        unknown = sorted(set(stored) - set(DEFAULTS))
+        if unknown:
+            print(f"Ignoring unknown settings in {path}: {', '.join(unknown)}")
+        settings.update({k: v for k, v in stored.items() if k in DEFAULTS})
+
+    base = os.path.dirname(path)
+    settings["in_use_dir"] = settings["in_use_dir"] or os.path.join(settings["data_save_dir"], "in_use")
+    settings["archive_dir"] = settings["archive_dir"] or os.path.join(settings["data_save_dir"], "archive")
+    settings["results_db"] = settings["results_db"] or os.path.join(settings["results_dir"], "backtest_results.db")
+    for key in PATH_KEYS:
+        settings[key] = os.path.normpath(os.path.join(base, os.path.expanduser(settings[key])))
+    for key in ("cash", "commission", "slippage"):
+        settings[key] = float(settings[key])
+
+    _loaded[path] = settings
+    return settings
+
+def setting(name):
+    """One setting from the default config file"""
+    return load_config()[name]
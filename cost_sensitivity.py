@@ -0,0 +1,317 @@
+#cost_sensitivity.py
+#Transaction cost sensitivity of the SMA Crossover Strategy
+#commission and slippage only change the prices trades fill at, not where the strategy enters and
+#exits (the signals and the stop/limit levels come off the raw bars) - so the fast path runs ONCE at
+#the base costs to fix the trade path, and then every commission x slippage pair of a grid is
+#repriced in one vectorized batch: fill prices, compounding sizes, P&L, equity and metrics
+#
+#costs can still move a trade near the edges - a max loss close firing earlier or later, an entry
+#passing or failing the margin check - and those pairs are caught. One of them is run in full to get
+#its trade path and every caught pair is repriced again on that, as neighbouring costs mostly share
+#a path. Once the new paths stop fitting more than the pairs they came from, the costs move the
+#trades at nearly every point and the pairs left are simply re-run one by one - either way the
+#results always match run_fast_backtest at that commission and slippage
+#
+#the output is a breakeven-cost surface: net P&L over the grid and, along each axis, the cost where
+#it crosses zero
+#
+#python cost_sensitivity.py MT5_GBPUSD_M15_data.csv --multipliers 0,1,2,3,4,6
+#python cost_sensitivity.py MT5_GBPUSD_M15_data.csv --commission 0,0.0001,0.0002 --slippage 0,0.00005,0.0001
+
+import argparse
+import time
+
+import numpy as np
+
+from fast_backtest import (DEFAULT_PARAMS, EXIT_LIMIT, EXIT_MAX_LOSS, EXIT_OPEN, EXIT_STOP, MAX_LOSS, TREND_PERIOD,
+                           VOLUME_PERIOD, compute_signals, load_ohlcv, run_fast_backtest)
+from indicator_bank import build_bank
+from metrics import compute_metrics
+from param_sweep import summarize
+
+#the default grid - these multiples of the base commission and slippage on each axis
+DEFAULT_MULTIPLIERS = [0, 0.5, 1, 2, 3, 4, 6]
+
+####################################################################################
+
+def trade_path(data, params=None, cash=100000.0, commission=0.0001, slippage=0.00005, max_loss=MAX_LOSS, bank=None):
+    """
+    The trades of one fast backtest at the base costs, as the raw fills every cost setting reprices
+
+    Returns the params, the signals, the indicator bank they came from and per trade its entry
+    bar, exit bar (len(data) while still open at the end) and exit reason.
+    """
+    p = dict(DEFAULT_PARAMS, **(params or {}))
+    if bank is None:
+        #the signals are needed here and by the base run - average each line once for both
+        bank = build_bank(data, {"close": sorted({int(p["pfast"]), int(p["pslow"]), TREND_PERIOD}),
+                                 "volume": [VOLUME_PERIOD]})
+    signals = compute_signals(data, p["pfast"], p["pslow"], bank)
+    trades = run_fast_backtest(data, p, cash, commission, slippage, max_loss, bank)["trades"]
+
+    exits = trades["exit_idx"].copy()
+    exits[trades["exit_reason"] == EXIT_OPEN] = len(data["close"])
+    return {
+        "params": p,
+        "signals": signals,
+        "bank": bank,
+        "entry": trades["entry_idx"],
+        "exit": exits,
+        "reason": trades["exit_reason"],
+    }
+
+def reprice(data, path, commissions, slippages, cash=100000.0, max_loss=MAX_LOSS):
+    """
+    Equity, position and closed-trade P&L of the path's trades at every (commission, slippage) pair at once
+
+    commissions and slippages are equal length, one pair per grid point. Sizes compound off each
+    point's own cash, the same as run_fast_backtest. Returns (points, bars) equity and position,
+    (points, trades) pnlcomm and path_ok - False where those costs would have moved a max loss
+    close or flipped a margin check, so the base path does not hold there.
+    """
+    commissions = np.asarray(commissions, dtype=np.float64)
+    slippages = np.asarray(slippages, dtype=np.float64)
+    points = len(commissions)
+
+    opens = data["open"]
+    highs = data["high"]
+    lows = data["low"]
+    closes = data["close"]
+    n = len(closes)
+    p = path["params"]
+    signals = path["signals"]
+    entry_bars = np.flatnonzero(signals["cross_up"] & signals["tradable"])
+    tradable_bars = np.flatnonzero(signals["tradable"])
+    entries, exits, reasons = path["entry"], path["exit"], path["reason"]
+
+    broker_cash = np.full(points, float(cash))
+    cash_delta = np.zeros((points, n))
+    sizes = np.zeros((points, len(entries)))
+    pnlcomm = np.zeros((points, len(entries)))
+    path_ok = np.ones(points, dtype=bool)
+    bar = 0
+
+    for k in range(len(entries) + 1):
+        #signals between the last exit and this entry were rejected for margin at the base costs
+        taken = entries[k] - 1 if k < len(entries) else n
+        for signal in entry_bars[np.searchsorted(entry_bars, bar):np.searchsorted(entry_bars, taken)]:
+            if signal + 1 >= n:
+                break
+            size = broker_cash * p["risk_per_trade"] / closes[signal]
+            price = np.minimum(opens[signal + 1] * (1 + slippages), highs[signal + 1])
+            path_ok &= size * price + size * price * commissions > broker_cash
+        if k == len(entries) or not path_ok.any():
+            break
+
+        entry, exit_bar, reason = entries[k], exits[k], reasons[k]
+        signal = entry - 1
+        size = broker_cash * p["risk_per_trade"] / closes[signal]
+        entry_price = np.minimum(opens[entry] * (1 + slippages), highs[entry])
+        entry_comm = size * entry_price * commissions
+        path_ok &= size * entry_price + entry_comm <= broker_cash
+
+        #the bar the base run's exit was decided on - a max loss close firing before it moves the exit
+        if reason in (EXIT_STOP, EXIT_LIMIT):
+            decided = exit_bar
+        else:
+            decided = exit_bar - 1
+        window = tradable_bars[np.searchsorted(tradable_bars, entry):np.searchsorted(tradable_bars, decided)]
+        if len(window):
+            path_ok &= size * closes[window].min() - size * entry_price > -max_loss
+        if reason == EXIT_MAX_LOSS:
+            path_ok &= size * closes[decided] - size * entry_price <= -max_loss
+
+        broker_cash -= size * entry_price + entry_comm
+        cash_delta[:, entry] -= size * entry_price + entry_comm
+        sizes[:, k] = size
+
+        if reason == EXIT_OPEN:
+            pnlcomm[:, k] = size * (closes[-1] - entry_price) - entry_comm
+            break
+
+        #the same fills as fast_backtest.find_exit, at every slippage at once
+        if reason == EXIT_STOP:
+            sl_price = closes[signal] * p["stop_loss_pct"]
+            trigger = sl_price if opens[exit_bar] > sl_price else opens[exit_bar]
+            exit_price = np.maximum(trigger * (1 - slippages), lows[exit_bar])
+        elif reason == EXIT_LIMIT:
+            tp_price = closes[signal] * (1 + p["take_profit_pct"])
+            if opens[exit_bar] >= tp_price:
+                exit_price = np.maximum(opens[exit_bar] * (1 - slippages), tp_price)
+            else:
+                exit_price = np.full(points, tp_price)
+        else:
+            exit_price = np.maximum(opens[exit_bar] * (1 - slippages), lows[exit_bar])
+
+        exit_comm = size * exit_price * commissions
+        broker_cash += size * exit_price - exit_comm
+        cash_delta[:, exit_bar] += size * exit_price - exit_comm
+        pnlcomm[:, k] = size * (exit_price - entry_price) - entry_comm - exit_comm
+        bar = exit_bar
+
+    #trade holding each bar (-1 when flat), so every point's position is one gather
+    holder = np.full(n, -1)
+    for k in range(len(entries)):
+        holder[entries[k]:exits[k]] = k
+    position = np.where(holder >= 0, sizes[:, holder], 0.0)
+    equity = cash + np.cumsum(cash_delta, axis=1) + position * closes
+
+    return {
+        "equity": equity,
+        "position": position,
+        "pnlcomm": pnlcomm,
+        "path_ok": path_ok,
+    }
+
+####################################################################################
+
+def cost_sensitivity(data, commissions, slippages, params=None, cash=100000.0, base_commission=0.0001,
+                     base_slippage=0.00005, max_loss=MAX_LOSS, bank=None):
+    """
+    Metrics of one parameter set at every commission x slippage pair of the grid
+
+    The trade path comes from one run at the base costs and is repriced for the whole grid in
+    one batch. Pairs where the path would change get a new path from a run at the first such
+    pair's costs and are repriced on that, while the new paths fit more pairs than runs they
+    took - the rest are then re-run with run_fast_backtest.
+    Returns a DataFrame, one row per pair with its metrics, path (0 = the base costs' trade path,
+    1, 2, ... the ones found after it, -1 = re-run) and repriced (False = re-run).
+    """
+    if isinstance(data, str):
+        data = load_ohlcv(data)
+    path = trade_path(data, params, cash, base_commission, base_slippage, max_loss, bank)
+
+    grid_commission, grid_slippage = [a.ravel() for a in np.meshgrid(commissions, slippages)]
+    rows = [{"commission": float(c), "slippage": float(s)} for c, s in zip(grid_commission, grid_slippage)]
+    pending = np.arange(len(rows))
+    leader = None  #the pair the current path was run at (None: the base costs)
+    path_id = 0
+    shared = 0  #pairs placed on the paths after the base one
+
+    while len(pending):
+        batch = reprice(data, path, grid_commission[pending], grid_slippage[pending], cash, max_loss)
+        fits = batch["path_ok"]
+        for j in np.flatnonzero(fits):
+            rows[pending[j]].update(compute_metrics(batch["equity"][j], data.get("time"), batch["pnlcomm"][j],
+                                                    batch["position"][j], cash))
+            rows[pending[j]].update(path=path_id, repriced=True)
+        pending = pending[~fits]
+
+        #paths no longer shared - searching on would cost a run per pair plus the repricing
+        if leader is not None:
+            shared += int(fits.sum())
+            if shared <= path_id:
+                break
+        if len(pending):
+            leader = pending[0]
+            path_id += 1
+            path = trade_path(data, path["params"], cash, grid_commission[leader], grid_slippage[leader],
+                              max_loss, path["bank"])
+
+    for i in pending:
+        result = run_fast_backtest(data, path["params"], cash, grid_commission[i], grid_slippage[i],
+                                   max_loss, path["bank"])
+        rows[i].update(summarize(result, cash))
+        rows[i].update(path=-1, repriced=False)
+    import pandas as pd
+    return pd.DataFrame(rows)
+
+def cost_surface(table, value="net_pnl"):
+    """value over the grid - slippage down the rows, commission across the columns"""
+    return table.pivot(index="slippage", columns="commission", values=value)
+
+def breakeven(table, along="commission", value="net_pnl"):
+    """
+    The cost along one axis where value falls to zero for good, for each value of the other cost
+
+    Interpolated linearly between the grid points either side of the last fall from positive to
+    zero or below - costs can shift trades, so a row may start at a loss and turn profitable at
+    higher costs, and only the fall after its last profitable point counts.
+    inf when value is still positive at the highest cost, NaN when it is never positive.
+    """
+    import pandas as pd
+
+    other = "slippage" if along == "commission" else "commission"
+    found = {}
+    for key, rows in table.sort_values(along).groupby(other):
+        costs = rows[along].to_numpy()
+        values = rows[value].to_numpy()
+        positive = values > 0
+        if not positive.any():
+            found[key] = np.nan
+        elif positive[-1]:
+            found[key] = np.inf
+        else:
+            i = np.flatnonzero(positive[:-1] & ~positive[1:])[-1] + 1
+            step = values[i - 1] / (values[i - 1] - values[i])
+            found[key] = costs[i - 1] + step * (costs[i] - costs[i - 1])
+    return pd.Series(found, name=f"breakeven_{along}").rename_axis(other)
+
+####################################################################################
+
+def _parse_list(text, cast):
+    return [cast(x) for x in text.split(",") if x.strip()]
+
+def _describe(cost, grid):
+    if np.isnan(cost):
+        return "never profitable on the grid"
+    if np.isinf(cost):
+        return f"still profitable at {max(grid):g}"
+    return f"{cost:.6g}"
+
+def main(argv=None):
+    """Command line entry - cost grid around the commission and slippage from backtest_config.json"""
+    from config import load_config
+
+    settings = load_config()
+    parser = argparse.ArgumentParser(description="Transaction cost sensitivity and breakeven costs of SmaCrossStrategy")
+    parser.add_argument("data_file", help="MT5_<symbol>_<tf>_data.csv export")
+    for name, value in DEFAULT_PARAMS.items():
+        parser.add_argument("--" + name.replace("_", "-"), type=type(value), default=value)
+    parser.add_argument("--commission", default=None, help="comma separated commissions (default: multiples of the configured one)")
+    parser.add_argument("--slippage", default=None, help="comma separated slippages (default: multiples of the configured one)")
+    parser.add_argument("--multipliers", default=",".join(f"{m:g}" for m in DEFAULT_MULTIPLIERS),
+                        help="multiples of the configured costs making up the default grid")
+    parser.add_argument("--value", default="net_pnl", help="metric the surface and breakeven costs are taken of")
+    parser.add_argument("--out", default=None, help="save every grid point to this CSV")
+    args = parser.parse_args(argv)
+
+    multipliers = _parse_list(args.multipliers, float)
+    commissions = _parse_list(args.commission, float) if args.commission else [settings["commission"] * m for m in multipliers]
+    slippages = _parse_list(args.slippage, float) if args.slippage else [settings["slippage"] * m for m in multipliers]
+    params = {name: getattr(args, name) for name in DEFAULT_PARAMS}
+
+    data = load_ohlcv(args.data_file)
+    start = time.perf_counter()
+    table = cost_sensitivity(data, commissions, slippages, params, settings["cash"],
+                             settings["commission"], settings["slippage"])
+    elapsed = time.perf_counter() - start
+
+    on_base = int((table["path"] == 0).sum())
+    rerun = int((~table["repriced"]).sum())
+    print("=" * 50)
+    print(f"COST SENSITIVITY ({len(table)} cost pairs, {rerun} re-run, {elapsed:.2f}s)")
+    print("=" * 50)
+    if on_base < len(table):
+        print(f"Warning: the costs change the trades at {len(table) - on_base} of {len(table)} pairs - "
+              f"{on_base} repriced on the base path, {len(table) - on_base - rerun} on "
+              f"{int(table['path'].max())} other paths, {rerun} re-run")
+    print(table[["commission", "slippage", "final_value", "net_pnl", "sharpe", "max_drawdown", "trades",
+                 "path", "repriced"]].to_string(index=False))
+
+    print(f"\n{args.value.upper()} SURFACE (rows: slippage, columns: commission)")
+    print(cost_surface(table, args.value).to_string())
+
+    print(f"\nBREAKEVEN COMMISSION ({args.value} = 0) per slippage")
+    for slippage, cost in breakeven(table, "commission", args.value).items():
+        print(f"  slippage {slippage:g}: {_describe(cost, commissions)}")
+    print(f"\nBREAKEVEN SLIPPAGE ({args.value} = 0) per commission")
+    for commission, cost in breakeven(table, "slippage", args.value).items():
+        print(f"  commission {commission:g}: {_describe(cost, slippages)}")
+
+    if args.out:
+        table.to_csv(args.out, index=False)
+        print(f"\nEvery grid point saved to {args.out}")
+
+if __name__ == "__main__":
+    main()
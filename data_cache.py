@@ -0,0 +1,204 @@
+#data_cache.py
+#Binary columnar cache for MT5 CSV exports
+#each export is parsed ONCE into raw little-endian column files (time as int64 epoch seconds)
+#and from then on is memory-mapped straight from disk - repeat runs skip text parsing entirely
+
+import json
+import os
+
+import numpy as np
+
+#--- USER SETUP: set MT5_CACHE_DIR to keep the cache somewhere else ---
+CACHE_ROOT = os.environ.get(
+    "MT5_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".mt5_cache"),
+)
+
+#column name -> on disk dtype (explicit little-endian so the files are portable)
+COLUMNS = {
+    "time": "<i8",
+    "open": "<f8",
+    "high": "<f8",
+    "low": "<f8",
+    "close": "<f8",
+    "volume": "<f8",
+}
+
+#CSV header written by mt5_data_export -> cache column
+CSV_COLUMNS = {
+    "Open": "open",
+    "High": "high",
+    "Low": "low",
+    "Close": "close",
+    "Volume": "volume",
+}
+
+META_FILE = "meta.json"
+
+#rows parsed per pass when building a cache, keeps memory flat for multi-year M1 exports
+CSV_CHUNK_ROWS = 1_000_000
+
+#backtrader stores datetimes as float days since 0001-01-01, this is 1970-01-01
+BT_EPOCH_ORDINAL = 719163.0
+
+####################################################################################
+
+def cache_dir_for(data_file):
+    """Cache directory for an export - keyed by file name so it survives the data_save -> in_use move"""
+    name = os.path.splitext(os.path.basename(data_file))[0]
+    return os.path.join(CACHE_ROOT, name)
+
+def source_stamp(data_file):
+    """Size and mtime of the source file, the cache is only valid while both match"""
+    st = os.stat(data_file)
+    return {"source_size": st.st_size, "source_mtime_ns": st.st_mtime_ns}
+
+def read_meta(cache_dir):
+    """Cache metadata, or None when there is no complete cache"""
+    try:
+        with open(os.path.join(cache_dir, META_FILE), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_meta(cache_dir, meta):
+    """Write metadata last and atomically - a cache without meta.json is never used"""
+    tmp = os.path.join(cache_dir, f"{META_FILE}.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(cache_dir, META_FILE))
+
+def is_cache_valid(data_file, cache_dir=None):
+    """True when the cache (cache_dir, default the export's own) was built from the current version of data_file"""
+    meta = read_meta(cache_dir or cache_dir_for(data_file))
+    if meta is None:
+        return False
+    stamp = source_stamp(data_file)
+    return (meta.get("source_size") == stamp["source_size"]
+            and meta.get("source_mtime_ns") == stamp["source_mtime_ns"])
+
+####################################################################################
+
+def frame_to_arrays(df):
+    """Column arrays from a frame read out of an MT5 CSV export"""
+    import pandas as pd  # only the CSV side needs pandas - memory-mapped reads stay numpy only
+    #daily exports are written as plain dates, intraday ones with a time
+    times = pd.to_datetime(df.iloc[:, 0], format="ISO8601")
+    arrays = {"time": times.values.astype("datetime64[s]").astype(np.int64)}
+    for csv_name, name in CSV_COLUMNS.items():
+        arrays[name] = df[csv_name].to_numpy(dtype=np.float64)
+    return arrays
+
+def parse_csv(data_file):
+    """Parse an MT5 CSV export into column arrays (the slow path, done once per export)"""
+    import pandas as pd
+
+    #round_trip so every float matches float() on the text, the same as the CSV feed
+    return frame_to_arrays(pd.read_csv(data_file, float_precision="round_trip"))
+
+def iter_csv_chunks(data_file, chunksize=CSV_CHUNK_ROWS):
+    """parse_csv a chunk of rows at a time"""
+    import pandas as pd
+
+    for df in pd.read_csv(data_file, float_precision="round_trip", chunksize=chunksize):
+        yield frame_to_arrays(df)
+
+def write_columns(cache_dir, arrays, meta_extra=None):
+    """Write column arrays to cache_dir and stamp them with meta_extra"""
+    os.makedirs(cache_dir, exist_ok=True)
+
+    #drop the old meta first so a half written cache is never picked up
+    try:
+        os.remove(os.path.join(cache_dir, META_FILE))
+    except FileNotFoundError:
+        pass
+
+    for name, dtype in COLUMNS.items():
+        tmp = os.path.join(cache_dir, f"{name}.bin.{os.getpid()}.tmp")
+        np.ascontiguousarray(arrays[name], dtype=dtype).tofile(tmp)
+        os.replace(tmp, os.path.join(cache_dir, f"{name}.bin"))
+
+    meta = {"rows": int(len(arrays["time"])), "columns": COLUMNS}
+    meta.update(meta_extra or {})
+    write_meta(cache_dir, meta)
+
+def build_cache(data_file, chunksize=CSV_CHUNK_ROWS):
+    """Convert data_file to the binary format chunk by chunk, returns the cache directory"""
+    stamp = source_stamp(data_file)
+    cache_dir = cache_dir_for(data_file)
+    os.makedirs(cache_dir, exist_ok=True)
+    try:
+        os.remove(os.path.join(cache_dir, META_FILE))
+    except FileNotFoundError:
+        pass
+
+    tmp = {name: os.path.join(cache_dir, f"{name}.bin.{os.getpid()}.tmp") for name in COLUMNS}
+    files = {name: open(path, "wb") for name, path in tmp.items()}
+    rows = 0
+    try:
+        for arrays in iter_csv_chunks(data_file, chunksize):
+            for name, dtype in COLUMNS.items():
+                np.ascontiguousarray(arrays[name], dtype=dtype).tofile(files[name])
+            rows += len(arrays["time"])
+    finally:
+        for f in files.values():
+            f.close()
+
+    for name, path in tmp.items():
+        os.replace(path, os.path.join(cache_dir, f"{name}.bin"))
+    meta = {"rows": rows, "columns": COLUMNS}
+    meta.update(stamp)
+    write_meta(cache_dir, meta)
+    return cache_dir
+
+def open_columns(cache_dir, rows=None):
+    """Memory-map every column in cache_dir read-only"""
+    if rows is None:
+        rows = read_meta(cache_dir)["rows"]
+    arrays = {}
+    for name, dtype in COLUMNS.items():
+        if rows == 0:
+            arrays[name] = np.empty(0, dtype=dtype)
+        else:
+            arrays[name] = np.memmap(os.path.join(cache_dir, f"{name}.bin"), dtype=dtype, mode="r", shape=(rows,))
+    return arrays
+
+def read_rows(cache_dir, start, count):
+    """count rows of every column from row start, read into memory rather than mapped"""
+    arrays = {}
+    for name, dtype in COLUMNS.items():
+        dtype = np.dtype(dtype)
+        with open(os.path.join(cache_dir, f"{name}.bin"), "rb") as f:
+            arrays[name] = np.fromfile(f, dtype=dtype, count=count, offset=start * dtype.itemsize)
+    return arrays
+
+def ensure_cache(data_file):
+    """Cache directory for data_file, building (or rebuilding a stale) cache on first use"""
+    if not is_cache_valid(data_file):
+        print(f"Building binary cache for {os.path.basename(data_file)}...")
+        build_cache(data_file)
+    return cache_dir_for(data_file)
+
+def load_cached(data_file):
+    """OHLCV arrays for data_file, building (or rebuilding a stale) cache on first use"""
+    return open_columns(ensure_cache(data_file))
+
+def to_bt_datenum(times):
+    """Epoch seconds -> backtrader float datetimes (bit-identical to bt.date2num)"""
+    times = np.asarray(times, dtype=np.int64)
+    days, seconds = np.divmod(times, 86400)
+    return (days + BT_EPOCH_ORDINAL) + seconds / 86400.0
+
+def from_bt_datenum(datenums):
+    """Backtrader float datetimes -> epoch seconds (rounded to the nearest second)"""
+    datenums = np.asarray(datenums, dtype=np.float64)
+    return np.rint((datenums - BT_EPOCH_ORDINAL) * 86400.0).astype(np.int64)
+
+####################################################################################
+
+if __name__ == "__main__":
+    import sys
+
+    for path in sys.argv[1:]:
+        cache_dir = build_cache(path)
+        print(f"{path} -> {cache_dir} ({read_meta(cache_dir)['rows']} rows)")
@@ -0,0 +1,83 @@
+#equity_recorder.py
+#Per-bar equity recorder any strategy can attach as an analyzer
+#cerebro.addanalyzer(EquityRecorder, _name="equity")
+#records timestamp, equity, cash and position size on EVERY bar (warm-up and filtered bars included)
+#into preallocated NumPy arrays - no per-bar Python objects
+#with spill_dir set the rows go to column files on disk instead (bounded-memory runs)
+
+import os
+
+import backtrader as bt
+import numpy as np
+
+from data_cache import from_bt_datenum
+
+class EquityRecorder(bt.Analyzer):
+    """Timestamp, equity, cash and position size per bar in preallocated arrays"""
+    params = (
+        ("capacity", None),  # rows to preallocate, defaults to the preloaded data length
+        ("spill_dir", None),  # write rows to disk here instead of keeping them in memory
+    )
+
+    def start(self):
+        self.count = 0
+        self.spill = None
+        if self.p.spill_dir is not None:
+            from spill import ColumnSpill
+            self.spill = ColumnSpill(os.path.join(self.p.spill_dir, "equity"),
+                                     {"time": "<i8", "equity": "<f8", "cash": "<f8", "position": "<f8"})
+            return
+
+        capacity = self.p.capacity or self.data.buflen() or 4096
+        self.time = np.empty(capacity, dtype=np.float64)  # backtrader datenums until get_analysis
+        self.equity = np.empty(capacity, dtype=np.float64)
+        self.cash = np.empty(capacity, dtype=np.float64)
+        self.position = np.empty(capacity, dtype=np.float64)
+
+    def grow(self):
+        """Double the arrays when the data was not preloaded (or capacity was too small)"""
+        capacity = len(self.time) * 2
+        for name in ("time", "equity", "cash", "position"):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def record(self):
+        broker = self.strategy.broker
+        if self.spill is not None:
+            self.spill.append((from_bt_datenum(self.data.datetime[0]), broker.getvalue(),
+                               broker.getcash(), self.strategy.getposition(self.data).size))
+            self.count += 1
+            return
+
+        i = self.count
+        if i >= len(self.time):
+            self.grow()
+        self.time[i] = self.data.datetime[0]
+        self.equity[i] = broker.getvalue()
+        self.cash[i] = broker.getcash()
+        self.position[i] = self.strategy.getposition(self.data).size
+        self.count = i + 1
+
+    def prenext(self):
+        self.record()
+
+    def next(self):
+        self.record()
+
+    def stop(self):
+        if self.spill is not None:
+            self.spill.close()
+
+    def get_analysis(self):
+        if self.spill is not None:
+            return self.spill.read()  # memory-mapped columns, time already epoch seconds
+
+        n = self.count
+        return {
+            "time": from_bt_datenum(self.time[:n]),  # int64 epoch seconds
+            "equity": self.equity[:n],
+            "cash": self.cash[:n],
+            "position": self.position[:n],
+        }
@@ -0,0 +1,415 @@
+#fast_backtest.py
+#Vectorized NumPy fast path for the SMA Crossover Strategy
+#computes the same signals as SmaCrossStrategy over the whole OHLCV series at once instead of
+#going through backtrader's per-bar next() loop - a year of M15 data runs in milliseconds
+
+import argparse
+import numpy as np
+
+from data_cache import load_cached
+
+#mirrors SmaCrossStrategy.params - kept here so the fast path never has to import backtrader
+DEFAULT_PARAMS = dict(
+    pfast=5,
+    pslow=10,
+    risk_per_trade=0.9,
+    stop_loss_pct=0.15,
+    take_profit_pct=0.35,
+)
+
+#fixed periods used by SmaCrossStrategy filters
+TREND_PERIOD = 5
+VOLUME_PERIOD = 20
+
+#close the position when the open loss reaches this many $
+MAX_LOSS = 200.0
+
+#why a trade was closed
+EXIT_STOP = 0
+EXIT_LIMIT = 1
+EXIT_MAX_LOSS = 2
+EXIT_CROSS = 3
+EXIT_OPEN = 4   #still open at the end of the data
+EXIT_NAMES = ["stop", "limit", "max_loss", "crossover", "open"]
+
+TRADE_DTYPE = np.dtype([
+    ("entry_idx", np.int64),
+    ("exit_idx", np.int64),
+    ("size", np.float64),
+    ("entry_price", np.float64),
+    ("exit_price", np.float64),
+    ("pnl", np.float64),
+    ("pnlcomm", np.float64),
+    ("exit_reason", np.int8),
+])
+
+FILL_DTYPE = np.dtype([
+    ("bar", np.int64),
+    ("is_buy", np.bool_),
+    ("price", np.float64),
+    ("size", np.float64),
+])
+
+####################################################################################
+
+def load_ohlcv(data_file):
+    """OHLCV arrays for an MT5 export (time is int64 epoch seconds), memory-mapped from the binary cache"""
+    return load_cached(data_file)
+
+def sma(values, period):
+    """Simple moving average via one cumulative sum pass (NaN until the window is full)"""
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(len(values), np.nan)
+    if period > len(values):
+        return out
+
+    #subtract the first value so the running sum stays small and keeps its precision
+    base = values[0]
+    csum = np.cumsum(values - base)
+    out[period - 1] = csum[period - 1] / period + base
+    out[period:] = (csum[period:] - csum[:-period]) / period + base
+    return out
+
+def bank_key(series, period):
+    """Name of a series' SMA line in an indicator bank (indicator_bank.py)"""
+    return f"{series}_sma_{int(period)}"
+
+def bank_sma(data, series, period, bank=None):
+    """sma() of data[series], taken from bank when it already holds that line"""
+    line = None if bank is None else bank.get(bank_key(series, period))
+    return sma(data[series], period) if line is None else line
+
+def compute_signals(data, pfast, pslow, bank=None):
+    """Crossover signals and the trend/volume filter as boolean arrays (SMAs looked up in bank if given)"""
+    close = data["close"]
+    n = len(close)
+    bars = np.arange(n)
+
+    diff = bank_sma(data, "close", pfast, bank) - bank_sma(data, "close", pslow, bank)
+
+    #backtrader's CrossOver compares against the last NON-zero difference
+    first = max(pfast, pslow) - 1
+    keep = (diff != 0) & (bars >= first)
+    if first < n:
+        keep[first] = True
+    last_nonzero = np.where(keep, bars, 0)
+    np.maximum.accumulate(last_nonzero, out=last_nonzero)
+    prev_nzd = np.empty(n)
+    prev_nzd[0] = np.nan
+    prev_nzd[1:] = diff[last_nonzero[:-1]]
+
+    cross_up = (prev_nzd < 0) & (diff > 0) & (bars > first)
+    cross_down = (prev_nzd > 0) & (diff < 0) & (bars > first)
+
+    #next() only runs once every indicator is warmed up, and returns early on the filters
+    start = max(max(pfast, pslow) + 1, VOLUME_PERIOD, TREND_PERIOD) - 1
+    tradable = (
+        (close >= bank_sma(data, "close", TREND_PERIOD, bank))
+        & (data["volume"] >= bank_sma(data, "volume", VOLUME_PERIOD, bank))
+        & (bars >= start)
+    )
+
+    return {
+        "cross_up": cross_up,
+        "cross_down": cross_down,
+        "tradable": tradable,
+        "start": start,
+    }
+
+####################################################################################
+
+def _buy_price(price, high, slippage):
+    """Slipped buy price, matched at the bar high like backtrader's slip_match"""
+    return min(price * (1 + slippage), high)
+
+def _sell_price(price, low, slippage):
+    """Slipped sell price, matched at the bar low like backtrader's slip_match"""
+    return max(price * (1 - slippage), low)
+
+def find_exit_signal(closes, entry, size, entry_price, cross_exit_bars, tradable_bars, max_loss=MAX_LOSS):
+    """First bar from entry where next() sends a market close, (bar, reason) - (len(closes), EXIT_CROSS) if none"""
+    n = len(closes)
+    c = np.searchsorted(cross_exit_bars, entry)
+    exit_signal = cross_exit_bars[c] if c < len(cross_exit_bars) else n
+    reason = EXIT_CROSS
+    window = tradable_bars[np.searchsorted(tradable_bars, entry):np.searchsorted(tradable_bars, exit_signal)]
+    losing = window[size * closes[window] - size * entry_price <= -max_loss]
+    if len(losing):
+        exit_signal = losing[0]
+        reason = EXIT_MAX_LOSS
+    return exit_signal, reason
+
+def find_exit(data, signals, p, entry, size, entry_price, slippage, max_loss=MAX_LOSS,
+              cross_exit_bars=None, tradable_bars=None):
+    """
+    Where and how a long entered at bar entry is closed, (exit_bar, exit_price, reason)
+
+    exit_bar is len(data) with a NaN price when the trade is still open at the end.
+    cross_exit_bars/tradable_bars can be passed in precomputed for repeat calls.
+    """
+    opens = data["open"]
+    highs = data["high"]
+    lows = data["low"]
+    closes = data["close"]
+    n = len(closes)
+    if tradable_bars is None:
+        tradable_bars = np.flatnonzero(signals["tradable"])
+    if cross_exit_bars is None:
+        cross_exit_bars = np.flatnonzero(signals["cross_down"] & signals["tradable"])
+
+    #the bracket is set off the close of the signal bar
+    sl_price = closes[entry - 1] * p["stop_loss_pct"]
+    tp_price = closes[entry - 1] * (1 + p["take_profit_pct"])
+
+    exit_signal, reason = find_exit_signal(closes, entry, size, entry_price, cross_exit_bars,
+                                           tradable_bars, max_loss)
+
+    #bracket children are live until next() cancels them with the market close
+    last = min(exit_signal, n - 1)
+    stop_hit = lows[entry + 1:last + 1] <= sl_price
+    limit_hit = highs[entry + 1:last + 1] >= tp_price
+    first_stop = entry + 1 + np.argmax(stop_hit) if stop_hit.any() else n
+    first_limit = entry + 1 + np.argmax(limit_hit) if limit_hit.any() else n
+
+    if min(first_stop, first_limit) < n:
+        if first_stop <= first_limit:
+            exit_bar = first_stop
+            reason = EXIT_STOP
+            trigger = sl_price if opens[exit_bar] > sl_price else opens[exit_bar]
+            exit_price = _sell_price(trigger, lows[exit_bar], slippage)
+        else:
+            exit_bar = first_limit
+            reason = EXIT_LIMIT
+            if opens[exit_bar] >= tp_price:
+                exit_price = max(opens[exit_bar] * (1 - slippage), tp_price)
+            else:
+                exit_price = tp_price
+    elif exit_signal + 1 < n:
+        exit_bar = exit_signal + 1
+        exit_price = _sell_price(opens[exit_bar], lows[exit_bar], slippage)
+    else:
+        exit_bar = n
+        exit_price = np.nan
+        reason = EXIT_OPEN
+    return exit_bar, exit_price, reason
+
+def run_fast_backtest(data, params=None, cash=100000.0, commission=0.0001,
+                      slippage=0.00005, max_loss=MAX_LOSS, bank=None):
+    """
+    Run the SMA crossover strategy over whole arrays
+
+    Fill model (the same one the parity strategy places in cerebro):
+      - entry signal at bar close -> market buy at next bar open, sized off broker value
+      - stop (close * stop_loss_pct) and limit (close * (1 + take_profit_pct)) children
+        live from the bar after the entry fill, stop wins if both trigger in one bar
+      - crossover down or the max loss close -> market sell at next bar open
+    Signals are computed vectorized; the position state only loops over trades, not bars.
+    bank (indicator_bank.build_bank over the same bars) supplies precomputed SMAs.
+    """
+    p = dict(DEFAULT_PARAMS)
+    p.update(params or {})
+
+    opens = data["open"]
+    highs = data["high"]
+    lows = data["low"]
+    closes = data["close"]
+    n = len(closes)
+
+    signals = compute_signals(data, p["pfast"], p["pslow"], bank)
+    tradable = signals["tradable"]
+    entry_bars = np.flatnonzero(signals["cross_up"] & tradable)
+    cross_exit_bars = np.flatnonzero(signals["cross_down"] & tradable)
+    tradable_bars = np.flatnonzero(tradable)
+
+    trades = []
+    fills = []
+    cash_delta = np.zeros(n)
+    position = np.zeros(n)
+    broker_cash = float(cash)
+    bar = 0
+
+    while True:
+        k = np.searchsorted(entry_bars, bar)
+        if k >= len(entry_bars) or entry_bars[k] + 1 >= n:
+            break
+        signal = entry_bars[k]
+        entry = signal + 1
+
+        size = broker_cash * p["risk_per_trade"] / closes[signal]
+        entry_price = _buy_price(opens[entry], highs[entry], slippage)
+        entry_comm = size * entry_price * commission
+        if size * entry_price + entry_comm > broker_cash:
+            #margin - the order is rejected and the strategy looks again from the fill bar
+            bar = entry
+            continue
+
+        exit_bar, exit_price, reason = find_exit(
+            data, signals, p, entry, size, entry_price, slippage, max_loss,
+            cross_exit_bars, tradable_bars)
+
+        broker_cash -= size * entry_price + entry_comm
+        cash_delta[entry] -= size * entry_price + entry_comm
+        position[entry:exit_bar] = size
+        fills.append((entry, True, entry_price, size))
+
+        if reason == EXIT_OPEN:
+            pnl = size * (closes[-1] - entry_price)
+            trades.append((entry, n - 1, size, entry_price, closes[-1], pnl, pnl - entry_comm, reason))
+            break
+
+        exit_comm = size * exit_price * commission
+        broker_cash += size * exit_price - exit_comm
+        cash_delta[exit_bar] += size * exit_price - exit_comm
+        fills.append((exit_bar, False, exit_price, size))
+        pnl = size * (exit_price - entry_price)
+        trades.append((entry, exit_bar, size, entry_price, exit_price, pnl, pnl - entry_comm - exit_comm, reason))
+
+        #next() runs on the exit bar too, so a new entry can be signalled straight away
+        bar = exit_bar
+
+    cash_curve = cash + np.cumsum(cash_delta)
+    equity = cash_curve + position * closes
+
+    return {
+        "time": data.get("time"),
+        "equity": equity,
+        "cash": cash_curve,
+        "position": position,
+        "trades": np.array(trades, dtype=TRADE_DTYPE),
+        "fills": np.array(fills, dtype=FILL_DTYPE),
+        "final_value": float(equity[-1]) if n else float(cash),
+        "start": signals["start"],
+        "params": p,
+    }
+
+####################################################################################
+
+def _make_parity_strategy():
+    """SmaCrossStrategy variant that places exactly the orders the fast path models"""
+    import backtrader as bt
+    from sma_backtest import SmaCrossStrategy
+
+    class ParityStrategy(SmaCrossStrategy):
+        params = dict(max_loss=MAX_LOSS)
+
+        def __init__(self):
+            super().__init__()
+            self.fills = []
+            self.bracket = None
+
+        def next(self):
+            if self.data.close[0] < self.trend_filter[0]:
+                return
+            if self.data.volume[0] < self.volume_sma[0] * 1.0:
+                return
+
+            if self.position:
+                current_pnl = self.position.size * self.data.close[0] - self.position.size * self.position.price
+                if current_pnl <= -self.params.max_loss:
+                    self.exit_position()
+                    return
+
+            if not self.position:
+                if self.crossover > 0:
+                    price = self.data.close[0]
+                    size = self.broker.getvalue() * self.params.risk_per_trade / price
+                    self.bracket = self.buy_bracket(
+                        size=size,
+                        exectype=bt.Order.Market,
+                        stopprice=price * self.params.stop_loss_pct,
+                        limitprice=price * (1 + self.params.take_profit_pct),
+                    )
+            elif self.crossover < 0:
+                self.exit_position()
+
+        def exit_position(self):
+            #cancelling one child cancels its sibling too
+            if self.bracket is not None:
+                self.cancel(self.bracket[1])
+                self.bracket = None
+            self.close()
+
+        def notify_order(self, order):
+            if order.status == order.Completed:
+                self.fills.append((len(self) - 1, order.isbuy(), order.executed.price, abs(order.executed.size)))
+
+        def notify_trade(self, trade):
+            pass
+
+    return ParityStrategy
+
+def parity_check(data_file, params=None, cash=100000.0, commission=0.0001,
+                 slippage=0.00005, price_tol=1e-9, value_tol=0.01):
+    """Run the fast path and cerebro on the same file and compare fills and final value"""
+    import backtrader as bt
+    from sma_backtest import load_data_feed
+
+    fast = run_fast_backtest(load_ohlcv(data_file), params, cash, commission, slippage)
+
+    cerebro = bt.Cerebro()
+    cerebro.addstrategy(_make_parity_strategy(), **(params or {}))
+    cerebro.adddata(load_data_feed(data_file))
+    cerebro.broker.setcash(cash)
+    cerebro.broker.setcommission(commission=commission)
+    cerebro.broker.set_slippage_perc(slippage)
+    strat = cerebro.run()[0]
+    cerebro_value = cerebro.broker.getvalue()
+
+    cerebro_fills = np.array(strat.fills, dtype=FILL_DTYPE)
+    fast_fills = fast["fills"]
+
+    fills_match = len(fast_fills) == len(cerebro_fills)
+    mismatch = None
+    if fills_match and len(fast_fills):
+        bad = (
+            (fast_fills["bar"] != cerebro_fills["bar"])
+            | (fast_fills["is_buy"] != cerebro_fills["is_buy"])
+            | ~np.isclose(fast_fills["price"], cerebro_fills["price"], rtol=price_tol, atol=0)
+            | ~np.isclose(fast_fills["size"], cerebro_fills["size"], rtol=price_tol, atol=0)
+        )
+        if bad.any():
+            fills_match = False
+            mismatch = int(np.argmax(bad))
+    elif not fills_match:
+        #report the first fill where the two runs split
+        common = min(len(fast_fills), len(cerebro_fills))
+        split = np.flatnonzero(fast_fills["bar"][:common] != cerebro_fills["bar"][:common])
+        mismatch = int(split[0]) if len(split) else common
+
+    value_diff = fast["final_value"] - cerebro_value
+
+    return {
+        "ok": fills_match and abs(value_diff) <= value_tol,
+        "fills_match": fills_match,
+        "first_mismatch": mismatch,
+        "fast_fills": len(fast_fills),
+        "cerebro_fills": len(cerebro_fills),
+        "fast_final_value": fast["final_value"],
+        "cerebro_final_value": cerebro_value,
+        "value_diff": value_diff,
+    }
+
+####################################################################################
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vectorized SMA crossover backtest")
+    parser.add_argument("data_file", help="MT5_<symbol>_<tf>_data.csv export")
+    parser.add_argument("--parity", action="store_true", help="cross-check fills and final value against cerebro")
+    args = parser.parse_args()
+
+    result = run_fast_backtest(load_ohlcv(args.data_file))
+    trades = result["trades"]
+
+    print("Final Portfolio Value: $%.2f" % result["final_value"])
+    print(f"Total trades: {len(trades)}")
+    if len(trades):
+        print(f"Winning Trades: {int((trades['pnlcomm'] > 0).sum())}")
+        print(f"Net P&L: ${trades['pnlcomm'].sum():.2f}")
+
+    if args.parity:
+        report = parity_check(args.data_file)
+        print("\n" + "=" * 50)
+        print("PARITY CHECK")
+        print("=" * 50)
+        for key, value in report.items():
+            print(f"{key}: {value}")
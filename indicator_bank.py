@@ -0,0 +1,40 @@
+#indicator_bank.py
+#Shared bank of precomputed SMA lines for parameter sweeps
+#every run of a sweep needs the period 5 trend filter, the period 20 volume average and its own
+#pfast/pslow averages - most of them the same lines other runs need. The bank computes each distinct
+#(series, period) SMA once with the cumulative-sum sma() and param_sweep.py shares it with the
+#workers next to the OHLCV data, so runs look their averages up instead of recomputing them
+#
+#run_fast_backtest(bank=...) reads the bank directly, sma_backtest.BankSMA is the backtrader side
+
+from fast_backtest import DEFAULT_PARAMS, TREND_PERIOD, VOLUME_PERIOD, bank_key, sma
+
+####################################################################################
+
+def sweep_periods(param_sets, min_uses=2):
+    """
+    {series: periods} worth banking for param_sets - the SMAs needed by at least min_uses runs
+
+    Lines only one run needs gain nothing from the bank, they would only take up memory.
+    """
+    uses = {}
+    for params in param_sets:
+        p = dict(DEFAULT_PARAMS, **params)
+        needed = {("close", int(p["pfast"])), ("close", int(p["pslow"])),
+                  ("close", TREND_PERIOD), ("volume", VOLUME_PERIOD)}
+        for line in needed:
+            uses[line] = uses.get(line, 0) + 1
+
+    periods = {}
+    for (series, period), count in sorted(uses.items()):
+        if count >= min_uses:
+            periods.setdefault(series, []).append(period)
+    return periods
+
+def build_bank(data, periods):
+    """{bank_key: SMA line} for every series -> periods in periods, one cumulative-sum pass per line"""
+    bank = {}
+    for series, series_periods in periods.items():
+        for period in series_periods:
+            bank[bank_key(series, period)] = sma(data[series], period)
+    return bank
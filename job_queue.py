@@ -0,0 +1,375 @@
+#job_queue.py
+#Durable SQLite job queue for running parameter sweeps on several machines
+#a coordinator writes a sweep (dataset reference + config) and one job per parameter set, then any
+#number of workers - on this box or any host that can open the queue file - lease jobs a batch at a
+#time, run them through the fast path and write the metrics back
+#
+#  - a lease runs out unless its worker heartbeats it, so jobs held by a crashed or cut-off worker
+#    go back to the queue on their own and are retried (up to MAX_ATTEMPTS leases)
+#  - results are written once: a job that was re-leased and finished twice keeps the first result
+#  - workers check the digest of their copy of the data against the sweep's, so a host with
+#    different bars can't report results for it
+#
+#one host: WAL journal (the default). Several hosts: put the queue file on a share every host can
+#lock and run with --no-wal, WAL needs memory shared between the processes
+#
+#python job_queue.py submit MT5_GBPUSD_M15_data.csv --pfast 3,5,8 --pslow 10,20,30
+#python job_queue.py worker --processes 4          (on every host)
+#python job_queue.py status / collect --sweep 1
+
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+#--- USER SETUP: set BT_QUEUE_DB to keep the queue somewhere else ---
+QUEUE_PATH = os.environ.get(
+    "BT_QUEUE_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "sweep_queue.db"),
+)
+
+#seconds a lease lasts without a heartbeat, workers heartbeat every third of it
+LEASE_SECONDS = 60.0
+
+#leases a job gets before it is marked failed
+MAX_ATTEMPTS = 3
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sweeps (
+    id INTEGER PRIMARY KEY,
+    created TEXT NOT NULL,
+    data_file TEXT NOT NULL,
+    data_digest TEXT NOT NULL,
+    config TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    sweep_id INTEGER NOT NULL REFERENCES sweeps(id) ON DELETE CASCADE,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    result TEXT,
+    finished TEXT,
+    UNIQUE (sweep_id, params)
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs(status, lease_until, id);
+CREATE INDEX IF NOT EXISTS idx_jobs_sweep ON jobs(sweep_id, status);
+"""
+
+####################################################################################
+
+def connect(path=None, wal=True):
+    """Open (and create if needed) the queue database, in autocommit mode - transactions are explicit"""
+    conn = sqlite3.connect(path or QUEUE_PATH, timeout=60, isolation_level=None)
+    conn.execute(f"PRAGMA journal_mode={'WAL' if wal else 'DELETE'}")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+@contextmanager
+def _write(conn):
+    """One write transaction, holding the write lock from the start so lease reads can't race"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+def _params_text(params):
+    """Canonical JSON of a parameter set - the same set always gives the same text"""
+    return json.dumps({k: (v.item() if hasattr(v, "item") else v) for k, v in params.items()}, sort_keys=True)
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+####################################################################################
+
+def submit_sweep(data_file, param_sets, cash=100000.0, commission=0.0001, slippage=0.00005, path=None, wal=True):
+    """Queue one job per parameter set over data_file, returns the sweep id"""
+    from run_cache import data_digest
+
+    config = dict(cash=cash, commission=commission, slippage=slippage)
+    conn = connect(path, wal)
+    try:
+        with _write(conn):
+            cur = conn.execute("INSERT INTO sweeps (created, data_file, data_digest, config) VALUES (?, ?, ?, ?)",
+                               (time.strftime("%Y-%m-%dT%H:%M:%S"), os.path.abspath(data_file),
+                                data_digest(data_file), json.dumps(config)))
+            sweep_id = cur.lastrowid
+            #duplicate parameter sets collapse into one job
+            conn.executemany("INSERT OR IGNORE INTO jobs (sweep_id, params) VALUES (?, ?)",
+                             [(sweep_id, _params_text(p)) for p in param_sets])
+    finally:
+        conn.close()
+    return sweep_id
+
+def lease_jobs(conn, worker, batch=1, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+    """
+    Lease up to batch runnable jobs to worker, returns [(job id, sweep id, params)]
+
+    Runnable is pending, or leased with the lease run out (its worker stopped heartbeating).
+    Jobs whose lease ran out max_attempts times are marked failed instead.
+    """
+    now = time.time()
+    with _write(conn):
+        conn.execute(f"UPDATE jobs SET status = '{FAILED}', error = 'lease lost {max_attempts} times', worker = NULL "
+                     f"WHERE status = '{LEASED}' AND lease_until < ? AND attempts >= ?", (now, max_attempts))
+        rows = conn.execute(f"SELECT id, sweep_id, params FROM jobs "
+                            f"WHERE status = '{PENDING}' OR (status = '{LEASED}' AND lease_until < ?) "
+                            f"ORDER BY id LIMIT ?", (now, batch)).fetchall()
+        conn.executemany(f"UPDATE jobs SET status = '{LEASED}', worker = ?, lease_until = ?, attempts = attempts + 1 "
+                         f"WHERE id = ?", [(worker, now + lease_seconds, job_id) for job_id, _, _ in rows])
+    return [(job_id, sweep_id, json.loads(params)) for job_id, sweep_id, params in rows]
+
+def heartbeat(conn, worker, job_ids, lease_seconds=LEASE_SECONDS):
+    """Extend worker's leases on job_ids, returns how many it still holds"""
+    if not job_ids:
+        return 0
+    marks = ", ".join("?" * len(job_ids))
+    with _write(conn):
+        cur = conn.execute(f"UPDATE jobs SET lease_until = ? WHERE worker = ? AND status = '{LEASED}' "
+                           f"AND id IN ({marks})", [time.time() + lease_seconds, worker] + list(job_ids))
+    return cur.rowcount
+
+def complete_job(conn, job_id, worker, result):
+    """
+    Write a job's result, returns False when it already had one
+
+    Runs are deterministic, so when a lost lease got a job run twice the first result stands
+    and the second write is a no-op - whichever worker held the lease last.
+    """
+    with _write(conn):
+        cur = conn.execute(f"UPDATE jobs SET status = '{DONE}', result = ?, worker = ?, finished = ?, error = NULL "
+                           f"WHERE id = ? AND status != '{DONE}'",
+                           (json.dumps(result), worker, time.strftime("%Y-%m-%dT%H:%M:%S"), job_id))
+    return cur.rowcount == 1
+
+def fail_job(conn, job_id, worker, error, max_attempts=MAX_ATTEMPTS):
+    """Hand a job that raised back to the queue, or mark it failed after max_attempts"""
+    with _write(conn):
+        conn.execute(f"UPDATE jobs SET status = CASE WHEN attempts >= ? THEN '{FAILED}' ELSE '{PENDING}' END, "
+                     f"error = ?, worker = NULL, lease_until = NULL "
+                     f"WHERE id = ? AND worker = ? AND status = '{LEASED}'", (max_attempts, error, job_id, worker))
+
+def release_jobs(conn, worker, job_ids):
+    """Hand leased jobs back to the queue untouched, the lease does not count as an attempt"""
+    with _write(conn):
+        conn.executemany(f"UPDATE jobs SET status = '{PENDING}', worker = NULL, lease_until = NULL, "
+                         f"attempts = attempts - 1 WHERE id = ? AND worker = ? AND status = '{LEASED}'",
+                         [(job_id, worker) for job_id in job_ids])
+
+def sweep_status(sweep_id=None, path=None, wal=True):
+    """{status: job count}, for one sweep or the whole queue"""
+    conn = connect(path, wal)
+    try:
+        where, args = ("WHERE sweep_id = ?", [sweep_id]) if sweep_id is not None else ("", [])
+        return dict(conn.execute(f"SELECT status, COUNT(*) FROM jobs {where} GROUP BY status", args).fetchall())
+    finally:
+        conn.close()
+
+def collect_sweep(sweep_id, path=None, wal=True, rank_by="sharpe", ascending=False):
+    """Finished jobs of a sweep as a run_sweep style table (params + metrics), ranked by rank_by"""
+    conn = connect(path, wal)
+    try:
+        rows = conn.execute(f"SELECT params, result FROM jobs WHERE sweep_id = ? AND status = '{DONE}'",
+                            (sweep_id,)).fetchall()
+    finally:
+        conn.close()
+    records = []
+    for params, result in rows:
+        record = json.loads(params)
+        record.update(json.loads(result))
+        records.append(record)
+    import pandas as pd  # only collecting needs pandas, the workers never do
+
+    table = pd.DataFrame(records)
+    if not table.empty:
+        table = table.sort_values(rank_by, ascending=ascending, na_position="last").reset_index(drop=True)
+    return table
+
+####################################################################################
+
+class _Heartbeat(threading.Thread):
+    """Keeps a worker's current leases alive from its own connection while the jobs run"""
+
+    def __init__(self, path, wal, worker, lease_seconds):
+        super().__init__(daemon=True)
+        self.path, self.wal, self.worker, self.lease_seconds = path, wal, worker, lease_seconds
+        self.job_ids = []
+        self.stopped = threading.Event()
+
+    def run(self):
+        conn = connect(self.path, self.wal)
+        try:
+            while not self.stopped.wait(self.lease_seconds / 3):
+                try:
+                    heartbeat(conn, self.worker, list(self.job_ids), self.lease_seconds)
+                except sqlite3.Error as e:
+                    print(f"Heartbeat error: {e}")
+        finally:
+            conn.close()
+
+def _load_sweep(conn, sweep_id, data_file=None):
+    """Data, run cache key, indicator bank and config for a sweep, checked against its data digest"""
+    from fast_backtest import load_ohlcv
+    from indicator_bank import build_bank, sweep_periods
+    from run_cache import data_digest
+
+    stored_file, digest, config = conn.execute("SELECT data_file, data_digest, config FROM sweeps WHERE id = ?",
+                                               (sweep_id,)).fetchone()
+    data_file = data_file or stored_file
+    if data_digest(data_file) != digest:
+        raise ValueError(f"{data_file} does not hold the bars sweep {sweep_id} was submitted with")
+    param_sets = [json.loads(p) for (p,) in conn.execute("SELECT params FROM jobs WHERE sweep_id = ?", (sweep_id,))]
+    data = load_ohlcv(data_file)
+    return data, digest, build_bank(data, sweep_periods(param_sets)), json.loads(config)
+
+def run_worker(path=None, worker=None, batch=4, lease_seconds=LEASE_SECONDS, poll=2.0, wait=False,
+               data_file=None, wal=True):
+    """
+    Lease, run and report jobs until the queue is empty (or forever with wait), returns jobs completed
+
+    data_file overrides where the sweep's data lives on this host (it must hold the same bars).
+    """
+    from param_sweep import summarize_cached
+
+    worker = worker or default_worker_id()
+    conn = connect(path, wal)
+    beat = _Heartbeat(path, wal, worker, lease_seconds)
+    beat.start()
+    sweeps = {}
+    done = 0
+    try:
+        while True:
+            jobs = lease_jobs(conn, worker, batch, lease_seconds)
+            if not jobs:
+                #leases still held elsewhere may yet run out and need picking up
+                busy = conn.execute(f"SELECT COUNT(*) FROM jobs WHERE status = '{LEASED}'").fetchone()[0]
+                if not wait and not busy:
+                    return done
+                time.sleep(poll)
+                continue
+
+            beat.job_ids = [job_id for job_id, _, _ in jobs]
+            for i, (job_id, sweep_id, params) in enumerate(jobs):
+                if sweep_id not in sweeps:
+                    try:
+                        sweeps[sweep_id] = _load_sweep(conn, sweep_id, data_file)
+                    except (OSError, ValueError) as e:
+                        #this host can't run the sweep at all - leave its jobs to the others
+                        print(f"Worker {worker} stopping: {e}")
+                        release_jobs(conn, worker, [job[0] for job in jobs[i:]])
+                        return done
+                try:
+                    data, digest, bank, config = sweeps[sweep_id]
+                    result = summarize_cached(data, params, config, digest, bank)
+                except Exception as e:
+                    print(f"Job {job_id} failed: {e}")
+                    fail_job(conn, job_id, worker, str(e))
+                    continue
+                if complete_job(conn, job_id, worker, result):
+                    done += 1
+            beat.job_ids = []
+    finally:
+        beat.stopped.set()
+        beat.join()
+        conn.close()
+
+def _worker_process(kwargs):
+    return run_worker(**kwargs)
+
+####################################################################################
+
+def _parse_list(text, cast):
+    return [cast(x) for x in text.split(",") if x.strip()]
+
+if __name__ == "__main__":
+    from concurrent.futures import ProcessPoolExecutor
+
+    parser = argparse.ArgumentParser(description="Distributed parameter sweeps through a shared SQLite job queue")
+    parser.add_argument("--queue", default=None, help=f"queue database (default {QUEUE_PATH})")
+    parser.add_argument("--no-wal", action="store_true", help="rollback journal, for a queue on a network share")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    submit = commands.add_parser("submit", help="queue a sweep")
+    submit.add_argument("data_file", help="MT5_<symbol>_<tf>_data.csv export")
+    submit.add_argument("--pfast", default="5", help="comma separated values")
+    submit.add_argument("--pslow", default="10")
+    submit.add_argument("--stop-loss-pct", default="0.15")
+    submit.add_argument("--take-profit-pct", default="0.35")
+
+    work = commands.add_parser("worker", help="run queued jobs")
+    work.add_argument("--processes", type=int, default=1, help="worker processes to start on this host")
+    work.add_argument("--batch", type=int, default=4, help="jobs leased at a time")
+    work.add_argument("--lease", type=float, default=LEASE_SECONDS, help="lease length in seconds")
+    work.add_argument("--wait", action="store_true", help="keep polling for new sweeps instead of exiting when idle")
+    work.add_argument("--data-file", default=None, help="this host's copy of the sweep data, if not at the submitted path")
+
+    status = commands.add_parser("status", help="job counts")
+    status.add_argument("--sweep", type=int, default=None)
+
+    collect = commands.add_parser("collect", help="ranked results of a sweep")
+    collect.add_argument("--sweep", type=int, required=True)
+    collect.add_argument("--rank-by", default="sharpe")
+    collect.add_argument("--top", type=int, default=20)
+    collect.add_argument("--db", default=None, help="also store the runs in this results database")
+    args = parser.parse_args()
+    wal = not args.no_wal
+
+    if args.command == "submit":
+        from config import load_config
+        from param_sweep import param_grid
+
+        grid = param_grid(
+            pfast=_parse_list(args.pfast, int),
+            pslow=_parse_list(args.pslow, int),
+            stop_loss_pct=_parse_list(args.stop_loss_pct, float),
+            take_profit_pct=_parse_list(args.take_profit_pct, float),
+        )
+        settings = load_config()
+        sweep_id = submit_sweep(args.data_file, grid, settings["cash"], settings["commission"], settings["slippage"],
+                                path=args.queue, wal=wal)
+        print(f"Sweep {sweep_id}: {len(grid)} jobs queued in {args.queue or QUEUE_PATH}")
+
+    elif args.command == "worker":
+        start = time.perf_counter()
+        kwargs = dict(path=args.queue, batch=args.batch, lease_seconds=args.lease, wait=args.wait,
+                      data_file=args.data_file, wal=wal)
+        if args.processes == 1:
+            done = run_worker(**kwargs)
+        else:
+            with ProcessPoolExecutor(max_workers=args.processes) as pool:
+                done = sum(pool.map(_worker_process, [kwargs] * args.processes))
+        print(f"{done} jobs completed in {time.perf_counter() - start:.2f}s")
+
+    elif args.command == "status":
+        counts = sweep_status(args.sweep, args.queue, wal)
+        print(", ".join(f"{counts.get(s, 0)} {s}" for s in (PENDING, LEASED, DONE, FAILED)))
+
+    else:
+        table = collect_sweep(args.sweep, args.queue, wal, args.rank_by, ascending=args.rank_by == "max_drawdown")
+        print(table.head(args.top).to_string())
+        if args.db and not table.empty:
+            from results_db import save_sweep
+
+            conn = connect(args.queue, wal)
+            data_file, config = conn.execute("SELECT data_file, config FROM sweeps WHERE id = ?", (args.sweep,)).fetchone()
+            conn.close()
+            ids = save_sweep(table, ["pfast", "pslow", "stop_loss_pct", "take_profit_pct"], data_file=data_file,
+                             start_cash=json.loads(config)["cash"], source="queue", path=args.db)
+            print(f"{len(ids)} runs stored in the results database")
@@ -0,0 +1,132 @@
+#metrics.py
+#Performance metrics computed straight from an equity curve and the closed-trade P&L
+#one vectorized pass over the arrays instead of per-bar analyzers inside the event loop, so
+#backtests, sweeps, walk-forward windows and the dashboard all report the same numbers
+
+import numpy as np
+
+####################################################################################
+
+SECONDS_PER_YEAR = 365.25 * 86400
+
+def years_spanned(times):
+    """Calendar years from the first to the last bar (epoch seconds), None without usable times"""
+    if times is None or len(times) < 2:
+        return None
+    years = float(times[-1] - times[0]) / SECONDS_PER_YEAR
+    return years if years > 0 else None
+
+def periods_per_year(times):
+    """
+    Bars per year - the bars observed over the calendar years they span
+
+    Counting the bars that actually exist keeps weekend and holiday gaps out of it, so
+    weekday-only FX data isn't annualized as if it traded around the clock. 252 without times.
+    """
+    years = years_spanned(times)
+    if years is None:
+        return 252.0
+    return (len(times) - 1) / years
+
+def drawdown_series(equity):
+    """Drawdown from the running peak on every bar, in % (0 at a new high, negative below it)"""
+    equity = np.asarray(equity, dtype=np.float64)
+    if not len(equity):
+        return equity
+    running_max = np.maximum.accumulate(equity)
+    return (equity - running_max) / running_max * 100
+
+def drawdown_stats(equity, times=None):
+    """
+    Max and average drawdown depth (positive %) and the longest time under water
+
+    A drawdown episode runs from a peak until equity makes a new high (or the data
+    ends), the average is over the episodes' deepest points.
+    """
+    drawdown = drawdown_series(equity)
+    stats = {"max_drawdown": 0.0, "avg_drawdown": 0.0, "max_drawdown_bars": 0, "max_drawdown_days": 0.0}
+    if not len(drawdown):
+        return stats
+
+    #every new high starts a new episode
+    at_peak = drawdown >= 0
+    starts = np.flatnonzero(at_peak)
+    if not len(starts) or starts[0] != 0:
+        starts = np.insert(starts, 0, 0)
+    depths = np.minimum.reduceat(drawdown, starts)
+    ends = np.append(starts[1:], len(drawdown))
+    underwater = depths < 0
+
+    stats["max_drawdown"] = float(-drawdown.min())
+    if underwater.any():
+        stats["avg_drawdown"] = float(-depths[underwater].mean())
+        #bars from the peak to the bar that recovers it (or the last bar)
+        lengths = np.where(ends < len(drawdown), ends - starts, ends - 1 - starts)[underwater]
+        longest = int(np.argmax(lengths))
+        stats["max_drawdown_bars"] = int(lengths[longest])
+        if times is not None and len(times) == len(drawdown):
+            start = starts[underwater][longest]
+            stats["max_drawdown_days"] = float((times[start + lengths[longest]] - times[start]) / 86400)
+    return stats
+
+def trade_stats(pnls):
+    """Win rate, profit factor, expectancy and average win/loss from closed-trade P&L"""
+    pnls = np.asarray(pnls, dtype=np.float64)
+    if not len(pnls):
+        return {"trades": 0, "win_rate": np.nan, "profit_factor": np.nan, "expectancy": np.nan,
+                "avg_win": np.nan, "avg_loss": np.nan}
+
+    #same split as TradeAnalyzer - a break-even trade counts as won
+    won = pnls >= 0
+    gross_win = pnls[won].sum()
+    gross_loss = -pnls[~won].sum()
+    return {
+        "trades": int(len(pnls)),
+        "win_rate": float(won.mean() * 100),
+        "profit_factor": float(gross_win / gross_loss) if gross_loss > 0 else np.inf,
+        "expectancy": float(pnls.mean()),
+        "avg_win": float(pnls[won].mean()) if won.any() else np.nan,
+        "avg_loss": float(pnls[~won].mean()) if (~won).any() else np.nan,
+    }
+
+def compute_metrics(equity, times=None, pnls=None, position=None, start_cash=None):
+    """
+    Every metric for one run
+
+    equity (and times/position when given) are per bar, pnls is the net P&L per closed
+    trade. Sharpe and Sortino are per-bar returns annualized with the bar spacing,
+    Calmar is the annualized return over the max drawdown.
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    start_cash = float(start_cash if start_cash is not None else (equity[0] if len(equity) else 0.0))
+    final_value = float(equity[-1]) if len(equity) else start_cash
+    ppy = periods_per_year(times)
+
+    returns = np.diff(equity) / equity[:-1] if len(equity) > 1 else np.array([])
+    std = returns.std() if len(returns) else 0.0
+    sharpe = returns.mean() / std * np.sqrt(ppy) if std > 0 else np.nan
+    downside = np.sqrt(np.mean(np.minimum(returns, 0.0) ** 2)) if len(returns) else 0.0
+    sortino = returns.mean() / downside * np.sqrt(ppy) if downside > 0 else np.nan
+
+    dd = drawdown_stats(equity, times)
+    #the real time span when bar times are known, the bar count over the assumed rate otherwise
+    years = years_spanned(times) if times is not None and len(times) == len(equity) else None
+    if years is None:
+        years = len(equity) / ppy if len(equity) else 0.0
+    growth = final_value / start_cash if start_cash > 0 else np.nan
+    annual_return = (growth ** (1 / years) - 1) * 100 if years > 0 and growth > 0 else np.nan
+    calmar = annual_return / dd["max_drawdown"] if dd["max_drawdown"] > 0 else np.nan
+
+    metrics = {
+        "final_value": final_value,
+        "net_pnl": final_value - start_cash,
+        "total_return": (growth - 1) * 100 if start_cash > 0 else np.nan,
+        "annual_return": float(annual_return),
+        "sharpe": float(sharpe),
+        "sortino": float(sortino),
+        "calmar": float(calmar),
+    }
+    metrics.update(dd)
+    metrics["exposure"] = float((np.asarray(position) != 0).mean() * 100) if position is not None and len(position) else np.nan
+    metrics.update(trade_stats(pnls if pnls is not None else []))
+    return metrics
@@ -0,0 +1,124 @@
+#monte_carlo.py
+#Monte Carlo robustness check on the closed-trade P&L sequence of a run
+#resamples the trades into many alternative equity paths in one NumPy batch:
+#  bootstrap - draw trades with replacement (final equity and drawdown both vary)
+#  shuffle   - reorder the same trades (final equity is fixed, only the path/drawdown varies)
+#and reports the spread of final equity, max drawdown and the risk of ruin
+#
+#python monte_carlo.py backtest_results_GBPUSD_H4.npz --paths 100000
+
+import argparse
+
+import numpy as np
+
+from backtest_results import TRADE_FIELDS, load_results
+
+#paths x trades values held in memory at once, the batch is split into chunks beyond this
+MAX_CHUNK_VALUES = 4_000_000
+
+PERCENTILES = [5, 25, 50, 75, 95]
+
+####################################################################################
+
+def trade_pnls(results):
+    """Net (after commission) P&L of every closed trade in a results artifact, in order"""
+    trades = np.asarray(results.get("trades", []), dtype=np.float64)
+    if not len(trades):
+        return np.empty(0)
+    return trades[:, TRADE_FIELDS.index("pnlcomm")]
+
+def simulate(pnls, start_cash, n_paths=10000, method="bootstrap", ruin_drawdown=0.5, seed=None):
+    """
+    Resample pnls into n_paths equity paths
+
+    Returns a dict of per-path arrays: final_equity, max_drawdown (% from the running
+    peak, negative like plot_drawdown) and ruined (equity fell ruin_drawdown below
+    the starting cash at some point).
+    """
+    pnls = np.asarray(pnls, dtype=np.float64)
+    n_trades = len(pnls)
+    if method not in ("bootstrap", "shuffle"):
+        raise ValueError(f"unknown method {method!r}, use bootstrap or shuffle")
+
+    final_equity = np.full(n_paths, float(start_cash))
+    max_drawdown = np.zeros(n_paths)
+    ruined = np.zeros(n_paths, dtype=bool)
+    if n_trades == 0:
+        return {"final_equity": final_equity, "max_drawdown": max_drawdown, "ruined": ruined}
+
+    rng = np.random.default_rng(seed)
+    ruin_level = start_cash * (1 - ruin_drawdown)
+    chunk = max(1, MAX_CHUNK_VALUES // n_trades)
+
+    for start in range(0, n_paths, chunk):
+        stop = min(start + chunk, n_paths)
+        m = stop - start
+        if method == "bootstrap":
+            draws = pnls[rng.integers(0, n_trades, size=(m, n_trades))]
+        else:
+            draws = rng.permuted(np.tile(pnls, (m, 1)), axis=1)
+
+        equity = np.cumsum(draws, axis=1)
+        equity += start_cash
+        #the starting cash is the first peak
+        peak = np.maximum.accumulate(np.maximum(equity, start_cash), axis=1)
+        drawdown = (equity - peak) / peak * 100
+
+        final_equity[start:stop] = equity[:, -1]
+        max_drawdown[start:stop] = np.minimum(drawdown.min(axis=1), 0.0)
+        ruined[start:stop] = equity.min(axis=1) <= ruin_level
+
+    return {"final_equity": final_equity, "max_drawdown": max_drawdown, "ruined": ruined}
+
+def summarize(paths, start_cash):
+    """Percentiles of final equity and max drawdown, chance of a loss and risk of ruin"""
+    final_equity = paths["final_equity"]
+    max_drawdown = paths["max_drawdown"]
+    return {
+        "paths": int(len(final_equity)),
+        "final_equity": dict(zip(PERCENTILES, np.percentile(final_equity, PERCENTILES).tolist())),
+        "max_drawdown": dict(zip(PERCENTILES, np.percentile(max_drawdown, PERCENTILES).tolist())),
+        "mean_final_equity": float(final_equity.mean()),
+        "prob_loss": float((final_equity < start_cash).mean()),
+        "risk_of_ruin": float(paths["ruined"].mean()),
+    }
+
+def run_monte_carlo(results, n_paths=10000, method="bootstrap", ruin_drawdown=0.5, seed=None):
+    """simulate + summarize for a results artifact, returns (paths, summary) or None without trades"""
+    pnls = trade_pnls(results)
+    if not len(pnls):
+        return None
+    start_cash = results["start_cash"]
+    paths = simulate(pnls, start_cash, n_paths, method, ruin_drawdown, seed)
+    return paths, summarize(paths, start_cash)
+
+####################################################################################
+
+if __name__ == "__main__":
+    import time
+
+    parser = argparse.ArgumentParser(description="Monte Carlo trade resampling for a saved backtest")
+    parser.add_argument("results_file", help="backtest_results_<symbol>_<tf>.npz from sma_backtest.py")
+    parser.add_argument("--paths", type=int, default=10000)
+    parser.add_argument("--method", choices=["bootstrap", "shuffle"], default="bootstrap")
+    parser.add_argument("--ruin", type=float, default=0.5, help="drawdown from the starting cash that counts as ruin")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    results = load_results(args.results_file)
+    start = time.perf_counter()
+    out = run_monte_carlo(results, args.paths, args.method, args.ruin, args.seed)
+    if out is None:
+        print("No closed trades in the results - nothing to resample")
+        raise SystemExit(1)
+    paths, summary = out
+
+    print("=" * 50)
+    print(f"MONTE CARLO ({summary['paths']} {args.method} paths, {len(trade_pnls(results))} trades, "
+          f"{time.perf_counter() - start:.2f}s)")
+    print("=" * 50)
+    print(f"{'percentile':>10} {'final equity':>15} {'max drawdown':>14}")
+    for p in PERCENTILES:
+        print(f"{p:>10} {summary['final_equity'][p]:>15.2f} {summary['max_drawdown'][p]:>13.2f}%")
+    print(f"Chance of a loss: {summary['prob_loss'] * 100:.2f}%")
+    print(f"Risk of ruin ({args.ruin * 100:.0f}% drawdown): {summary['risk_of_ruin'] * 100:.2f}%")
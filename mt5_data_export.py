@@ -1,12 +1,38 @@
 #mt5_data_export.py
-import MetaTrader5 as mt5
-import pandas as pd
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
+import threading
 import time
-import shutil
 import os
+import json
+import numpy as np
+from config import setting
+from data_cache import COLUMNS, META_FILE, cache_dir_for, source_stamp, write_meta
 
+try:
+    import MetaTrader5 as mt5
+except ImportError:
+    mt5 = None  # the terminal package only exists on Windows - a stub source can stand in
 
+#--- USER SETUP: data_save_dir in backtest_config.json (see config.py) ---
+DATA_SAVE_DIR = setting("data_save_dir")
+
+#bars requested per copy_rates call on a full download - bounds memory however far back it goes
+PAGE_BARS = 100_000
+
+#bar length per timeframe, used to sanity check incremental updates (MN1 has no fixed length)
+TIMEFRAME_SECONDS = {
+    "M1": 60,
+    "M5": 300,
+    "M15": 900,
+    "M30": 1800,
+    "H1": 3600,
+    "H4": 14400,
+    "D1": 86400,
+    "W1": 604800,
+    "MN1": None,
+}
 
 def initialize_mt5():
     """Initialize connection to MetaTrader5"""
@@ -16,69 +42,402 @@ def initialize_mt5():
     print("MT5 initialized successfully")
     return True
 
-def get_mt5_data(symbol, timeframe, days_back=365):
-    """Get historical data from MT5"""
-    try:
-        #check if symbol exists
-        symbol_info = mt5.symbol_info(symbol)
-        if symbol_info is None:
-            print(f"Symbol {symbol} not found, trying to add it...")
-            mt5.symbol_select(symbol, True)
-            time.sleep(2) #wait for symbol to add
-
-        #set timeframe mapping
-        tf_mapping = {
-            "M1": mt5.TIMEFRAME_M1,
-            "M5": mt5.TIMEFRAME_M5,
-            "M15": mt5.TIMEFRAME_M15,
-            "M30": mt5.TIMEFRAME_M30,
-            "H1": mt5.TIMEFRAME_H1,
-            "H4": mt5.TIMEFRAME_H4,
-            "D1": mt5.TIMEFRAME_D1,
-            "W1": mt5.TIMEFRAME_W1,
-            "MN1": mt5.TIMEFRAME_MN1,
-        }
+class Mt5Source:
+    """
+    Data source backed by the MetaTrader5 terminal
+
+    Anything with the same four methods can stand in for it (eg a local stub in tests):
+      initialize() -> bool, shutdown(), last_error(),
+      copy_rates(symbol, timeframe, start_date, end_date) -> MT5 rates array or None
+    """
+
+    def __init__(self):
+        #the terminal is one IPC connection, so calls into it are serialized
+        self.lock = threading.Lock()
+
+    def initialize(self):
+        return initialize_mt5()
+
+    def shutdown(self):
+        mt5.shutdown()
+
+    def last_error(self):
+        return mt5.last_error()
 
-        timeframe_val = tf_mapping.get(timeframe, mt5.TIMEFRAME_D1)
+    def copy_rates(self, symbol, timeframe, start_date, end_date):
+        with self.lock:
+            #check if symbol exists
+            symbol_info = mt5.symbol_info(symbol)
+            if symbol_info is None:
+                print(f"Symbol {symbol} not found, trying to add it...")
+                mt5.symbol_select(symbol, True)
+                time.sleep(2) #wait for symbol to add
 
+            #set timeframe mapping
+            tf_mapping = {
+                "M1": mt5.TIMEFRAME_M1,
+                "M5": mt5.TIMEFRAME_M5,
+                "M15": mt5.TIMEFRAME_M15,
+                "M30": mt5.TIMEFRAME_M30,
+                "H1": mt5.TIMEFRAME_H1,
+                "H4": mt5.TIMEFRAME_H4,
+                "D1": mt5.TIMEFRAME_D1,
+                "W1": mt5.TIMEFRAME_W1,
+                "MN1": mt5.TIMEFRAME_MN1,
+            }
+
+            timeframe_val = tf_mapping.get(timeframe, mt5.TIMEFRAME_D1)
+
+            #get historical dates
+            return mt5.copy_rates_range(symbol, timeframe_val, start_date, end_date)
+
+#source used when none is passed in
+default_source = Mt5Source()
+
+def get_mt5_data(symbol, timeframe, days_back=365, start_date=None, source=None):
+    """
+    Get historical data from MT5 (from start_date when given, else the last days_back days)
+
+    One request into one DataFrame - meant for short ranges like the tail of an incremental
+    update, full downloads go through download_history's pages.
+    """
+    source = source or default_source
+    try:
         #calculate date range
         end_date = datetime.now()
-        start_date = end_date - timedelta(days=days_back)
+        if start_date is None:
+            start_date = end_date - timedelta(days=days_back)
 
         print(f"Downloading {symbol} {timeframe} data from {start_date} to {end_date}...")
 
-        #get historical dates
-        rates = mt5.copy_rates_range(symbol, timeframe_val, start_date, end_date)
+        rates = source.copy_rates(symbol, timeframe, start_date, end_date)
 
         if rates is None:
-            print("No data returned, error:", mt5.last_error())
+            print("No data returned, error:", source.last_error())
             return None
         
-        #create dataframe
-        df = pd.DataFrame(rates)
-        df["time"] = pd.to_datetime(df["time"], unit="s")
-        df.set_index("time", inplace=True)
-
-        #rename columns for backtrader
-        df.rename(columns={
-            "open": "Open",
-            "high": "High",
-            "low": "Low",
-            "close": "Close",
-            "tick_volume": "Volume"
-        }, inplace=True)
-
-        #keep only needed columns
-        df = df[["Open", "High", "Low", "Close", "Volume"]]
-
-        return df
+        return rates_to_frame(rates)
     
     except Exception as e:
         print(f"Error: {e}")
         return None
+
+def rates_to_frame(rates):
+    """Convert MT5 rates into the Open/High/Low/Close/Volume frame backtrader reads"""
+    import pandas as pd
+
+    #create dataframe
+    df = pd.DataFrame(rates)
+    df["time"] = pd.to_datetime(df["time"], unit="s")
+    df.set_index("time", inplace=True)
+
+    #rename columns for backtrader
+    df.rename(columns={
+        "open": "Open",
+        "high": "High",
+        "low": "Low",
+        "close": "Close",
+        "tick_volume": "Volume"
+    }, inplace=True)
+
+    #keep only needed columns
+    df = df[["Open", "High", "Low", "Close", "Volume"]]
+
+    return df
+
+def save_csv(df, filename, timeframe, append=False):
+    """Write bars in the export layout - daily and up as plain dates, intraday with a time"""
+    date_format = "%Y-%m-%d" if timeframe in ("D1", "W1", "MN1") else "%Y-%m-%d %H:%M:%S"
+    df.to_csv(filename, mode="a" if append else "w", header=not append, date_format=date_format)
+
+def rates_to_columns(rates):
+    """MT5 rates -> data_cache column arrays, without going through a DataFrame"""
+    return {
+        "time": rates["time"].astype(np.int64),
+        "open": rates["open"],
+        "high": rates["high"],
+        "low": rates["low"],
+        "close": rates["close"],
+        "volume": rates["tick_volume"].astype(np.float64),
+    }
+
+def download_history(symbol, timeframe, filename, days_back=365, start_date=None, source=None,
+                     page_bars=PAGE_BARS):
+    """
+    Full download of an export, PAGE_BARS bars per request
+
+    Every page is appended to filename.part and to the binary cache columns as soon as it
+    arrives, so only one page is ever in memory, and the binary cache is ready without
+    re-parsing the CSV. Progress is saved after each page in filename.progress.json - a
+    download that fails or is interrupted picks up after the last complete page next time it is
+    asked for the same range (same days_back / start_date).
+    Returns the number of bars written, or None on failure (progress is kept).
+    """
+    source = source or default_source
+    end_date = datetime.now()
+    #the range as it was asked for - days_back moves with the clock, so it is kept as the number
+    requested = {"days_back": None if start_date else days_back,
+                 "start_date": start_date.isoformat() if start_date else None}
+    if start_date is None:
+        start_date = end_date - timedelta(days=days_back)
+
+    part = filename + ".part"
+    progress_file = filename + ".progress.json"
+    cache_dir = cache_dir_for(filename)
+    column_files = {name: os.path.join(cache_dir, f"{name}.bin.download") for name in COLUMNS}
+
+    progress = None
+    try:
+        with open(progress_file, "r") as f:
+            progress = json.load(f)
+        if (progress.get("symbol"), progress.get("timeframe"), progress.get("requested")) != (
+                symbol, timeframe, requested):
+            print(f"{symbol} {timeframe}: saved progress is for another range, starting over")
+            progress = None
+    except (OSError, ValueError):
+        pass
+
+    if progress is None:
+        progress = {"symbol": symbol, "timeframe": timeframe, "requested": requested,
+                    "next": start_date.isoformat(), "last_time": None, "rows": 0, "csv_bytes": 0}
+    else:
+        print(f"{symbol} {timeframe}: resuming from {progress['next']} ({progress['rows']} bars already saved)")
+
+    #a page that was being written when it stopped is dropped and fetched again
+    os.makedirs(cache_dir, exist_ok=True)
+    try:
+        os.remove(os.path.join(cache_dir, META_FILE))
+    except FileNotFoundError:
+        pass
+    for path, size in [(part, progress["csv_bytes"])] + [
+            (column_files[name], progress["rows"] * np.dtype(dtype).itemsize) for name, dtype in COLUMNS.items()]:
+        with open(path, "ab") as f:
+            f.truncate(size)
+
+    seconds = TIMEFRAME_SECONDS.get(timeframe)
+    page = timedelta(seconds=page_bars * seconds) if seconds else end_date - start_date
+    page_start = datetime.fromisoformat(progress["next"])
+    print(f"Downloading {symbol} {timeframe} data from {page_start} to {end_date}...")
+
+    while page_start < end_date:
+        page_end = min(page_start + page, end_date)
+        try:
+            rates = source.copy_rates(symbol, timeframe, page_start, page_end)
+        except Exception as e:
+            #a dropped terminal connection mid-download - the saved pages stay for the retry
+            print(f"{symbol} {timeframe}: request failed ({e}), progress kept")
+            return None
+        if rates is None:
+            print("No data returned, error:", source.last_error())
+            return None
+
+        #pages share their boundary bar
+        if progress["last_time"] is not None and len(rates):
+            rates = rates[rates["time"] > progress["last_time"]]
+        if len(rates):
+            save_csv(rates_to_frame(rates), part, timeframe, append=progress["csv_bytes"] > 0)
+            for name, values in rates_to_columns(rates).items():
+                with open(column_files[name], "ab") as f:
+                    np.ascontiguousarray(values, dtype=COLUMNS[name]).tofile(f)
+            progress["rows"] += len(rates)
+            progress["last_time"] = int(rates["time"][-1])
+            progress["csv_bytes"] = os.path.getsize(part)
+
+        progress["next"] = page_end.isoformat()
+        tmp = progress_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(progress, f)
+        os.replace(tmp, progress_file)
+        page_start = page_end
+
+    if progress["rows"] == 0:
+        #nothing to resume - a stale progress file would make the next call skip the whole range
+        print(f"{symbol} {timeframe}: no bars in the range")
+        for path in [part, progress_file] + list(column_files.values()):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return None
+
+    os.replace(part, filename)
+    for name, path in column_files.items():
+        os.replace(path, os.path.join(cache_dir, f"{name}.bin"))
+    meta = {"rows": progress["rows"], "columns": COLUMNS}
+    meta.update(source_stamp(filename))
+    write_meta(cache_dir, meta)
+    os.remove(progress_file)
+    return progress["rows"]
+
+def read_last_bar(filename):
+    """Last stored bar of an export as (timestamp, open, byte offset of that line), None if unusable"""
+    try:
+        with open(filename, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            #the last bar fits easily in the final 4kb
+            f.seek(max(0, size - 4096))
+            tail = f.read()
+        lines = tail.rstrip(b"\r\n").split(b"\n")
+        if len(lines) < 2 and size > 4096:
+            return None
+        last_line = lines[-1]
+        fields = last_line.decode().strip().split(",")
+        if fields[0] == "time":
+            return None  # header only
+        offset = size - len(tail) + tail.rindex(last_line)
+        import pandas as pd
+        return pd.Timestamp(fields[0]), float(fields[1]), offset
+    except (OSError, ValueError, IndexError):
+        return None
+
+def update_mt5_data(symbol, timeframe, filename, days_back=365, source=None):
+    """
+    Incrementally update a stored export - fetches only bars from the last stored one onward
+
+    The last stored bar is usually still forming when it was saved, so it is re-fetched and
+    replaced rather than kept. Falls back to a full re-pull of days_back when the file is
+    missing or the new bars do not line up with what is stored (gap, changed history).
+    Returns the number of bars written, or None on failure.
+    """
+    last = read_last_bar(filename) if os.path.exists(filename) else None
+
+    if last is not None:
+        last_time, last_open, offset = last
+        df = get_mt5_data(symbol, timeframe, start_date=last_time.to_pydatetime(), source=source)
+        if df is None:
+            return None
+        if df.empty:
+            print(f"{symbol} {timeframe}: no new bars")
+            return 0
+
+        reason = check_delta(df, last_time, last_open, timeframe)
+        if reason is None:
+            #drop the stored boundary bar and append its fresh version plus everything newer
+            with open(filename, "r+b") as f:
+                f.truncate(offset)
+            save_csv(df, filename, timeframe, append=True)
+            print(f"{symbol} {timeframe}: appended {len(df) - 1} new bars up to {df.index[-1]}")
+            return len(df)
+
+        print(f"{symbol} {timeframe}: {reason}, doing a full re-pull")
+
+    written = download_history(symbol, timeframe, filename, days_back, source=source)
+    if written:
+        print(f"{symbol} {timeframe}: wrote {written} bars")
+    return written
+
+def check_delta(df, last_time, last_open, timeframe):
+    """Reason the fetched bars can't be appended to the stored ones, None if they can"""
+    if df.index[0] != last_time:
+        return f"boundary bar {last_time} missing from the terminal"
+    #a bar's open never changes once it has started, so a different one means changed history
+    if abs(df["Open"].iloc[0] - last_open) > 1e-9 * max(abs(last_open), 1.0):
+        return f"boundary bar {last_time} changed"
+    if not df.index.is_monotonic_increasing or df.index.has_duplicates:
+        return "new bars out of order"
+
+    seconds = TIMEFRAME_SECONDS.get(timeframe)
+    if seconds:
+        elapsed = (df.index - df.index[0]).total_seconds()
+        if (elapsed % seconds != 0).any():
+            return "new bars off the timeframe grid"
+    return None
+
+def export_with_retry(symbol, timeframe, out_dir, days_back=365, incremental=True,
+                      source=None, retries=3, backoff=2.0):
+    """Export one symbol/timeframe, retrying with exponential backoff - returns bars written"""
+    filename = os.path.join(out_dir, f"MT5_{symbol}_{timeframe}_data.csv")
+    for attempt in range(retries + 1):
+        try:
+            if incremental:
+                written = update_mt5_data(symbol, timeframe, filename, days_back, source=source)
+            else:
+                written = download_history(symbol, timeframe, filename, days_back, source=source)
+        except Exception as e:
+            #anything else going wrong in an attempt gets the same backoff and retry
+            print(f"{symbol} {timeframe}: {e}")
+            written = None
+
+        if written is not None:
+            return written
+
+        if attempt < retries:
+            delay = backoff * 2 ** attempt
+            print(f"{symbol} {timeframe}: attempt {attempt + 1} failed, retrying in {delay:.0f}s")
+            time.sleep(delay)
+
+    raise RuntimeError(f"{symbol} {timeframe}: no data after {retries + 1} attempts")
+
+def export_bulk(symbols, timeframes, out_dir=DATA_SAVE_DIR, days_back=365, incremental=True,
+                source=None, max_workers=4, retries=3, backoff=2.0):
+    """
+    Export every symbol x timeframe pair through a bounded worker pool
+
+    A failed pair is retried and then reported - it never aborts the rest of the batch.
+    Returns (done, failed): {(symbol, timeframe): bars written} and {(symbol, timeframe): error}
+    """
+    source = source or default_source
+    jobs = [(symbol, timeframe) for symbol in symbols for timeframe in timeframes]
+    done = {}
+    failed = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(export_with_retry, symbol, timeframe, out_dir, days_back,
+                        incremental, source, retries, backoff): (symbol, timeframe)
+            for symbol, timeframe in jobs
+        }
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                done[key] = future.result()
+            except Exception as e:
+                failed[key] = str(e)
+
+    return done, failed
+
+def bulk_main(args):
+    """Command line bulk export - python mt5_data_export.py --symbols GBPUSD,EURUSD --timeframes H4,M15"""
+    print("Starting MT5 Bulk Export...")
+
+    source = default_source
+    if not source.initialize():
+        return
+
+    try:
+        symbols = [x.strip() for x in args.symbols.split(",") if x.strip()]
+        timeframes = [x.strip() for x in args.timeframes.split(",") if x.strip()]
+        #with --from-m1 only M1 is downloaded, everything else is resampled from it
+        download = ["M1"] if args.from_m1 else timeframes
+        done, failed = export_bulk(symbols, download, args.out_dir, args.days_back,
+                                   not args.full, source, args.workers, args.retries, args.backoff)
+        if args.from_m1:
+            from resample import export_timeframes
+            derived = [tf for tf in timeframes if tf != "M1"]
+            for symbol in symbols:
+                if (symbol, "M1") not in done or not derived:
+                    continue
+                try:
+                    m1_file = os.path.join(args.out_dir, f"MT5_{symbol}_M1_data.csv")
+                    for tf, bars in export_timeframes(m1_file, derived, args.out_dir).items():
+                        done[(symbol, tf)] = bars
+                except Exception as e:
+                    for tf in derived:
+                        failed[(symbol, tf)] = f"resample failed: {e}"
+
+        print("\n" + "=" * 50)
+        print(f"BULK EXPORT: {len(done)} ok, {len(failed)} failed")
+        print("=" * 50)
+        for (symbol, timeframe), error in sorted(failed.items()):
+            print(f"  FAILED {symbol} {timeframe}: {error}")
+
+    finally:
+        source.shutdown()
+        print("\nMT5 connection closed")
     
-def main():
-    """Main function to export MT5 data"""
+def single_main():
+    """Export the one symbol/timeframe chosen below - what runs without --symbols"""
     print("Starting MT5 Data Export...")
 
     #initialize MT5 connection
@@ -96,29 +455,39 @@ def main():
         symbol = "GBPUSD"
         timeframe = "H4"
         days_back = 365
+        #True = only fetch bars newer than the stored export in DATA_SAVE_DIR
+        incremental = False
         
         print(f"\nDownloading {symbol} data...")
+        os.makedirs(DATA_SAVE_DIR, exist_ok=True)
+        filename = f"MT5_{symbol}_{timeframe}_data.csv"
+        data_file = os.path.join(DATA_SAVE_DIR, filename)
 
-        #get data
-        df = get_mt5_data(symbol, timeframe, days_back)
+        if incremental:
+            written = update_mt5_data(symbol, timeframe, data_file, days_back)
+            if written is not None:
+                with open("latest_export_info.txt", "w") as f:
+                    f.write(f"{symbol},{timeframe}")
+                print(f"\nSUCCESS! {filename} is up to date")
+            else:
+                print("Incremental update failed. Check MT5 is running and the symbol is correct")
+            return
 
-        if df is not None and not df.empty:
-            #save to csv
-            filename = f"MT5_{symbol}_{timeframe}_data.csv"
-            df.to_csv(filename)
-            --- USER SETUP: Change this path to your desired data directory ---
-            # Example: "C:/YourUsername/YourProject/data_save/" or "./data/" - 
-            #---FILE WILL INITIALLY SAVE IN YOUR -- C:\\Users\\(Your active user)
-            shutil.move("C:\\Users\\Tshepo\\" + filename,"c:\\Users\\Tshepo\\Desktop\\Trading_Backtesting_Project\\data_save\\" + filename)
+        #get data - paged straight into data_save, so memory stays flat however far back it goes
+        written = download_history(symbol, timeframe, data_file, days_back)
 
+        if written:
             with open("latest_export_info.txt", "w") as f:
                 f.write(f"{symbol},{timeframe}")
 
-            print(f"\nSUCCESS! Data exported to {filename}")
-            print(f"Data shape: {df.shape}")
-            print(f"Data range: {df.index[0]} to {df.index[-1]}")
+            #only the first rows and the last bar are read back, not the whole export
+            import pandas as pd
+            head = pd.read_csv(data_file, index_col=0, nrows=5)
+            print(f"\nSUCCESS! Data exported to {data_file}")
+            print(f"Data shape: ({written}, {len(head.columns)})")
+            print(f"Data range: {head.index[0]} to {read_last_bar(data_file)[0]}")
             print(f"\nFirst 5 rows:")
-            print(df.head())
+            print(head)
         else:
             print("Failed to get data trash boy. Check if:")
             print("  - MT5 in running")
@@ -131,8 +500,27 @@ def main():
         mt5.shutdown()
         print("\nMT5 connection closed")
 
-if __name__ == "__main__":
+def main(argv=None):
+    """Command line entry - bulk export with --symbols, the single export in single_main() without"""
+    parser = argparse.ArgumentParser(description="Export MT5 history - no arguments runs the single export in single_main()")
+    parser.add_argument("--symbols", help="comma separated symbols for a bulk export")
+    parser.add_argument("--timeframes", default="H4", help="comma separated timeframes")
+    parser.add_argument("--out-dir", default=DATA_SAVE_DIR)
+    parser.add_argument("--days-back", type=int, default=365)
+    parser.add_argument("--full", action="store_true", help="re-pull everything instead of an incremental update")
+    parser.add_argument("--from-m1", action="store_true",
+                        help="download M1 only and build the other timeframes from it (resample.py)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--backoff", type=float, default=2.0, help="first retry delay in seconds, doubles each retry")
+    args = parser.parse_args(argv)
 
+    if args.symbols:
+        bulk_main(args)
+    else:
+        single_main()
+
+if __name__ == "__main__":
     main()
 
 
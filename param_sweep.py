@@ -0,0 +1,211 @@
+#param_sweep.py
+#Parallel parameter sweep for the SMA Crossover Strategy
+#the OHLCV data is loaded once into shared memory and every worker process reads it from there,
+#each parameter set then runs through the vectorized fast path, with the moving averages several
+#sets share computed once up front and shared the same way (indicator_bank.py)
+
+import argparse
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from fast_backtest import DEFAULT_PARAMS, load_ohlcv, run_fast_backtest
+from indicator_bank import build_bank, sweep_periods
+from metrics import compute_metrics
+from run_cache import code_version, data_digest, digest_arrays, lookup, run_key, store
+
+#set inside each worker by _init_worker
+_worker_data = None
+_worker_blocks = None
+_worker_config = None
+_worker_data_key = None
+_worker_bank = None
+
+####################################################################################
+
+def param_grid(**ranges):
+    """Expand lists of values into every combination, eg param_grid(pfast=[5, 8], pslow=[20, 50])"""
+    names = list(ranges)
+    combos = []
+    for values in itertools.product(*(ranges[name] for name in names)):
+        combo = dict(zip(names, values))
+        #a fast average that is not faster than the slow one never crosses meaningfully
+        if combo.get("pfast", 0) >= combo.get("pslow", float("inf")):
+            continue
+        combos.append(combo)
+    return combos
+
+def share_data(data):
+    """Copy OHLCV arrays into shared memory blocks, returns (spec, blocks)"""
+    spec = {}
+    blocks = []
+    for name, values in data.items():
+        values = np.ascontiguousarray(values)
+        block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[:] = values
+        spec[name] = (block.name, values.dtype.str, values.shape)
+        blocks.append(block)
+    return spec, blocks
+
+def attach_data(spec):
+    """Map shared OHLCV blocks back into read-only arrays, returns (data, blocks)"""
+    data = {}
+    blocks = []
+    for name, (block_name, dtype, shape) in spec.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        values = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        values.flags.writeable = False
+        data[name] = values
+        blocks.append(block)
+    return data, blocks
+
+def release_data(blocks):
+    """Close and unlink shared blocks created by share_data"""
+    for block in blocks:
+        block.close()
+        block.unlink()
+
+####################################################################################
+
+def summarize(result, cash):
+    """metrics.compute_metrics for one fast backtest result (Sharpe, drawdowns, trade stats, ...)"""
+    trades = result["trades"]
+    pnls = trades["pnlcomm"] if len(trades) else []
+    return compute_metrics(result["equity"], result.get("time"), pnls, result.get("position"), cash)
+
+def data_key_for(data):
+    """Run cache key of the data - an export path or loaded OHLCV arrays"""
+    if isinstance(data, (str, os.PathLike)):
+        return data_digest(data)
+    return digest_arrays(data)
+
+def summarize_cached(data, params, config, data_key=None, bank=None):
+    """
+    summarize(run_fast_backtest(...)), read from the run cache when this exact run was done before
+
+    data_key (data_key_for) names the data, without one the run cache is not used.
+    bank is an indicator bank over the same bars.
+    """
+    if data_key is None:
+        return summarize(run_fast_backtest(data, params, bank=bank, **config), config["cash"])
+
+    code = code_version("fast_backtest", "metrics", summarize)
+    key = run_key(data_key, code, dict(DEFAULT_PARAMS, **params), config)
+    hit = lookup(key)
+    if hit is not None:
+        return hit["metrics"]
+    summary = summarize(run_fast_backtest(data, params, bank=bank, **config), config["cash"])
+    store(key, {"metrics": summary})
+    return summary
+
+####################################################################################
+
+def _init_worker(spec, config, data_key=None, bank_spec=None):
+    """Attach each worker to the shared data (and indicator bank) once, instead of per task"""
+    global _worker_data, _worker_blocks, _worker_config, _worker_data_key, _worker_bank
+    _worker_data, _worker_blocks = attach_data(spec)
+    _worker_config = config
+    _worker_data_key = data_key
+    _worker_bank = None
+    if bank_spec:
+        _worker_bank, bank_blocks = attach_data(bank_spec)
+        _worker_blocks += bank_blocks
+
+def _run_one(params):
+    """Worker task - one parameter set against the shared data"""
+    row = dict(params)
+    row.update(summarize_cached(_worker_data, params, _worker_config, _worker_data_key, _worker_bank))
+    return row
+
+def run_sweep(data, param_sets, workers=None, cash=100000.0, commission=0.0001,
+              slippage=0.00005, rank_by="sharpe", ascending=False, cache=False):
+    """
+    Run every parameter set over the same data across a process pool
+
+    data can be a loaded OHLCV dict or a path to an MT5 CSV export. With cache, runs done
+    before on the same data and code are read from the run cache instead of re-run.
+    Returns a DataFrame ranked by rank_by (best first).
+    """
+    data_key = data_key_for(data) if cache else None
+    if isinstance(data, (str, os.PathLike)):
+        data = load_ohlcv(data)
+
+    param_sets = [dict(p) for p in param_sets]
+    config = dict(cash=cash, commission=commission, slippage=slippage)
+    workers = workers or os.cpu_count() or 1
+    #every SMA at least two sets use, computed once for the whole sweep
+    bank = build_bank(data, sweep_periods(param_sets))
+
+    if workers == 1 or len(param_sets) < 2:
+        global _worker_data, _worker_config, _worker_data_key, _worker_bank
+        _worker_data, _worker_config, _worker_data_key, _worker_bank = data, config, data_key, bank
+        rows = [_run_one(p) for p in param_sets]
+    else:
+        spec, blocks = share_data(data)
+        bank_spec, bank_blocks = share_data(bank)
+        try:
+            chunksize = max(1, len(param_sets) // (workers * 4))
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(spec, config, data_key, bank_spec)) as pool:
+                rows = list(pool.map(_run_one, param_sets, chunksize=chunksize))
+        finally:
+            release_data(blocks + bank_blocks)
+
+    import pandas as pd  # here rather than at the top, workers import this module and never need it
+
+    table = pd.DataFrame(rows)
+    if not table.empty:
+        table = table.sort_values(rank_by, ascending=ascending, na_position="last").reset_index(drop=True)
+    return table
+
+####################################################################################
+
+def _parse_list(text, cast):
+    return [cast(x) for x in text.split(",") if x.strip()]
+
+def main(argv=None):
+    """Command line entry - sweep one export with the broker setup from backtest_config.json"""
+    from config import load_config
+
+    parser = argparse.ArgumentParser(description="Parallel parameter sweep for SmaCrossStrategy")
+    parser.add_argument("data_file", help="MT5_<symbol>_<tf>_data.csv export")
+    parser.add_argument("--pfast", default=str(DEFAULT_PARAMS["pfast"]), help="comma separated values")
+    parser.add_argument("--pslow", default=str(DEFAULT_PARAMS["pslow"]))
+    parser.add_argument("--stop-loss-pct", default=str(DEFAULT_PARAMS["stop_loss_pct"]))
+    parser.add_argument("--take-profit-pct", default=str(DEFAULT_PARAMS["take_profit_pct"]))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--rank-by", default="sharpe")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--out", default=None, help="save the full ranked table to this CSV")
+    parser.add_argument("--db", default=None, help="results database to store every run in (default results_db.DB_PATH)")
+    parser.add_argument("--no-cache", action="store_true", help="re-run every set instead of reading earlier runs from the run cache")
+    args = parser.parse_args(argv)
+    settings = load_config()
+
+    grid = param_grid(
+        pfast=_parse_list(args.pfast, int),
+        pslow=_parse_list(args.pslow, int),
+        stop_loss_pct=_parse_list(args.stop_loss_pct, float),
+        take_profit_pct=_parse_list(args.take_profit_pct, float),
+    )
+    print(f"Sweeping {len(grid)} parameter sets...")
+
+    table = run_sweep(args.data_file, grid, workers=args.workers, cash=settings["cash"],
+                      commission=settings["commission"], slippage=settings["slippage"], rank_by=args.rank_by,
+                      ascending=args.rank_by == "max_drawdown", cache=not args.no_cache)
+    print(table.head(args.top).to_string())
+
+    if args.out:
+        table.to_csv(args.out, index=False)
+        print(f"\nFull table saved to {args.out}")
+
+    from results_db import save_sweep
+    ids = save_sweep(table, ["pfast", "pslow", "stop_loss_pct", "take_profit_pct"],
+                     data_file=args.data_file, start_cash=settings["cash"], path=args.db)
+    print(f"{len(ids)} runs stored in the results database")
+
+if __name__ == "__main__":
+    main()
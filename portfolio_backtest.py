@@ -0,0 +1,268 @@
+#portfolio_backtest.py
+#Multi-symbol portfolio backtest for the SMA Crossover Strategy with one shared cash pool
+#every symbol trades the SmaCrossStrategy rules (the fast_backtest.py fill model) off its own
+#feed, but entries are sized off the whole portfolio value, paid from one cash balance and
+#held back by portfolio-level exposure caps
+#
+#the symbols are never stepped bar by bar: signals are computed vectorized per symbol and only
+#the events that touch the shared cash (entry signals, entry fills, exits) go through one
+#time-ordered queue, so run time grows with bars + trades rather than symbols x timeline
+#
+#python portfolio_backtest.py data_save/MT5_GBPUSD_H4_data.csv data_save/MT5_EURUSD_H4_data.csv
+
+import argparse
+import heapq
+import os
+
+import numpy as np
+import pandas as pd
+
+from fast_backtest import (DEFAULT_PARAMS, EXIT_OPEN, TRADE_DTYPE, MAX_LOSS, _buy_price, compute_signals,
+                           find_exit, load_ohlcv)
+from metrics import compute_metrics
+
+#event kinds, in the order they are handled when they share a timestamp:
+#exits free cash before entry orders fill at the open, signals come at the bar close
+EXIT = 0
+FILL = 1
+SIGNAL = 2
+
+####################################################################################
+
+def align_times(times_list):
+    """Union timeline of every symbol's bar times and, per symbol, each bar's index on it"""
+    timeline = np.unique(np.concatenate([np.asarray(t, dtype=np.int64) for t in times_list]))
+    return timeline, [np.searchsorted(timeline, t) for t in times_list]
+
+class MarkBook:
+    """
+    Last close of many symbols at a time t in one searchsorted call
+
+    Every symbol's bar times are offset into their own band of one sorted key array
+    (symbol * span + time), so looking up k symbols costs one vectorized call.
+    """
+
+    def __init__(self, datas):
+        times = [np.asarray(data["time"], dtype=np.int64) for data in datas]
+        self.t0 = min(int(t[0]) for t in times if len(t))
+        self.span = max(int(t[-1]) for t in times if len(t)) - self.t0 + 1
+        self.keys = np.concatenate([t - self.t0 + s * self.span for s, t in enumerate(times)])
+        self.closes = np.concatenate([np.asarray(data["close"], dtype=np.float64) for data in datas])
+        self.starts = np.cumsum([0] + [len(t) for t in times])[:-1]
+
+    def marks(self, symbols, t):
+        """Closes of symbols (array of indexes) at or before epoch time t, NaN before a symbol's first bar"""
+        i = np.searchsorted(self.keys, symbols * self.span + (t - self.t0), side="right") - 1
+        return np.where(i >= self.starts[symbols], self.closes[i], np.nan)
+
+def run_portfolio(datas, params=None, cash=100000.0, commission=0.0001, slippage=0.00005,
+                  max_loss=MAX_LOSS, max_symbol_exposure=None, max_gross_exposure=1.0, max_positions=None):
+    """
+    Run the SMA crossover rules on every symbol against one cash balance
+
+    datas is {symbol: OHLCV arrays}. An entry is sized at risk_per_trade of the portfolio
+    value split evenly over the symbols, then cut down to fit max_symbol_exposure (fraction
+    of portfolio value in one symbol) and max_gross_exposure (fraction in all open and
+    pending positions), and skipped when max_positions are already open. Returns the
+    aggregate equity on the union timeline plus per-symbol P&L curves and trades.
+    Symbols without bars are left out and listed under "empty".
+    """
+    p = dict(DEFAULT_PARAMS)
+    p.update(params or {})
+    #one empty export should not stop the other symbols
+    empty = [symbol for symbol, data in datas.items() if not len(data["close"])]
+    if empty:
+        print(f"Skipping symbols without bars: {', '.join(empty)}")
+    datas = {symbol: data for symbol, data in datas.items() if symbol not in empty}
+    if not datas:
+        raise ValueError("run_portfolio needs at least one symbol with bars")
+    symbols = list(datas)
+    n_symbols = len(symbols)
+
+    state = []
+    events = []
+    for s, symbol in enumerate(symbols):
+        data = datas[symbol]
+        signals = compute_signals(data, p["pfast"], p["pslow"])
+        n = len(data["close"])
+        state.append({
+            "n": n,
+            "signals": signals,
+            "entries": np.flatnonzero(signals["cross_up"] & signals["tradable"]),
+            "cross_exits": np.flatnonzero(signals["cross_down"] & signals["tradable"]),
+            "tradable_bars": np.flatnonzero(signals["tradable"]),
+            "cash_delta": np.zeros(n),
+            "position": np.zeros(n),
+            "trades": [],
+        })
+
+    def schedule_signal(s, from_bar):
+        st = state[s]
+        k = np.searchsorted(st["entries"], from_bar)
+        if k < len(st["entries"]) and st["entries"][k] + 1 < st["n"]:
+            bar = st["entries"][k]
+            heapq.heappush(events, (datas[symbols[s]]["time"][bar], SIGNAL, s, bar))
+
+    for s in range(n_symbols):
+        schedule_signal(s, 0)
+
+    book = MarkBook([datas[symbol] for symbol in symbols])
+    sizes = np.zeros(n_symbols)        # open or pending position size per symbol
+    is_open = np.zeros(n_symbols, dtype=bool)
+    broker_cash = float(cash)
+    skipped = 0
+    rejected = 0
+
+    while events:
+        t, kind, s, bar = heapq.heappop(events)
+        st = state[s]
+        data = datas[symbols[s]]
+
+        if kind == SIGNAL:
+            held = np.flatnonzero(sizes)
+            target = 0.0
+            if max_positions is None or len(held) < max_positions:
+                #portfolio value and exposure at this bar's close
+                exposure = sizes[held] * book.marks(held, t)
+                value = broker_cash + exposure[is_open[held]].sum()
+                target = value * p["risk_per_trade"] / n_symbols
+                if max_symbol_exposure is not None:
+                    target = min(target, value * max_symbol_exposure)
+                if max_gross_exposure is not None:
+                    target = min(target, value * max_gross_exposure - exposure.sum())
+            if target <= 0:
+                skipped += 1
+                schedule_signal(s, bar + 1)
+                continue
+            sizes[s] = target / data["close"][bar]
+            heapq.heappush(events, (data["time"][bar + 1], FILL, s, bar + 1))
+
+        elif kind == FILL:
+            size = sizes[s]
+            entry_price = _buy_price(data["open"][bar], data["high"][bar], slippage)
+            entry_comm = size * entry_price * commission
+            if size * entry_price + entry_comm > broker_cash:
+                #margin - the order is rejected and the symbol looks again from the fill bar
+                rejected += 1
+                sizes[s] = 0.0
+                schedule_signal(s, bar)
+                continue
+
+            broker_cash -= size * entry_price + entry_comm
+            st["cash_delta"][bar] -= size * entry_price + entry_comm
+            exit_bar, exit_price, reason = find_exit(
+                data, st["signals"], p, bar, size, entry_price, slippage, max_loss,
+                st["cross_exits"], st["tradable_bars"])
+            st["position"][bar:exit_bar] = size
+            is_open[s] = True
+            st["entry"] = (bar, entry_price, entry_comm, exit_bar, exit_price, reason)
+            if reason == EXIT_OPEN:
+                closes = data["close"]
+                pnl = size * (closes[-1] - entry_price)
+                st["trades"].append((bar, st["n"] - 1, size, entry_price, closes[-1], pnl, pnl - entry_comm, reason))
+            else:
+                heapq.heappush(events, (data["time"][exit_bar], EXIT, s, exit_bar))
+
+        else:
+            size = sizes[s]
+            entry, entry_price, entry_comm, exit_bar, exit_price, reason = st["entry"]
+            exit_comm = size * exit_price * commission
+            broker_cash += size * exit_price - exit_comm
+            st["cash_delta"][bar] += size * exit_price - exit_comm
+            pnl = size * (exit_price - entry_price)
+            st["trades"].append((entry, bar, size, entry_price, exit_price, pnl, pnl - entry_comm - exit_comm, reason))
+            sizes[s] = 0.0
+            is_open[s] = False
+            #the strategy runs on the exit bar too, so a new entry can be signalled straight away
+            schedule_signal(s, bar)
+
+    #per-symbol P&L curves, then summed onto the union timeline
+    timeline, indexes = align_times([datas[symbol]["time"] for symbol in symbols])
+    pnl_total = np.zeros(len(timeline))
+    cash_total = np.zeros(len(timeline))
+    per_symbol = {}
+    for s, symbol in enumerate(symbols):
+        st = state[s]
+        data = datas[symbol]
+        cash_curve = np.cumsum(st["cash_delta"])
+        pnl = cash_curve + st["position"] * data["close"]
+        per_symbol[symbol] = {
+            "time": data["time"],
+            "pnl": pnl,
+            "position": st["position"],
+            "trades": np.array(st["trades"], dtype=TRADE_DTYPE),
+        }
+        #carry each symbol's last value forward over timeline points it has no bar on
+        filled = np.zeros(len(timeline), dtype=np.int64) - 1
+        filled[indexes[s]] = np.arange(len(indexes[s]))
+        np.maximum.accumulate(filled, out=filled)
+        seen = filled >= 0
+        pnl_total[seen] += pnl[filled[seen]]
+        cash_total[seen] += cash_curve[filled[seen]]
+
+    return {
+        "time": timeline,
+        "equity": cash + pnl_total,
+        "cash": cash + cash_total,
+        "symbols": per_symbol,
+        "skipped": skipped,
+        "rejected": rejected,
+        "empty": empty,
+        "final_value": float(cash + pnl_total[-1]) if len(timeline) else float(cash),
+    }
+
+def summarize_portfolio(result, cash):
+    """Aggregate metrics plus one row per symbol (trades, net P&L, exposure)"""
+    trades = [info["trades"] for info in result["symbols"].values()]
+    pnls = np.concatenate([t["pnlcomm"] for t in trades]) if trades else []
+    overall = compute_metrics(result["equity"], result["time"], pnls, start_cash=cash)
+
+    rows = []
+    for symbol, info in result["symbols"].items():
+        rows.append({
+            "symbol": symbol,
+            "trades": len(info["trades"]),
+            "net_pnl": float(info["pnl"][-1]) if len(info["pnl"]) else 0.0,
+            "win_rate": float((info["trades"]["pnlcomm"] >= 0).mean() * 100) if len(info["trades"]) else np.nan,
+            "exposure": float((info["position"] != 0).mean() * 100) if len(info["position"]) else np.nan,
+        })
+    return overall, pd.DataFrame(rows)
+
+####################################################################################
+
+if __name__ == "__main__":
+    import time
+
+    from config import load_config
+    from results_db import parse_export_name
+
+    settings = load_config()
+    parser = argparse.ArgumentParser(description="Portfolio backtest of SmaCrossStrategy over several MT5 exports")
+    parser.add_argument("data_files", nargs="+", help="MT5_<symbol>_<tf>_data.csv exports, one per symbol")
+    parser.add_argument("--cash", type=float, default=settings["cash"])
+    parser.add_argument("--max-symbol-exposure", type=float, default=None,
+                        help="largest fraction of portfolio value in one symbol")
+    parser.add_argument("--max-gross-exposure", type=float, default=1.0,
+                        help="largest fraction of portfolio value in all positions together")
+    parser.add_argument("--max-positions", type=int, default=None)
+    args = parser.parse_args()
+
+    datas = {}
+    for path in args.data_files:
+        symbol = parse_export_name(path)[0] or os.path.splitext(os.path.basename(path))[0]
+        datas[symbol] = load_ohlcv(path)
+
+    start = time.perf_counter()
+    result = run_portfolio(datas, cash=args.cash, commission=settings["commission"], slippage=settings["slippage"],
+                           max_symbol_exposure=args.max_symbol_exposure,
+                           max_gross_exposure=args.max_gross_exposure, max_positions=args.max_positions)
+    overall, table = summarize_portfolio(result, args.cash)
+
+    print("=" * 50)
+    print(f"PORTFOLIO ({len(result['symbols'])} symbols, {len(result['time'])} timeline bars, {time.perf_counter() - start:.2f}s)")
+    print("=" * 50)
+    print(table.to_string(index=False))
+    print(f"\nFinal Portfolio Value: ${result['final_value']:.2f}")
+    print(f"Sharpe Ratio: {overall['sharpe']:.2f}")
+    print(f"Max Drawdown: {overall['max_drawdown']:.2f}%")
+    print(f"Entries skipped by exposure caps: {result['skipped']}, rejected for cash: {result['rejected']}")
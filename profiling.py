@@ -0,0 +1,226 @@
+#profiling.py
+#Opt-in instrumentation for the backtest and dashboard
+#set BT_PROFILE=1 to record wall time and call counts per phase (feed loading, indicators,
+#notifications, analyzers, observers, plotting...) plus a sampled latency histogram for the
+#per-bar strategy hooks (next, prenext, notify_order, notify_trade)
+#BT_PROFILE_SAMPLE=N times every Nth hook call (default 10), the rest are only counted
+#
+#the profile is saved as JSON plus a .folded file (one "a;b;c self_microseconds" line per stack)
+#that flamegraph.pl, speedscope or inferno read directly
+#with BT_PROFILE unset nothing is wrapped and phase() is a shared no-op context
+
+import functools
+import json
+import os
+import time
+from contextlib import nullcontext
+
+import numpy as np
+
+PROFILE_ENV = "BT_PROFILE"
+SAMPLE_ENV = "BT_PROFILE_SAMPLE"
+DEFAULT_SAMPLE_EVERY = 10
+
+#strategy internals timed as phases on every call
+STRATEGY_PHASES = {
+    "_once": "indicators",            # vectorized indicator pass (runonce mode)
+    "_notify": "notifications",       # broker order/trade notifications
+    "_next_analyzers": "analyzers",
+    "_next_observers": "observers",
+}
+#per-bar user hooks, sampled
+STRATEGY_HOOKS = ["prenext", "next", "notify_order", "notify_trade"]
+
+#latency histogram bucket edges in microseconds
+HISTOGRAM_EDGES_US = [0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 100000, np.inf]
+
+_NULL = nullcontext()
+
+class Profiler:
+    """Phase tree with wall time, self time and call counts, plus sampled hook latencies"""
+
+    def __init__(self, sample_every=DEFAULT_SAMPLE_EVERY):
+        self.sample_every = max(1, int(sample_every))
+        self.stack = []
+        self.phases = {}  # "a;b;c" -> [calls, total ns, self ns]
+        self.hooks = {}   # hook name -> {"calls": n, "samples": [ns, ...]}
+
+    def _add(self, key, elapsed, calls):
+        entry = self.phases.get(key)
+        if entry is None:
+            entry = self.phases[key] = [0, 0, 0]
+        entry[0] += calls
+        entry[1] += elapsed
+        entry[2] += elapsed
+        #time spent here is not the parent's own time
+        if self.stack:
+            parent = self.phases.setdefault(";".join(self.stack), [0, 0, 0])
+            parent[2] -= elapsed
+
+    def phase(self, name):
+        """Context manager timing a block as a child of the currently open phase"""
+        return _Phase(self, name)
+
+    def wrap_phase(self, name, func):
+        """Time every call of func as phase name"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            self.stack.append(name)
+            key = ";".join(self.stack)
+            start = time.perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter_ns() - start
+                self.stack.pop()
+                self._add(key, elapsed, 1)
+        return wrapper
+
+    def wrap_hook(self, name, func):
+        """Count every call of func, time every sample_every-th one"""
+        stats = self.hooks.setdefault(name, {"calls": 0, "samples": []})
+        samples = stats["samples"]
+        every = self.sample_every
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            stats["calls"] += 1
+            if stats["calls"] % every:
+                return func(*args, **kwargs)
+            start = time.perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter_ns() - start
+                samples.append(elapsed)
+                #each sample stands in for the unsampled calls around it in the phase tree
+                self._add(";".join(self.stack + [name]), elapsed * every, every)
+        return wrapper
+
+    def report(self):
+        """Everything recorded as a JSON friendly dict"""
+        phases = {}
+        for key, (calls, total, own) in sorted(self.phases.items()):
+            phases[key] = {
+                "calls": calls,
+                "seconds": total / 1e9,
+                "self_seconds": max(own, 0) / 1e9,
+            }
+
+        hooks = {}
+        for name, stats in self.hooks.items():
+            samples_us = np.asarray(stats["samples"], dtype=np.float64) / 1e3
+            row = {"calls": stats["calls"], "sampled": len(samples_us)}
+            if len(samples_us):
+                counts, _ = np.histogram(samples_us, bins=HISTOGRAM_EDGES_US)
+                row.update({
+                    "mean_us": float(samples_us.mean()),
+                    "p50_us": float(np.percentile(samples_us, 50)),
+                    "p90_us": float(np.percentile(samples_us, 90)),
+                    "p99_us": float(np.percentile(samples_us, 99)),
+                    "max_us": float(samples_us.max()),
+                    "estimated_seconds": float(samples_us.mean() * stats["calls"] / 1e6),
+                    "histogram": {
+                        "edges_us": [e if np.isfinite(e) else None for e in HISTOGRAM_EDGES_US],
+                        "counts": counts.tolist(),
+                    },
+                })
+            hooks[name] = row
+
+        return {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "sample_every": self.sample_every,
+            "phases": phases,
+            "hooks": hooks,
+        }
+
+    def folded(self):
+        """Folded stacks (self time in microseconds) for flamegraph tools"""
+        lines = []
+        for key, (calls, total, own) in sorted(self.phases.items()):
+            us = int(max(own, 0) / 1e3)
+            if us > 0:
+                lines.append(f"{key} {us}")
+        return "\n".join(lines) + "\n"
+
+class _Phase:
+    """Lightweight context manager behind Profiler.phase"""
+    __slots__ = ("profiler", "name", "key", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler.stack.append(self.name)
+        self.key = ";".join(self.profiler.stack)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter_ns() - self.start
+        self.profiler.stack.pop()
+        self.profiler._add(self.key, elapsed, 1)
+        return False
+
+####################################################################################
+
+_profiler = None
+
+def enable(sample_every=None):
+    """Turn profiling on for this process (BT_PROFILE does this at import)"""
+    global _profiler
+    if sample_every is None:
+        sample_every = int(os.environ.get(SAMPLE_ENV, DEFAULT_SAMPLE_EVERY))
+    _profiler = Profiler(sample_every)
+    return _profiler
+
+def disable():
+    global _profiler
+    _profiler = None
+
+def enabled():
+    return _profiler is not None
+
+def phase(name):
+    """Time a block when profiling is on - a no-op context otherwise"""
+    if _profiler is None:
+        return _NULL
+    return _profiler.phase(name)
+
+def wrap_phase(name, func):
+    """func timed as phase name on every call when profiling is on, func itself otherwise"""
+    if _profiler is None:
+        return func
+    return _profiler.wrap_phase(name, func)
+
+def instrument_strategy(strategy_cls):
+    """Subclass of strategy_cls with its phases and per-bar hooks wrapped, the class itself when off"""
+    if _profiler is None:
+        return strategy_cls
+    namespace = {}
+    for attr, name in STRATEGY_PHASES.items():
+        namespace[attr] = _profiler.wrap_phase(name, getattr(strategy_cls, attr))
+    for name in STRATEGY_HOOKS:
+        namespace[name] = _profiler.wrap_hook(name, getattr(strategy_cls, name))
+    #same metaclass as backtrader uses so params and lines carry over
+    return type(strategy_cls)(strategy_cls.__name__, (strategy_cls,), namespace)
+
+def instrument_data(data):
+    """Time feed loading (CSV parsing or cache reads) on a data feed instance"""
+    if _profiler is not None:
+        data.load = _profiler.wrap_phase("feed", data.load)
+    return data
+
+def save(path):
+    """Write the JSON profile to path and the folded stacks next to it, returns the JSON path"""
+    if _profiler is None:
+        return None
+    with open(path, "w") as f:
+        json.dump(_profiler.report(), f, indent=2)
+    with open(os.path.splitext(path)[0] + ".folded", "w") as f:
+        f.write(_profiler.folded())
+    return path
+
+if os.environ.get(PROFILE_ENV, "").strip() not in ("", "0"):
+    enable()
@@ -0,0 +1,177 @@
+#resample.py
+#Build every higher timeframe from one stored M1 export
+#M5/M15/M30/H1/H4/D1 OHLCV are aggregated from the M1 bars in vectorized passes - each timeframe
+#is reduced from the previous (smaller) one rather than from M1 again - and cached in the same
+#binary column format as data_cache.py, so multi-timeframe runs need a single M1 download and
+#every timeframe comes from the same ticks
+#
+#bars are labelled with their open time like MT5 and only exist where M1 bars do, so a bar never
+#spans the weekend gap. D1 bars can start at a session offset (eg 17:00 New York close on a UTC
+#feed) and a short Sunday evening session is folded into Monday's bar instead of a bar of its own,
+#while Friday's late session (pushed past midnight by a negative offset) stays in Friday's bar
+#
+#python resample.py MT5_GBPUSD_M1_data.csv --timeframes M15,H4,D1 --csv data_save
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_cache import (COLUMNS, cache_dir_for, ensure_cache, is_cache_valid, open_columns, read_meta,
+                        source_stamp, write_columns)
+
+DAY = 86400
+
+#timeframe -> (bar length in seconds, timeframe it is reduced from)
+RESAMPLE_CHAIN = {
+    "M5": (300, "M1"),
+    "M15": (900, "M5"),
+    "M30": (1800, "M15"),
+    "H1": (3600, "M30"),
+    "H4": (14400, "H1"),
+    "D1": (DAY, "H1"),
+}
+TIMEFRAMES = list(RESAMPLE_CHAIN)
+
+####################################################################################
+
+def bar_starts(times, timeframe, session_offset=0, merge_weekend=True):
+    """Open time of the timeframe bar every source bar falls in (epoch seconds)"""
+    seconds = RESAMPLE_CHAIN[timeframe][0]
+    times = np.asarray(times, dtype=np.int64)
+    if timeframe != "D1":
+        return times - times % seconds
+
+    day = (times - session_offset) // DAY
+    if merge_weekend:
+        #1970-01-01 was a Thursday, weekday 0 = Monday - Saturday back to Friday, Sunday on to Monday
+        weekday = (day + 3) % 7
+        day = np.where(weekday == 5, day - 1, np.where(weekday == 6, day + 1, day))
+    return day * DAY + session_offset
+
+def aggregate(arrays, starts):
+    """OHLCV bars from source bars grouped by their (non-decreasing) bar open times"""
+    if not len(starts):
+        return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+    first = np.flatnonzero(np.diff(starts, prepend=starts[0] - 1))
+    last = np.append(first[1:], len(starts)) - 1
+    return {
+        "time": starts[first],
+        "open": np.asarray(arrays["open"])[first],
+        "high": np.maximum.reduceat(arrays["high"], first),
+        "low": np.minimum.reduceat(arrays["low"], first),
+        "close": np.asarray(arrays["close"])[last],
+        "volume": np.add.reduceat(arrays["volume"], first),
+    }
+
+def resample_all(m1, timeframes=TIMEFRAMES, session_offset=0, merge_weekend=True):
+    """
+    {timeframe: OHLCV arrays} for every timeframe in timeframes, from M1 column arrays
+
+    Intermediate timeframes in the chain are built too (and kept) since each one is
+    reduced from the one before it. session_offset (seconds) and merge_weekend only
+    change D1 bars.
+    """
+    times = np.asarray(m1["time"], dtype=np.int64)
+    if len(times) > 1 and not (np.diff(times) > 0).all():
+        raise ValueError("M1 bars must be in strictly increasing time order")
+
+    unknown = [tf for tf in timeframes if tf not in RESAMPLE_CHAIN]
+    if unknown:
+        raise ValueError(f"can't resample to {', '.join(unknown)}, use {', '.join(TIMEFRAMES)}")
+
+    built = {"M1": m1}
+    for timeframe, (seconds, source) in RESAMPLE_CHAIN.items():
+        if not any(TIMEFRAMES.index(tf) >= TIMEFRAMES.index(timeframe) for tf in timeframes):
+            break
+        if timeframe == "D1" and session_offset % 3600:
+            source = "M1"  # an offset off the hour cuts through H1 bars
+        bars = built[source]
+        built[timeframe] = aggregate(bars, bar_starts(bars["time"], timeframe, session_offset, merge_weekend))
+    return {tf: built[tf] for tf in timeframes}
+
+####################################################################################
+
+def resampled_dir(m1_file, timeframe, session_offset=0, merge_weekend=True):
+    """Cache directory for one resampled timeframe of an M1 export"""
+    #w2: Saturday-labelled bars go back to Friday - D1 caches from before that rule are not reused
+    name = timeframe if timeframe != "D1" else f"D1_{session_offset}_{int(merge_weekend)}_w2"
+    return os.path.join(cache_dir_for(m1_file), "resampled", name)
+
+def ensure_resampled(m1_file, timeframes=TIMEFRAMES, session_offset=0, merge_weekend=True):
+    """{timeframe: cache directory}, resampling (in one pass) whichever are missing or stale"""
+    dirs = {tf: resampled_dir(m1_file, tf, session_offset, merge_weekend) for tf in timeframes}
+    stale = [tf for tf, cache_dir in dirs.items() if not is_cache_valid(m1_file, cache_dir)]
+    if stale:
+        print(f"Resampling {os.path.basename(m1_file)} to {', '.join(stale)}...")
+        stamp = source_stamp(m1_file)
+        bars = resample_all(open_columns(ensure_cache(m1_file)), stale, session_offset, merge_weekend)
+        for tf in stale:
+            write_columns(dirs[tf], bars[tf], dict(stamp, timeframe=tf, session_offset=session_offset,
+                                                   merge_weekend=merge_weekend))
+    return dirs
+
+def load_resampled(m1_file, timeframe, session_offset=0, merge_weekend=True):
+    """Memory-mapped OHLCV arrays of one timeframe built from an M1 export"""
+    return open_columns(ensure_resampled(m1_file, [timeframe], session_offset, merge_weekend)[timeframe])
+
+def export_name(m1_file, timeframe):
+    """MT5_<symbol>_<tf>_data.csv matching an MT5_<symbol>_M1_data.csv export"""
+    name = os.path.basename(m1_file)
+    if "_M1_" not in name:
+        raise ValueError(f"{name} is not an MT5_<symbol>_M1_data.csv export")
+    return name.replace("_M1_", f"_{timeframe}_", 1)
+
+def save_resampled_csv(arrays, filename, timeframe, session_offset=0):
+    """Write resampled bars in the mt5_data_export CSV layout"""
+    from mt5_data_export import save_csv
+
+    times = np.asarray(arrays["time"])
+    if timeframe == "D1":
+        #D1 is written as a plain date - the trading day the session belongs to, not its open time
+        times = times - session_offset
+    df = pd.DataFrame({
+        "Open": arrays["open"],
+        "High": arrays["high"],
+        "Low": arrays["low"],
+        "Close": arrays["close"],
+        "Volume": np.asarray(arrays["volume"]).astype(np.int64),  # tick volume, an integer in MT5 exports
+    }, index=pd.to_datetime(times, unit="s"))
+    df.index.name = "time"
+    save_csv(df, filename, timeframe)
+
+def export_timeframes(m1_file, timeframes, out_dir, session_offset=0, merge_weekend=True):
+    """Resample an M1 export and write one CSV export per timeframe to out_dir, returns {timeframe: bars}"""
+    dirs = ensure_resampled(m1_file, timeframes, session_offset, merge_weekend)
+    written = {}
+    for tf in timeframes:
+        bars = open_columns(dirs[tf])
+        save_resampled_csv(bars, os.path.join(out_dir, export_name(m1_file, tf)), tf, session_offset)
+        written[tf] = len(bars["time"])
+    return written
+
+####################################################################################
+
+if __name__ == "__main__":
+    import time
+
+    parser = argparse.ArgumentParser(description="Build higher timeframes from an MT5 M1 export")
+    parser.add_argument("m1_file", help="MT5_<symbol>_M1_data.csv")
+    parser.add_argument("--timeframes", default=",".join(TIMEFRAMES), help="comma separated, default all")
+    parser.add_argument("--session-offset", type=float, default=0,
+                        help="hours after midnight a D1 bar starts (eg -7 for 17:00 on a UTC feed)")
+    parser.add_argument("--keep-sundays", action="store_true", help="give a Sunday session its own D1 bar")
+    parser.add_argument("--csv", metavar="DIR", help="write MT5_<symbol>_<tf>_data.csv exports to DIR as well")
+    args = parser.parse_args()
+
+    timeframes = [x.strip() for x in args.timeframes.split(",") if x.strip()]
+    offset = int(round(args.session_offset * 3600))
+    start = time.perf_counter()
+    if args.csv:
+        for tf, bars in export_timeframes(args.m1_file, timeframes, args.csv, offset, not args.keep_sundays).items():
+            print(f"Wrote {bars} bars to {os.path.join(args.csv, export_name(args.m1_file, tf))}")
+    else:
+        for tf, cache_dir in ensure_resampled(args.m1_file, timeframes, offset, not args.keep_sundays).items():
+            print(f"{tf}: {read_meta(cache_dir)['rows']} bars in {cache_dir}")
+    print(f"Done in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,313 @@
+#results_db.py
+#Local SQLite store of backtest and sweep results
+#every run gets a row in runs (market, headline metrics) plus its parameters, trades,
+#transactions and a downsampled equity curve, so runs can be compared without re-running them
+#
+#python results_db.py --symbol GBPUSD --timeframe H4 --max-dd 5 --by sharpe --limit 20
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from backtest_results import TRADE_FIELDS, TRANSACTION_FIELDS, run_metrics
+from config import setting
+
+#--- USER SETUP: results_db in backtest_config.json (see config.py), or BT_RESULTS_DB to override it ---
+DB_PATH = os.environ.get("BT_RESULTS_DB") or setting("results_db")
+
+#equity curves are stored with at most this many points
+EQUITY_POINTS = 2000
+
+#runs columns that can be ranked/filtered on
+METRICS = ["sharpe", "max_drawdown", "net_pnl", "final_value", "trades", "win_rate"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    created TEXT NOT NULL,
+    source TEXT NOT NULL,
+    symbol TEXT,
+    timeframe TEXT,
+    data_file TEXT,
+    start_cash REAL,
+    final_value REAL,
+    net_pnl REAL,
+    sharpe REAL,
+    max_drawdown REAL,
+    trades INTEGER,
+    win_rate REAL,
+    params TEXT
+);
+CREATE TABLE IF NOT EXISTS params (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (run_id, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS trades (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    open_time INTEGER,
+    close_time INTEGER,
+    price REAL,
+    barlen INTEGER,
+    pnl REAL,
+    pnlcomm REAL
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    time INTEGER,
+    size REAL,
+    price REAL,
+    value REAL
+);
+CREATE TABLE IF NOT EXISTS equity (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    time INTEGER NOT NULL,
+    equity REAL,
+    PRIMARY KEY (run_id, time)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_runs_market_sharpe ON runs(symbol, timeframe, sharpe);
+CREATE INDEX IF NOT EXISTS idx_runs_market_drawdown ON runs(symbol, timeframe, max_drawdown);
+CREATE INDEX IF NOT EXISTS idx_runs_market_pnl ON runs(symbol, timeframe, net_pnl);
+CREATE INDEX IF NOT EXISTS idx_runs_sharpe ON runs(sharpe);
+CREATE INDEX IF NOT EXISTS idx_params_value ON params(name, value, run_id);
+CREATE INDEX IF NOT EXISTS idx_trades_run ON trades(run_id);
+CREATE INDEX IF NOT EXISTS idx_transactions_run ON transactions(run_id);
+"""
+
+####################################################################################
+
+def connect(path=None):
+    """Open (and create if needed) the results database"""
+    conn = sqlite3.connect(path or DB_PATH)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+def parse_export_name(data_file):
+    """(symbol, timeframe) from an MT5_<symbol>_<tf>_data.csv file name, (None, None) otherwise"""
+    if not data_file:
+        return None, None
+    name = os.path.basename(str(data_file))
+    if not (name.startswith("MT5_") and name.endswith("_data.csv")):
+        return None, None
+    parts = name[len("MT5_"):-len("_data.csv")].split("_")
+    if len(parts) < 2:
+        return None, None
+    return parts[0], parts[1]
+
+def downsample(times, equity, points=EQUITY_POINTS):
+    """Evenly spaced points of an equity curve, always keeping the first, last and lowest one"""
+    n = len(equity)
+    if n <= points:
+        return np.asarray(times), np.asarray(equity)
+    idx = np.linspace(0, n - 1, points - 1).astype(np.int64)
+    idx = np.unique(np.append(idx, np.argmin(equity)))
+    return np.asarray(times)[idx], np.asarray(equity)[idx]
+
+def _number(value):
+    """Plain float for SQLite, None for missing/NaN"""
+    if value is None:
+        return None
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+def _rows(values, width):
+    """Trade/transaction rows (list of lists or 2D array) as tuples of plain floats"""
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        return []
+    return [tuple(row) for row in values.reshape(-1, width).tolist()]
+
+####################################################################################
+
+def insert_run(conn, run, params, trades=None, transactions=None, equity=None):
+    """
+    Insert one run (no commit)
+
+    run has the runs columns, params is {name: number}, trades/transactions are rows in
+    TRADE_FIELDS/TRANSACTION_FIELDS order and equity is (times, values). Returns the run id.
+    """
+    row = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "source": run.get("source", "backtest"),
+        "symbol": run.get("symbol"),
+        "timeframe": run.get("timeframe"),
+        "data_file": run.get("data_file"),
+        "start_cash": _number(run.get("start_cash")),
+        "final_value": _number(run.get("final_value")),
+        "net_pnl": _number(run.get("net_pnl")),
+        "sharpe": _number(run.get("sharpe")),
+        "max_drawdown": _number(run.get("max_drawdown")),
+        "trades": None if run.get("trades") is None else int(run["trades"]),
+        "win_rate": _number(run.get("win_rate")),
+        "params": json.dumps(params),
+    }
+    cur = conn.execute(
+        f"INSERT INTO runs ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+        list(row.values()),
+    )
+    run_id = cur.lastrowid
+
+    conn.executemany("INSERT INTO params (run_id, name, value) VALUES (?, ?, ?)",
+                     [(run_id, name, _number(value)) for name, value in params.items()])
+    if trades is not None and len(trades):
+        conn.executemany(f"INSERT INTO trades (run_id, {', '.join(TRADE_FIELDS)}) VALUES (?{', ?' * len(TRADE_FIELDS)})",
+                         [(run_id,) + row for row in _rows(trades, len(TRADE_FIELDS))])
+    if transactions is not None and len(transactions):
+        conn.executemany(f"INSERT INTO transactions (run_id, {', '.join(TRANSACTION_FIELDS)}) VALUES (?{', ?' * len(TRANSACTION_FIELDS)})",
+                         [(run_id,) + row for row in _rows(transactions, len(TRANSACTION_FIELDS))])
+    if equity is not None and len(equity[1]):
+        times, values = downsample(*equity)
+        conn.executemany("INSERT OR REPLACE INTO equity (run_id, time, equity) VALUES (?, ?, ?)",
+                         zip([run_id] * len(times), np.asarray(times, dtype=np.int64).tolist(),
+                             np.asarray(values, dtype=np.float64).tolist()))
+    return run_id
+
+def save_backtest(results, data_file=None, path=None):
+    """Store a results artifact (backtest_results.collect_results) as one run, returns its id"""
+    #artifacts saved before metrics.py existed get their metrics computed here
+    metrics = results.get("metrics") or run_metrics(results)
+
+    run = {
+        "source": "backtest",
+        "symbol": results.get("symbol"),
+        "timeframe": results.get("timeframe"),
+        "data_file": data_file,
+        "start_cash": results.get("start_cash"),
+        "final_value": results.get("final_value"),
+        "net_pnl": results["final_value"] - results["start_cash"],
+        "sharpe": metrics["sharpe"],
+        "max_drawdown": metrics["max_drawdown"],
+        "trades": metrics["trades"],
+        "win_rate": metrics["win_rate"],
+    }
+    params = {k: v for k, v in results.get("params", {}).items() if isinstance(v, (int, float))}
+
+    conn = connect(path)
+    try:
+        with conn:
+            return insert_run(conn, run, params, results.get("trades"), results.get("transactions"),
+                              (results.get("equity_time", []), results.get("equity", [])))
+    finally:
+        conn.close()
+
+def save_sweep(table, param_names, symbol=None, timeframe=None, data_file=None, start_cash=None,
+               source="sweep", path=None):
+    """Store every row of a sweep table (one run per parameter set) in one transaction, returns the ids"""
+    if symbol is None and timeframe is None:
+        symbol, timeframe = parse_export_name(data_file)
+
+    conn = connect(path)
+    ids = []
+    try:
+        with conn:
+            for record in table.to_dict("records"):
+                params = {name: record[name] for name in param_names if name in record}
+                run = {k: v for k, v in record.items() if k in METRICS}
+                run.update(source=source, symbol=symbol, timeframe=timeframe, data_file=data_file,
+                           start_cash=start_cash)
+                ids.append(insert_run(conn, run, params))
+    finally:
+        conn.close()
+    return ids
+
+####################################################################################
+
+def top_runs(symbol=None, timeframe=None, by="sharpe", ascending=None, max_drawdown=None,
+             min_trades=None, params=None, limit=20, path=None):
+    """
+    Best runs by a metric, eg top_runs("GBPUSD", "H4", "sharpe", max_drawdown=5)
+
+    params filters on exact parameter values ({"pfast": 5}). Returns a DataFrame of the
+    runs with one column per parameter.
+    """
+    if by not in METRICS:
+        raise ValueError(f"can't rank by {by!r}, use one of {METRICS}")
+    if ascending is None:
+        ascending = by == "max_drawdown"
+
+    where = [f"{by} IS NOT NULL"]
+    args = []
+    if symbol is not None:
+        where.append("symbol = ?")
+        args.append(symbol)
+    if timeframe is not None:
+        where.append("timeframe = ?")
+        args.append(timeframe)
+    if max_drawdown is not None:
+        where.append("max_drawdown < ?")
+        args.append(max_drawdown)
+    if min_trades is not None:
+        where.append("trades >= ?")
+        args.append(min_trades)
+    for name, value in (params or {}).items():
+        where.append("id IN (SELECT run_id FROM params WHERE name = ? AND value = ?)")
+        args.extend([name, value])
+
+    query = (f"SELECT id, created, source, symbol, timeframe, {', '.join(METRICS)} FROM runs "
+             f"WHERE {' AND '.join(where)} ORDER BY {by} {'ASC' if ascending else 'DESC'} LIMIT ?")
+
+    conn = connect(path)
+    try:
+        runs = pd.read_sql_query(query, conn, params=args + [limit])
+        if runs.empty:
+            return runs
+        ids = runs["id"].tolist()
+        values = pd.read_sql_query(
+            f"SELECT run_id, name, value FROM params WHERE run_id IN ({', '.join('?' * len(ids))})",
+            conn, params=ids)
+    finally:
+        conn.close()
+
+    if values.empty:
+        return runs
+    wide = values.pivot(index="run_id", columns="name", values="value")
+    return runs.merge(wide, left_on="id", right_index=True, how="left")
+
+def load_equity(run_id, path=None):
+    """Stored (downsampled) equity curve of a run as a Series indexed by bar time"""
+    conn = connect(path)
+    try:
+        df = pd.read_sql_query("SELECT time, equity FROM equity WHERE run_id = ? ORDER BY time", conn, params=[run_id])
+    finally:
+        conn.close()
+    return pd.Series(df["equity"].values, index=pd.to_datetime(df["time"], unit="s"), name=run_id)
+
+####################################################################################
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the backtest results database")
+    parser.add_argument("--db", default=None, help=f"database file (default {DB_PATH})")
+    parser.add_argument("--symbol", default=None)
+    parser.add_argument("--timeframe", default=None)
+    parser.add_argument("--by", default="sharpe", choices=METRICS)
+    parser.add_argument("--max-dd", type=float, default=None, help="only runs with max drawdown below this (%%)")
+    parser.add_argument("--min-trades", type=int, default=None)
+    parser.add_argument("--param", action="append", default=[], help="name=value filter, repeatable")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    filters = {}
+    for item in args.param:
+        name, value = item.split("=", 1)
+        filters[name] = float(value)
+
+    start = time.perf_counter()
+    table = top_runs(args.symbol, args.timeframe, args.by, max_drawdown=args.max_dd,
+                     min_trades=args.min_trades, params=filters, limit=args.limit, path=args.db)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    if table.empty:
+        print("No matching runs")
+    else:
+        print(table.to_string(index=False))
+    print(f"\n{len(table)} runs in {elapsed:.1f} ms")
@@ -0,0 +1,190 @@
+#run_cache.py
+#Content-addressed cache of finished backtest runs
+#a run is keyed by a hash of the bars it ran on (their values, not the file name), the source of
+#the code that produced it, its parameters and the broker config - an identical rerun is read back
+#from disk in milliseconds, and new data or an edited strategy simply hashes to a new key, so
+#nothing ever has to be invalidated by hand
+#
+#entries are one .npz each (arrays binary, everything else as a JSON blob like backtest_results.py),
+#the file mtime is the last time it was used and the least recently used go first once the cache
+#is over its size limit
+#
+#python run_cache.py --stats / --evict / --clear
+
+import argparse
+import functools
+import hashlib
+import importlib
+import inspect
+import json
+import os
+
+import numpy as np
+
+from data_cache import ensure_cache, open_columns, read_meta, write_meta
+
+#--- USER SETUP: set BT_RUN_CACHE_DIR / BT_RUN_CACHE_MB to move or resize the cache ---
+RUN_CACHE_ROOT = os.environ.get(
+    "BT_RUN_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".run_cache"),
+)
+RUN_CACHE_MAX_BYTES = int(float(os.environ.get("BT_RUN_CACHE_MB", 512)) * 2**20)
+
+#each process checks the size limit again after writing this fraction of it, rather than on every store
+EVICT_FRACTION = 16
+
+#bytes this process stored since it last checked the size limit
+_written = 0
+
+####################################################################################
+
+def _plain(value):
+    """json.dumps fallback for numpy scalars and arrays"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def digest_arrays(data):
+    """Hash of OHLCV column arrays - their names, dtypes and values"""
+    h = hashlib.blake2b(digest_size=20)
+    for name in sorted(data):
+        values = np.ascontiguousarray(data[name])
+        h.update(f"{name}:{values.dtype.str}:{len(values)};".encode())
+        h.update(memoryview(values).cast("B"))
+    return h.hexdigest()
+
+def data_digest(data_file):
+    """digest_arrays of an export's bars, worked out once and kept in its binary cache metadata"""
+    cache_dir = ensure_cache(data_file)
+    meta = read_meta(cache_dir)
+    if "digest" not in meta:
+        #a rebuilt (stale) cache starts without one, so changed data always gets a fresh digest
+        meta["digest"] = digest_arrays(open_columns(cache_dir, meta["rows"]))
+        write_meta(cache_dir, meta)
+    return meta["digest"]
+
+@functools.lru_cache(maxsize=None)
+def code_version(*objects):
+    """Hash of the source of the modules (by name), classes or functions that decide a run's results"""
+    h = hashlib.blake2b(digest_size=20)
+    for obj in objects:
+        if isinstance(obj, str):
+            obj = importlib.import_module(obj)
+        h.update(inspect.getsource(obj).encode())
+    return h.hexdigest()
+
+def run_key(data_key, code, params, config):
+    """Cache key of one run - any change to the data, code, parameters or config gives a new one"""
+    payload = json.dumps({"data": data_key, "code": code, "params": params, "config": config},
+                         sort_keys=True, default=_plain)
+    return hashlib.blake2b(payload.encode(), digest_size=20).hexdigest()
+
+####################################################################################
+
+def entry_path(key, root=None):
+    return os.path.join(root or RUN_CACHE_ROOT, key[:2], f"{key}.npz")
+
+def lookup(key, root=None):
+    """The results stored under key (arrays back as arrays), or None on a miss"""
+    path = entry_path(key, root)
+    try:
+        with np.load(path, allow_pickle=False) as f:
+            results = json.loads(str(f["meta"]))
+            for name in f.files:
+                if name != "meta":
+                    results[name] = f[name]
+    except (OSError, ValueError, KeyError):
+        return None
+
+    #mark it used - eviction goes by mtime
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return results
+
+def store(key, results, root=None, max_bytes=None):
+    """Save a results dict under key, evicting old entries when the cache outgrows max_bytes"""
+    global _written
+    max_bytes = RUN_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    path = entry_path(key, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    arrays = {k: v for k, v in results.items() if isinstance(v, np.ndarray)}
+    meta = {k: v for k, v in results.items() if not isinstance(v, np.ndarray)}
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, meta=np.array(json.dumps(meta, default=_plain)), **arrays)
+    size = os.path.getsize(tmp)
+    if size > max_bytes:
+        #bigger than the whole cache, keeping it would only evict everything else
+        os.remove(tmp)
+        return None
+    os.replace(tmp, path)
+
+    _written += size
+    if _written >= max_bytes // EVICT_FRACTION:
+        _written = 0
+        evict(root, max_bytes)
+    return path
+
+def _entries(root=None):
+    """(mtime, size, path) of every cache entry"""
+    entries = []
+    root = root or RUN_CACHE_ROOT
+    if not os.path.isdir(root):
+        return entries
+    for sub in os.scandir(root):
+        if not sub.is_dir():
+            continue
+        for entry in os.scandir(sub.path):
+            if entry.name.endswith(".npz"):
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue  # evicted by another process meanwhile
+                entries.append((st.st_mtime_ns, st.st_size, entry.path))
+    return entries
+
+def evict(root=None, max_bytes=None):
+    """Delete least recently used entries until the cache fits in max_bytes, returns (entries, bytes) removed"""
+    max_bytes = RUN_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = sorted(_entries(root))
+    total = sum(size for _, size, _ in entries)
+    removed = [0, 0]
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed[0] += 1
+        removed[1] += size
+    return tuple(removed)
+
+def cache_stats(root=None):
+    """(entries, bytes) currently in the cache"""
+    entries = _entries(root)
+    return len(entries), sum(size for _, size, _ in entries)
+
+####################################################################################
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or trim the backtest run cache")
+    parser.add_argument("--stats", action="store_true", help="entries and size on disk")
+    parser.add_argument("--evict", action="store_true", help="trim the cache down to BT_RUN_CACHE_MB now")
+    parser.add_argument("--clear", action="store_true", help="delete every entry")
+    args = parser.parse_args()
+
+    if args.clear:
+        count, size = evict(max_bytes=0)
+        print(f"Removed {count} entries ({size / 2**20:.1f} MB)")
+    elif args.evict:
+        count, size = evict()
+        print(f"Evicted {count} entries ({size / 2**20:.1f} MB)")
+    count, size = cache_stats()
+    print(f"{count} runs cached in {RUN_CACHE_ROOT} ({size / 2**20:.1f} of {RUN_CACHE_MAX_BYTES / 2**20:.0f} MB)")
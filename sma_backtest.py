@@ -2,10 +2,20 @@
 #Backtesting a Simple Moving Average Crossover Strategy
 
 import backtrader as bt
-import pandas as pd
+import numpy as np
+import argparse
+import array
 import os
 import sys
 import shutil
+import tempfile
+from config import load_config
+from data_cache import ensure_cache, load_cached, read_meta, read_rows, to_bt_datenum
+from fast_backtest import bank_key
+from backtest_results import collect_results, results_path, save_results
+from equity_recorder import EquityRecorder
+from run_cache import code_version, data_digest, lookup, run_key, store
+import profiling
 #redirect print to nowhere during backtest - this makes my output clean and show me what i only want to see
 class Silent:
     def write(self, x):
@@ -36,26 +46,28 @@ class SmaCrossStrategy(bt.Strategy):
 
         self.order = None # track current orders
         self.trade_count = 0 # track trade number
-        self.equity = []
+        self.trades = [] # closed trades for the results artifact
 
-        # create the moving average indicators
-        self.sma_fast = bt.indicators.SimpleMovingAverage(
-            self.data.close, period=self.params.pfast)
-        self.sma_slow = bt.indicators.SimpleMovingAverage(
-            self.data.close, period=self.params.pslow)
+        # create the moving average indicators (read from the feed's indicator bank when it has them)
+        self.sma_fast = self.make_sma("close", self.params.pfast)
+        self.sma_slow = self.make_sma("close", self.params.pslow)
         self.order = None
         self.trade_count = 0
         
         #This indicator will generate crossover signals (1 for up, -1 for down)
         self.crossover = bt.indicators.CrossOver(self.sma_fast, self.sma_slow)
 
-        self.trend_filter = bt.indicators.SimpleMovingAverage(
-            self.data.close, period=5
-        )
+        self.trend_filter = self.make_sma("close", 5)
 
-        self.volume_sma = bt.indicators.SimpleMovingAverage(
-            self.data.volume, period=20
-        )
+        self.volume_sma = self.make_sma("volume", 20)
+
+    def make_sma(self, series, period):
+        """SimpleMovingAverage of a data line, or a BankSMA when the feed's indicator bank holds it"""
+        bank = getattr(self.data.p, "bank", None)
+        line = None if bank is None else bank.get(bank_key(series, period))
+        if line is not None:
+            return BankSMA(getattr(self.data, series), line=line, period=period)
+        return bt.indicators.SimpleMovingAverage(getattr(self.data, series), period=period)
     
     def next(self):
         if self.order:
@@ -112,8 +124,6 @@ class SmaCrossStrategy(bt.Strategy):
             if self.crossover < 0:
                 self.close()
 
-        self.equity.append(self.broker.getvalue())
-
     def notify_order(self, order):
         """Track order execution status"""
         if order.status in [order.Completed]:
@@ -129,9 +139,11 @@ class SmaCrossStrategy(bt.Strategy):
         """Track trade P&L"""
         if trade.isclosed:
             print(f"trade P&L: ${trade.pnl:.2f} ({trade.pnlcomm:.2f} with commission)") #- UNCOMMENT AND REMOVE PASS IF YOU WANT TO SEE TRADE PNL INFO
+            self.trades.append((trade.dtopen, trade.dtclose, trade.price, trade.barlen, trade.pnl, trade.pnlcomm))
 
 def find_data_file():
     """Find the most recent MT5 data file"""
+    settings = load_config()
     try:
         # First check if we have metadata from latest export
         if os.path.exists("latest_export_info.txt"):
@@ -140,11 +152,12 @@ def find_data_file():
                 expected_file = f"MT5_{symbol}_{timeframe}_data.csv"
 
                 
-                --- USER SETUP: Change BOTH paths to your desired data directory ---
-                expected_file_path = "c:\\Users\\Tshepo\\Desktop\\Trading_Backtesting_Project\\data_save\\" + expected_file
+                #--- USER SETUP: data_save_dir / in_use_dir in backtest_config.json (see config.py) ---
+                expected_file_path = os.path.join(settings["data_save_dir"], expected_file)
                 if os.path.exists(expected_file_path):
                     print(f"Using latest exported file: {expected_file_path}")
-                    new_path = "c:\\Users\\Tshepo\\Desktop\\Trading_Backtesting_Project\\data_save\\in_use\\" + expected_file
+                    os.makedirs(settings["in_use_dir"], exist_ok=True)
+                    new_path = os.path.join(settings["in_use_dir"], expected_file)
                     shutil.move(expected_file_path, new_path)
                     return new_path, symbol, timeframe  # Return path to the MOVED file
                 
@@ -153,8 +166,7 @@ def find_data_file():
 
         
         # Fallback: find most recent file in data directory
-        --- USER SETUP: Change this path to your desired data directory ---
-        data_dir = "c:\\Users\\Tshepo\\Desktop\\Trading_Backtesting_Project\\data_save\\"
+        data_dir = settings["data_save_dir"]
         all_files = [f for f in os.listdir(data_dir) if f.startswith('MT5_') and f.endswith('_data.csv')]
         # First check if we have metadata from latest export
         
@@ -168,8 +180,6 @@ def find_data_file():
         symbol = filename_parts[0] if len(filename_parts) > 0 else "Unknown"
         timeframe = filename_parts[1] if len(filename_parts) > 1 else "Unknown"
         
-        --- USER SETUP: Change this path to your desired data directory ---
-        data_dir = "c:\\Users\\Tshepo\\Desktop\\Trading_Backtesting_Project\\data_save\\"
         full_path = os.path.join(data_dir, latest_file)
         print(f"Using most recent file: {full_path}")
         return full_path, symbol, timeframe  # Return FULL PATH
@@ -179,29 +189,124 @@ def find_data_file():
         print(f"Error finding data file: {e}")
         return None, None, None
 
-#This part is for running the backtest - THIS IS THE BACKTEST/CEREBRO CALLING FROM DATA EXPORT
-if __name__ == "__main__":
+class CachedMT5Data(bt.feed.DataBase):
+    """Backtrader feed that reads bars straight from the memory-mapped binary cache"""
+    params = (
+        ("arrays", None),     # memory-mapped columns from load_cached
+        ("cache_dir", None),  # or stream from this cache directory instead, chunk rows at a time
+        ("chunk", 65536),
+        ("bank", None),       # indicator bank (indicator_bank.build_bank) over these same bars
+    )
 
-    data_file, symbol, timeframe = find_data_file()
-    if data_file is None:
-        exit(1)
+    def start(self):
+        super().start()
+        self._idx = 0
+        self._base = 0
+        if self.p.arrays is not None:
+            self._rows = len(self.p.arrays["time"])
+            self._set_block(self.p.arrays)
+        else:
+            #streaming - only one chunk of bars is in memory at any time
+            self._rows = read_meta(self.p.cache_dir)["rows"]
+            self._block_len = 0
+
+    def _set_block(self, arrays):
+        self._dtnum = to_bt_datenum(arrays["time"])
+        self._columns = (arrays["open"], arrays["high"], arrays["low"], arrays["close"], arrays["volume"])
+        self._block_len = len(self._dtnum)
+
+    def _load(self):
+        i = self._idx
+        if i >= self._rows:
+            return False
+        if i - self._base >= self._block_len:
+            self._base = i
+            self._set_block(read_rows(self.p.cache_dir, i, self.p.chunk))
+        j = i - self._base
+        opens, highs, lows, closes, volumes = self._columns
+        #plain floats - unbuffered (exactbars) lines keep whatever they are given and numpy
+        #scalars leak into trade sizes (np.True_ + np.True_ is still True in TradeAnalyzer)
+        self.lines.datetime[0] = float(self._dtnum[j])
+        self.lines.open[0] = float(opens[j])
+        self.lines.high[0] = float(highs[j])
+        self.lines.low[0] = float(lows[j])
+        self.lines.close[0] = float(closes[j])
+        self.lines.volume[0] = float(volumes[j])
+        self.lines.openinterest[0] = 0.0
+        self._idx = i + 1
+        return True
+
+class BankSMA(bt.Indicator):
+    """SimpleMovingAverage that copies its values out of an indicator bank line instead of summing windows"""
+    lines = ("sma",)
+    params = (
+        ("line", None),  # the bank's SMA array for this data line and period, one value per bar
+        ("period", 30),
+    )
 
-    print(f"Backtesting {symbol} on {timeframe} timeframe...")
+    def __init__(self):
+        self.addminperiod(self.p.period)
 
-    #create a cerebro engine (the core of backtrader)
-    cerebro = bt.Cerebro()
-    #add our strategy
-    cerebro.addstrategy(SmaCrossStrategy)
-
-    #load our data from CSV file
-    data = bt.feeds.GenericCSVData(
-        dataname=data_file,  #Your exported file - CHANGE THE HASHTAGS ON DTFORMAT AND TIMEFORMAT ROUND WHEN SWITICHING FORM MINUTES TO DAYS ON DATA ###########################################
-        dtformat=("%Y-%m-%d %H:%M:%S"),  #MT5 MINUTES TIMESTAMP FORMAT
-        timeframe=bt.TimeFrame.Minutes,  #Minutes data
-        #dtformat=("%Y-%m-%d"),           #MT5 DAILY TIMESTAMP FORMAT
-        #timeframe=bt.TimeFrame.Days,  #Daily data
-        
-        compression=15,  
+    def next(self):
+        self.lines.sma[0] = float(self.p.line[len(self) - 1])
+
+    def once(self, start, end):
+        #one block copy into the preloaded line buffer
+        values = array.array("d")
+        values.frombytes(np.ascontiguousarray(self.p.line[start:end], dtype=np.float64).tobytes())
+        self.lines.sma.array[start:end] = values
+
+#MT5 timeframe -> backtrader (timeframe, compression)
+BT_TIMEFRAMES = {
+    "M1": (bt.TimeFrame.Minutes, 1),
+    "M5": (bt.TimeFrame.Minutes, 5),
+    "M15": (bt.TimeFrame.Minutes, 15),
+    "M30": (bt.TimeFrame.Minutes, 30),
+    "H1": (bt.TimeFrame.Minutes, 60),
+    "H4": (bt.TimeFrame.Minutes, 240),
+    "D1": (bt.TimeFrame.Days, 1),
+    "W1": (bt.TimeFrame.Weeks, 1),
+    "MN1": (bt.TimeFrame.Months, 1),
+}
+DEFAULT_TIMEFRAME = "M15"
+
+def feed_timeframe(timeframe):
+    """Backtrader (timeframe, compression) for an MT5 timeframe name, M15 when it is not recognised"""
+    if timeframe not in BT_TIMEFRAMES:
+        print(f"Unknown timeframe {timeframe!r}, treating the bars as {DEFAULT_TIMEFRAME}")
+        timeframe = DEFAULT_TIMEFRAME
+    return BT_TIMEFRAMES[timeframe]
+
+def load_data_feed(data_file, stream=False, timeframe=DEFAULT_TIMEFRAME, bank=None):
+    """Build the backtrader feed for an MT5 export - from the binary cache, CSV parsing as fallback"""
+    bt_timeframe, compression = feed_timeframe(timeframe)
+    try:
+        if stream:
+            return CachedMT5Data(
+                cache_dir=ensure_cache(data_file),
+                timeframe=bt_timeframe,
+                compression=compression,
+                bank=bank,
+            )
+        return CachedMT5Data(
+            arrays=load_cached(data_file),
+            timeframe=bt_timeframe,
+            compression=compression,
+            bank=bank,
+        )
+    except Exception as e:
+        print(f"Binary cache unavailable ({e}), parsing CSV instead")
+    return csv_data_feed(data_file, timeframe)
+
+def csv_data_feed(data_file, timeframe=DEFAULT_TIMEFRAME):
+    """Backtrader feed parsing an MT5 export's CSV text - the fallback when the binary cache can't be used"""
+    bt_timeframe, compression = feed_timeframe(timeframe)
+    return bt.feeds.GenericCSVData(
+        dataname=data_file,  #Your exported file
+        #mt5_data_export writes daily and up as plain dates, intraday with a time
+        dtformat=("%Y-%m-%d" if bt_timeframe >= bt.TimeFrame.Days else "%Y-%m-%d %H:%M:%S"),
+        timeframe=bt_timeframe,
+        compression=compression,
         open=1,   #column 1: Open (0 based indexing: 0=date, 1=Open, 2=High, etc)
         high=2,   #column 2: High
         low=3,    #column 3: Low
@@ -211,42 +316,166 @@ if __name__ == "__main__":
         reverse=False
     )
 
+def run_backtest(data_file, cash=100000.0, commission=0.0001, slippage=0.00005, low_memory=False, spill_dir=None,
+                 timeframe=DEFAULT_TIMEFRAME, bank=None):
+    """
+    Run SmaCrossStrategy over one MT5 export, returns (cerebro, strat)
+
+    bank (indicator_bank.build_bank over the same export) supplies the moving averages, so
+    repeated runs with different params don't re-average the same windows.
+
+    low_memory streams the bars, keeps only the lookback each line needs and writes trades,
+    transactions and per-bar equity to spill_dir (a new temp dir by default, left for the caller
+    to remove) as they happen, so peak memory stays flat however long the data is. cerebro.plot
+    is not available then.
+    """
+    #create a cerebro engine (the core of backtrader)
+    if low_memory:
+        #exactbars=1 trims every line buffer to its minimum period, the default observers only feed cerebro.plot
+        cerebro = bt.Cerebro(exactbars=1, preload=False, runonce=False, stdstats=False)
+        spill_dir = spill_dir or tempfile.mkdtemp(prefix="bt_spill_")
+        print(f"Low-memory mode, spilling records to {spill_dir}")
+    else:
+        cerebro = bt.Cerebro()
+    #add our strategy (wrapped for timing only when BT_PROFILE is set)
+    cerebro.addstrategy(profiling.instrument_strategy(SmaCrossStrategy))
+
+    #load our data from the MT5 export
+    with profiling.phase("data_feed"):
+        data = profiling.instrument_data(load_data_feed(data_file, stream=low_memory, timeframe=timeframe, bank=bank))
+
     #add the data to cerebro
     cerebro.adddata(data)
 
     #set our starting cash
-    cerebro.broker.setcash(100000.0) #$100,000 starting capital
+    cerebro.broker.setcash(cash) #$100,000 starting capital
 
     #adding commission and slippage
-    cerebro.broker.setcommission(commission=0.0001)  #0.1% commission
-    cerebro.broker.set_slippage_perc(0.00005)        #0.05% slippage
+    cerebro.broker.setcommission(commission=commission)  #0.1% commission
+    cerebro.broker.set_slippage_perc(slippage)        #0.05% slippage
 
     #set the commision - 0.1% per trade
     #cerebro.broker.setcommission(commission=0.001)
 
-    #add analyzers to calculate performance stats
-    cerebro.addanalyzer(bt.analyzers.SharpeRatio, _name="sharpe_ratio")
-    cerebro.addanalyzer(bt.analyzers.DrawDown, _name="drawdown")
-
     #print out the starting portfolio value
     print("Starting Portfolio Value: $%.2f" % cerebro.broker.getvalue())
 
-    #adding trade analyzers
+    #adding trade analyzers - Sharpe, drawdowns etc. come from metrics.py on the equity curve afterwards
     cerebro.addanalyzer(bt.analyzers.TradeAnalyzer, _name="ta")
-    cerebro.addanalyzer(bt.analyzers.Transactions, _name="txn")
+
+    if low_memory:
+        from spill import MemoryTrimmer, TradeSpill, TransactionSpill
+        cerebro.addanalyzer(TransactionSpill, _name="txn", spill_dir=spill_dir)
+        cerebro.addanalyzer(TradeSpill, _name="trades", spill_dir=spill_dir)
+        cerebro.addanalyzer(EquityRecorder, _name="equity", spill_dir=spill_dir)
+        cerebro.addanalyzer(MemoryTrimmer, _name="trimmer")
+    else:
+        cerebro.addanalyzer(bt.analyzers.Transactions, _name="txn")
+        #equity, cash and position on every bar for the dashboard
+        cerebro.addanalyzer(EquityRecorder, _name="equity")
 
     #run the backtest over the historical data!
-    results = cerebro.run()
+    with profiling.phase("cerebro_run"):
+        results = cerebro.run()
 
     #grab strategy object from results
-    strat = results[0]
+    return cerebro, results[0]
+
+def backtest_cache_key(data_file, cash=100000.0, commission=0.0001, slippage=0.00005, timeframe=DEFAULT_TIMEFRAME,
+                       low_memory=False):
+    """
+    Run cache key of a run_backtest - changes with the bars, the strategy and result code, the params,
+    the broker setup or the memory mode
+
+    Every module the results pass through is hashed: the feed and bar cache, the banked SMAs,
+    the low-memory spill files, the profiling phases wrapped around the run and the result collection.
+    """
+    code = code_version(SmaCrossStrategy, CachedMT5Data, BankSMA, load_data_feed, run_backtest,
+                        "data_cache", "indicator_bank", "spill", "profiling",
+                        "backtest_results", "equity_recorder", "metrics")
+    config = dict(cash=cash, commission=commission, slippage=slippage, timeframe=timeframe,
+                  low_memory=bool(low_memory), backtrader=bt.__version__)
+    return run_key(data_digest(data_file), code, dict(SmaCrossStrategy.params._getitems()), config)
+
+def backtest_export(data_file, symbol, timeframe, low_memory=False, spill_dir=None, cache=True,
+                    cash=100000.0, commission=0.0001, slippage=0.00005):
+    """
+    Backtest one MT5 export and collect its results artifact, returns (results, cerebro)
+
+    The same bars, strategy code, params and broker setup always give the same run, so with
+    cache an identical earlier run is read from the run cache - cerebro is None then.
+    """
+    cache_key = None
+    if cache:
+        results = None
+        try:
+            cache_key = backtest_cache_key(data_file, cash, commission, slippage, timeframe, low_memory)
+            results = lookup(cache_key)
+        except Exception as e:
+            print(f"Run cache unavailable ({e})")
+        if results is not None:
+            print(f"Identical run found in the run cache ({cache_key[:12]}), cerebro skipped")
+            results["symbol"], results["timeframe"] = symbol, timeframe
+            return results, None
+
+    cerebro, strat = run_backtest(data_file, cash, commission, slippage, low_memory=low_memory,
+                                  spill_dir=spill_dir, timeframe=timeframe)
+
+    #everything the dashboard needs, performance metrics included (one vectorized pass over the equity curve)
+    with profiling.phase("collect_results"):
+        results = collect_results(strat, symbol, timeframe)
+    if cache_key is not None:
+        try:
+            store(cache_key, results)
+        except Exception as e:
+            print(f"Run cache error: {e}")
+    return results, cerebro
+
+#This part is for running the backtest - THIS IS THE BACKTEST/CEREBRO CALLING FROM DATA EXPORT
+def main(argv=None):
+    """Command line entry - backtest the latest export with the broker setup from backtest_config.json"""
+    parser = argparse.ArgumentParser(description="Backtest SmaCrossStrategy on the latest MT5 export")
+    parser.add_argument("--low-memory", action="store_true",
+                        help="bounded memory for multi-year M1 data - streams bars, spills records to disk, no chart")
+    parser.add_argument("--spill-dir", default=None, help="where --low-memory writes its records and keeps them (default: a temp dir, removed once the results are saved)")
+    parser.add_argument("--no-cache", action="store_true", help="always run cerebro, even when this exact run is in the run cache")
+    args = parser.parse_args(argv)
+    settings = load_config()
+
+    data_file, symbol, timeframe = find_data_file()
+    if data_file is None:
+        return 1
+
+    print(f"Backtesting {symbol} on {timeframe} timeframe...")
+
+    #the spilled records only have to outlive save_results - a temp dir is removed again below
+    spill_dir, spill_temp = args.spill_dir, None
+    if args.low_memory and spill_dir is None:
+        spill_dir = spill_temp = tempfile.mkdtemp(prefix="bt_spill_")
+    try:
+        results, cerebro = backtest_export(data_file, symbol, timeframe, low_memory=args.low_memory,
+                                           spill_dir=spill_dir, cache=not args.no_cache, cash=settings["cash"],
+                                           commission=settings["commission"], slippage=settings["slippage"])
+    except BaseException:
+        if spill_temp is not None:
+            shutil.rmtree(spill_temp, ignore_errors=True)
+        raise
 
     #print out the final portfolo value
-    print("Final Portfolio Value: $%.2f" % cerebro.broker.getvalue())
+    print("Final Portfolio Value: $%.2f" % results["final_value"])
+    metrics = results["metrics"]
 
+    def fmt(value, spec=".2f"):
+        return "n/a" if value is None else format(value, spec)
 
-    print("Sharpe Ratio:", strat.analyzers.sharpe_ratio.get_analysis()["sharperatio"])
-    print("Max Drawdown: %.2f%%" % strat.analyzers.drawdown.get_analysis()["max"]["drawdown"])
+    print("Sharpe Ratio:", fmt(metrics["sharpe"]))
+    print("Sortino Ratio:", fmt(metrics["sortino"]))
+    print("Calmar Ratio:", fmt(metrics["calmar"]))
+    print(f"Max Drawdown: {fmt(metrics['max_drawdown'])}% (avg {fmt(metrics['avg_drawdown'])}%, "
+          f"longest {metrics['max_drawdown_bars']} bars / {fmt(metrics['max_drawdown_days'], '.1f')} days)")
+    print(f"Exposure: {fmt(metrics['exposure'])}%")
+    print(f"Profit Factor: {fmt(metrics['profit_factor'])}")
+    print(f"Expectancy: ${fmt(metrics['expectancy'])} per trade")
 
     #this is trade analysis
     print("\n" + "=" *50)
@@ -254,15 +483,16 @@ if __name__ == "__main__":
     print("="*50)
 
     try:
-        trade_analysis = strat.analyzers.ta.get_analysis()
-        if hasattr(trade_analysis, "total"):
-            print(f"Total trades: {trade_analysis.total.total}")
-            print(f"Winning Trades: {trade_analysis.won.total}")
-            print(f"Losing Trades: {trade_analysis.lost.total}")
-            print(f"Win Rate: {(trade_analysis.won.total/trade_analysis.total.total)*100:.2f}%")
-
-            if hasattr(trade_analysis, "pnl"):
-                print(f"Net P&L: ${trade_analysis.pnl.net.total:.2f}")
+        #TradeAnalyzer output as plain dicts, the same whether cerebro ran or the run came from the cache
+        trade_analysis = results["analyzers"].get("ta", {})
+        if "total" in trade_analysis:
+            print(f"Total trades: {trade_analysis['total']['total']}")
+            print(f"Winning Trades: {trade_analysis['won']['total']}")
+            print(f"Losing Trades: {trade_analysis['lost']['total']}")
+            print(f"Win Rate: {(trade_analysis['won']['total']/trade_analysis['total']['total'])*100:.2f}%")
+
+            if "pnl" in trade_analysis:
+                print(f"Net P&L: ${trade_analysis['pnl']['net']['total']:.2f}")
         
     except Exception as e:
         print(f"Trade Analysis Error: {e}")
@@ -272,18 +502,56 @@ if __name__ == "__main__":
     print("TRANSACTIONS LOG")
     print("="*50)
     try:
-        transactions = strat.analyzers.txn.get_analysis()
-        for date, txns in transactions.items():
-            for txn in txns:
-                pass #print(f"{date}: {txn}") #UNCOMMENT AND REMOVE PASS IF YOU WANT TO SEE CEREBRO RUN INFO
+        #[time, size, price, value] rows, see backtest_results.TRANSACTION_FIELDS
+        transactions = results["transactions"]
+        if args.low_memory:
+            print(f"{len(transactions)} transactions spilled to disk")
+            transactions = []
+        for txn in transactions:
+            pass #print(txn) #UNCOMMENT AND REMOVE PASS IF YOU WANT TO SEE CEREBRO RUN INFO
     except Exception as e:
         print(f"Transaction Error: {e}")
 
 
     print("Your backtest is complete Tep!")
 
-    #plotting results
-    import matplotlib.pyplot as plt
-    plt.rcParams["figure.figsize"] = [12, 8]
+    #save everything the dashboard needs so visualize_results.py never re-runs cerebro
+    os.makedirs(settings["results_dir"], exist_ok=True)
+    with profiling.phase("save_results"):
+        results_file = save_results(results, results_path(symbol, timeframe, settings["results_dir"]))
+    print(f"Results saved to {results_file}")
 
-    cerebro.plot(style="candlestick", volume=True, barup="green", bardown="red")
+    #index the run so it can be compared with every other one (python results_db.py ...)
+    try:
+        from results_db import save_backtest
+        print(f"Run stored in results database as #{save_backtest(results, data_file)}")
+    except Exception as e:
+        print(f"Results database error: {e}")
+
+    if spill_temp is not None:
+        #the artifact holds copies now - drop the memmaps of the spill files first (Windows won't delete mapped files)
+        results = transactions = cerebro = None
+        shutil.rmtree(spill_temp, ignore_errors=True)
+
+    if args.low_memory:
+        print("Chart disabled in low-memory mode - run visualize_results.py for the dashboard")
+    elif cerebro is None:
+        print("Chart needs cerebro, which the cached run skipped - run visualize_results.py for the dashboard")
+    else:
+        #plotting results
+        import matplotlib.pyplot as plt
+        from backtrader.plot import Plot
+        plt.rcParams["figure.figsize"] = [12, 8]
+
+        #the chart window stays open until closed - its own phase so it is not mistaken for drawing time
+        plotter = Plot(style="candlestick", volume=True, barup="green", bardown="red")
+        plotter.show = profiling.wrap_phase("show_window", plotter.show)
+        with profiling.phase("plot"):
+            cerebro.plot(plotter=plotter)
+
+    if profiling.enabled():
+        profile_file = profiling.save(f"profile_backtest_{symbol}_{timeframe}.json")
+        print(f"Profile saved to {profile_file}")
+
+if __name__ == "__main__":
+    sys.exit(main())
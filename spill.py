@@ -0,0 +1,160 @@
+#spill.py
+#Disk spilling for bounded-memory backtests (sma_backtest.py --low-memory)
+#records that would otherwise pile up in Python lists for the whole run - closed trades,
+#transactions, per-bar equity - are appended to raw column files as they happen, a small
+#buffer at a time, and read back memory-mapped once the run is over
+
+import os
+
+import backtrader as bt
+import numpy as np
+
+from backtest_results import TRADE_FIELDS, TRANSACTION_FIELDS
+from data_cache import from_bt_datenum
+
+BUFFER_ROWS = 4096
+
+####################################################################################
+
+class ColumnSpill:
+    """Append-only column files (one raw little-endian file per column) with a small write buffer"""
+
+    def __init__(self, directory, columns, buffer_rows=BUFFER_ROWS):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.columns = columns  # name -> dtype
+        self.buffers = [np.empty(buffer_rows, dtype=dtype) for dtype in columns.values()]
+        self.files = [open(self.path(name), "wb") for name in columns]
+        self.pending = 0
+        self.rows = 0
+
+    def path(self, name):
+        return os.path.join(self.directory, f"{name}.bin")
+
+    def append(self, row):
+        """Add one row (values in column order)"""
+        i = self.pending
+        for buf, value in zip(self.buffers, row):
+            buf[i] = value
+        self.pending = i + 1
+        if self.pending == len(self.buffers[0]):
+            self.flush()
+
+    def flush(self):
+        n = self.pending
+        if n:
+            for buf, f in zip(self.buffers, self.files):
+                buf[:n].tofile(f)
+            self.rows += n
+            self.pending = 0
+
+    def close(self):
+        if self.files is not None:
+            self.flush()
+            for f in self.files:
+                f.close()
+            self.files = None
+
+    def read(self):
+        """Close the files and memory-map every column"""
+        self.close()
+        arrays = {}
+        for name, dtype in self.columns.items():
+            if self.rows == 0:
+                arrays[name] = np.empty(0, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(self.path(name), dtype=dtype, mode="r", shape=(self.rows,))
+        return arrays
+
+####################################################################################
+
+class TradeSpill(bt.Analyzer):
+    """
+    Takes over strategy.trades - every closed trade the strategy appends goes straight to disk
+
+    get_analysis returns the trades as rows in backtest_results.TRADE_FIELDS order,
+    open/close times as epoch seconds.
+    """
+    params = (("spill_dir", None),)
+
+    def start(self):
+        #same tuple SmaCrossStrategy.notify_trade appends (times still backtrader datenums)
+        self.spill = ColumnSpill(os.path.join(self.p.spill_dir, "trades"),
+                                 {name: "<f8" for name in TRADE_FIELDS})
+        self.strategy.trades = self.spill
+
+    def stop(self):
+        self.spill.close()
+
+    def get_analysis(self):
+        columns = self.spill.read()
+        if not self.spill.rows:
+            return np.empty((0, len(TRADE_FIELDS)))
+        rows = np.column_stack([columns[name] for name in TRADE_FIELDS])
+        rows[:, 0] = from_bt_datenum(rows[:, 0])
+        rows[:, 1] = from_bt_datenum(rows[:, 1])
+        return rows
+
+class TransactionSpill(bt.analyzers.Transactions):
+    """Transactions analyzer that writes each bar's entries to disk instead of keeping a dict"""
+    params = (("spill_dir", None),)
+
+    def start(self):
+        super().start()
+        self.spill = ColumnSpill(os.path.join(self.p.spill_dir, "transactions"),
+                                 {"time": "<i8", "size": "<f8", "price": "<f8", "value": "<f8"})
+
+    def next(self):
+        when = None
+        for i, dname in self._idnames:
+            pos = self._positions.get(dname, None)
+            if pos is not None and pos.size:
+                if when is None:
+                    when = from_bt_datenum(self.strategy.datetime[0])
+                self.spill.append((when, pos.size, pos.price, -pos.size * pos.price))
+
+        self._positions.clear()
+
+    def stop(self):
+        self.spill.close()
+
+    def get_analysis(self):
+        """Rows in backtest_results.TRANSACTION_FIELDS order"""
+        columns = self.spill.read()
+        if not self.spill.rows:
+            return np.empty((0, len(TRANSACTION_FIELDS)))
+        return np.column_stack([columns[name] for name in TRANSACTION_FIELDS]).astype(np.float64)
+
+class MemoryTrimmer(bt.Analyzer):
+    """
+    Drops finished orders and closed trades backtrader keeps for the whole run
+
+    The broker and strategy append every order (or notification copy of one) to lists that
+    are only read for status lookups, and the strategy keeps every Trade object.
+    Every `every` bars the dead ones are dropped (the open trade per data/tradeid stays).
+    """
+    params = (("every", 1000),)
+
+    def start(self):
+        self.bars = 0
+
+    def prenext(self):
+        self.next()
+
+    def next(self):
+        self.bars += 1
+        if self.bars % self.p.every == 0:
+            self.trim()
+
+    def trim(self):
+        broker = self.strategy.broker
+        broker.orders = [o for o in broker.orders if o.alive()]
+        #the strategy's list holds notification snapshots, not live orders - nothing reads it back
+        del self.strategy._orders[:]
+        for datatrades in self.strategy._trades.values():
+            for trades in datatrades.values():
+                #the strategy only looks at the last trade to decide whether to open a new one
+                del trades[:-1]
+
+    def get_analysis(self):
+        return {}
@@ -0,0 +1,7 @@
+#conftest.py
+#the modules live flat in the project root - make them importable from the tests
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,106 @@
+#fake_mt5.py
+#Local stand-in for the MetaTrader5 package - the calls mt5_data_export makes, over a deterministic
+#bar history the tests can move forward, rewrite or break
+#
+#install it with monkeypatch.setattr(mt5_data_export, "mt5", FakeMT5(...)) and pass Mt5Source()
+
+import threading
+import types
+from datetime import datetime
+
+import numpy as np
+
+RATES_DTYPE = np.dtype([
+    ("time", "<i8"),
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("tick_volume", "<u8"),
+    ("spread", "<i4"),
+    ("real_volume", "<u8"),
+])
+
+TIMEFRAME_SECONDS = {"M1": 60, "M5": 300, "M15": 900, "M30": 1800, "H1": 3600, "H4": 14400, "D1": 86400}
+
+class FakeMT5:
+    """
+    Bars on the timeframe grid up to self.until (epoch seconds, default: the last whole bar before now)
+
+    closes / opens override single bars ({time: price}), drop leaves bars out, extra adds raw
+    rates rows, disorder returns every row after the first in reverse. fail = {symbol: n} makes the first n
+    copy_rates_range calls for a symbol raise OSError (n < 0: every call returns None).
+    calls counts copy_rates_range per symbol.
+    """
+
+    def __init__(self, symbols=("GBPUSD",), until=None):
+        self.symbols = list(symbols)
+        self.until = until
+        self.closes = {}
+        self.opens = {}
+        self.drop = set()
+        self.extra = []
+        self.disorder = False
+        self.fail = {}
+        self.calls = {}
+        self.lock = threading.Lock()
+        for name in list(TIMEFRAME_SECONDS) + ["W1", "MN1"]:
+            setattr(self, f"TIMEFRAME_{name}", name)
+
+    def initialize(self):
+        return True
+
+    def shutdown(self):
+        pass
+
+    def last_error(self):
+        return (-1, "fake: no data")
+
+    def symbols_get(self):
+        return [types.SimpleNamespace(name=s) for s in self.symbols]
+
+    def symbol_info(self, symbol):
+        return types.SimpleNamespace(name=symbol) if symbol in self.symbols else None
+
+    def symbol_select(self, symbol, enable):
+        return False
+
+    def rates(self, timeframe, start, end):
+        """The rows copy_rates_range returns for start..end (inclusive, epoch seconds)"""
+        seconds = TIMEFRAME_SECONDS[timeframe]
+        until = self.until if self.until is not None else int(datetime.now().timestamp()) // seconds * seconds
+        first = -(-start // seconds) * seconds
+        times = np.arange(first, min(end, until) + 1, seconds, dtype=np.int64)
+        times = np.array([t for t in times if t not in self.drop], dtype=np.int64)
+
+        rates = np.zeros(len(times), dtype=RATES_DTYPE)
+        rates["time"] = times
+        rates["open"] = [self.opens.get(t, 1.25 + (t // seconds) % 50 * 1e-4) for t in times]
+        rates["close"] = [self.closes.get(t, o + 2e-4) for t, o in zip(times, rates["open"])]
+        rates["high"] = np.maximum(rates["open"], rates["close"]) + 1e-4
+        rates["low"] = np.minimum(rates["open"], rates["close"]) - 1e-4
+        rates["tick_volume"] = 100
+        extra = np.array(self.extra, dtype=RATES_DTYPE)
+        extra = extra[(extra["time"] >= start) & (extra["time"] <= end)]
+        if len(extra):
+            rates = np.sort(np.concatenate([rates, extra]), order="time")
+        if self.disorder:
+            rates = np.concatenate([rates[:1], rates[1:][::-1]])
+        return rates
+
+    def copy_rates_range(self, symbol, timeframe, date_from, date_to):
+        with self.lock:
+            self.calls[symbol] = self.calls.get(symbol, 0) + 1
+            calls = self.calls[symbol]
+        failures = self.fail.get(symbol, 0)
+        if failures < 0 or symbol not in self.symbols:
+            return None
+        if calls <= failures:
+            raise OSError(f"fake: IPC error on call {calls}")
+        return self.rates(timeframe, int(date_from.timestamp()), int(date_to.timestamp()))
+
+def bar(timeframe="H4", count=0, until=None):
+    """Time of the bar count bars before until (default: the last whole bar before now)"""
+    seconds = TIMEFRAME_SECONDS[timeframe]
+    until = until if until is not None else int(datetime.now().timestamp()) // seconds * seconds
+    return until - count * seconds
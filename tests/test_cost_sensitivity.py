@@ -0,0 +1,45 @@
+#test_cost_sensitivity.py
+#Repriced cost grids against full fast-path runs, and breakeven costs of uneven rows
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmark import generate_ohlcv
+from cost_sensitivity import breakeven, cost_sensitivity
+from fast_backtest import run_fast_backtest
+from param_sweep import summarize
+
+def synthetic_data(n_bars, seed):
+    frame = generate_ohlcv(n_bars, seed)
+    data = {name.lower(): frame[name].to_numpy(dtype=np.float64) for name in frame.columns}
+    data["time"] = frame.index.asi8 // 10**9
+    return data
+
+@pytest.mark.parametrize("n_bars, seed", [(5000, 1), (20000, 7)])
+def test_grid_matches_full_runs(n_bars, seed):
+    data = synthetic_data(n_bars, seed)
+    commissions = [0, 0.0001, 0.0002, 0.0004]
+    slippages = [0, 0.00005, 0.0001, 0.0002]
+    table = cost_sensitivity(data, commissions, slippages)
+
+    assert len(table) == 16
+    for row in table.itertuples():
+        expected = summarize(run_fast_backtest(data, None, 100000.0, row.commission, row.slippage), 100000.0)
+        assert row.final_value == pytest.approx(expected["final_value"], rel=1e-9)
+        assert row.trades == expected["trades"]
+    #pairs off the base path are either on a later path or re-run, never both
+    assert ((table["path"] == -1) == ~table["repriced"]).all()
+
+def test_breakeven_after_last_profitable_point():
+    table = pd.DataFrame({
+        "commission": [0.0, 1.0, 2.0, 3.0, 4.0] * 3,
+        "slippage": [0.0] * 5 + [1.0] * 5 + [2.0] * 5,
+        "net_pnl": [-5.0, 10.0, 5.0, -5.0, -10.0,   #starts at a loss, profitable further on
+                    20.0, 10.0, 5.0, 1.0, 1.0,      #profitable everywhere
+                    -1.0, -2.0, 0.0, -3.0, -4.0],   #never profitable
+    })
+    found = breakeven(table, "commission")
+    assert found[0.0] == pytest.approx(2.5)
+    assert np.isinf(found[1.0])
+    assert np.isnan(found[2.0])
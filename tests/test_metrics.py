@@ -0,0 +1,31 @@
+#test_metrics.py
+#Annualization on data with gaps (weekday-only FX bars)
+
+import numpy as np
+import pytest
+
+from metrics import compute_metrics, periods_per_year
+
+H1 = 3600
+
+def weekday_hours(weeks):
+    """Hourly bar times Monday to Friday only, starting on a Monday"""
+    monday = 1_704_067_200  # 2024-01-01
+    times = monday + np.arange(weeks * 7 * 24) * H1
+    weekday = (times // 86400 + 3) % 7  # 0 = Monday
+    return times[weekday < 5]
+
+def test_periods_per_year_counts_observed_bars():
+    times = weekday_hours(104)
+    #120 bars a week, not the 168 a calendar-spacing estimate assumes
+    assert periods_per_year(times) == pytest.approx(120 * 365.25 / 7, rel=0.01)
+    assert periods_per_year(None) == 252.0
+
+def test_annual_return_uses_time_span():
+    times = weekday_hours(104)
+    #doubles over (almost exactly) two calendar years
+    equity = 100000.0 * 2 ** (np.arange(len(times)) / (len(times) - 1))
+    metrics = compute_metrics(equity, times, start_cash=100000.0)
+    years = (times[-1] - times[0]) / (365.25 * 86400)
+    assert metrics["annual_return"] == pytest.approx((2 ** (1 / years) - 1) * 100)
+    assert 40 < metrics["annual_return"] < 43
@@ -0,0 +1,211 @@
+#test_mt5_data_export.py
+#Incremental updates and the bulk export against the local fake MetaTrader5 (fake_mt5.py)
+
+import os
+import time
+
+import pytest
+
+import data_cache
+import mt5_data_export
+from fake_mt5 import FakeMT5, bar
+
+H4 = 14400
+#a fixed, grid aligned "now" for the fake terminal
+T = 1_700_000_000 // H4 * H4
+
+@pytest.fixture
+def fake(tmp_path, monkeypatch):
+    terminal = FakeMT5(["GBPUSD", "EURUSD", "USDJPY"], until=T)
+    monkeypatch.setattr(mt5_data_export, "mt5", terminal)
+    monkeypatch.setattr(data_cache, "CACHE_ROOT", str(tmp_path / "cache"))
+    return terminal
+
+def days_back(days=20):
+    """days_back reaching days before T, the download range always ends at the real now"""
+    return int((time.time() - T) / 86400) + days
+
+def export(tmp_path, name="MT5_GBPUSD_H4_data.csv", symbol="GBPUSD"):
+    path = str(tmp_path / name)
+    written = mt5_data_export.download_history(symbol, "H4", path, days_back(), source=mt5_data_export.Mt5Source())
+    assert written
+    return path
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def spy_full_pulls(monkeypatch):
+    pulls = []
+    download = mt5_data_export.download_history
+    def recording(*args, **kwargs):
+        pulls.append(args[2])
+        return download(*args, **kwargs)
+    monkeypatch.setattr(mt5_data_export, "download_history", recording)
+    return pulls
+
+def update(path):
+    return mt5_data_export.update_mt5_data("GBPUSD", "H4", path, days_back(), source=mt5_data_export.Mt5Source())
+
+####################################################################################
+
+def test_read_last_bar(fake, tmp_path):
+    path = export(tmp_path)
+    content = read(path)
+    last_time, last_open, offset = mt5_data_export.read_last_bar(path)
+
+    assert last_time.timestamp() == T
+    assert last_open == pytest.approx(fake.rates("H4", T, T)["open"][0])
+    assert content[offset:].startswith(last_time.strftime("%Y-%m-%d %H:%M:%S").encode())
+    assert content[offset - 1:offset] == b"\n"
+
+def test_update_replaces_boundary_bar(fake, tmp_path, monkeypatch):
+    path = export(tmp_path)
+    before = read(path)
+    offset = mt5_data_export.read_last_bar(path)[2]
+
+    #the stored last bar was still forming - its close moved, and five more bars arrived
+    fake.closes[T] = 1.2600
+    fake.until = bar("H4", -5, T)
+    pulls = spy_full_pulls(monkeypatch)
+    assert update(path) == 6
+    assert pulls == []
+
+    after = read(path)
+    #everything before the boundary bar is kept byte for byte, from there on it matches a full download
+    assert after[:offset] == before[:offset]
+    assert after == read(export(tmp_path, "reference.csv"))
+    assert b"1.26," in after[offset:].split(b"\n")[0]
+
+def test_update_without_new_bars_leaves_file_untouched(fake, tmp_path, monkeypatch):
+    path = export(tmp_path)
+    before = read(path)
+    stamp = os.stat(path).st_mtime_ns
+
+    #the terminal returns nothing from the stored last bar on
+    fake.until = bar("H4", 1, T)
+    pulls = spy_full_pulls(monkeypatch)
+    assert update(path) == 0
+    assert pulls == []
+    assert read(path) == before
+    assert os.stat(path).st_mtime_ns == stamp
+
+def test_update_with_only_boundary_bar_keeps_content(fake, tmp_path, monkeypatch):
+    path = export(tmp_path)
+    before = read(path)
+    pulls = spy_full_pulls(monkeypatch)
+    assert update(path) == 1
+    assert pulls == []
+    assert read(path) == before
+
+@pytest.mark.parametrize("break_history, reason", [
+    (lambda fake: fake.drop.add(T), "missing"),
+    (lambda fake: fake.opens.update({T: 1.3}), "changed"),
+    (lambda fake: fake.extra.append((T + 60, 1.25, 1.26, 1.24, 1.25, 100, 0, 0)), "off the timeframe grid"),
+    (lambda fake: setattr(fake, "disorder", True), "out of order"),
+])
+def test_update_falls_back_to_full_pull(fake, tmp_path, monkeypatch, capsys, break_history, reason):
+    path = export(tmp_path)
+    fake.until = bar("H4", -3, T)
+    break_history(fake)
+    capsys.readouterr()
+
+    pulls = spy_full_pulls(monkeypatch)
+    written = update(path)
+    assert pulls == [path]
+    out = capsys.readouterr().out
+    assert reason in out and "doing a full re-pull" in out
+    #the whole file was rewritten from the terminal's current history
+    assert written == read(path).count(b"\n") - 1
+    assert read(path) == read(export(tmp_path, "reference.csv"))
+
+def test_check_delta_accepts_clean_tail(fake):
+    rates = fake.rates("H4", T, bar("H4", -4, T))
+    df = mt5_data_export.rates_to_frame(rates)
+    assert mt5_data_export.check_delta(df, df.index[0], rates["open"][0], "H4") is None
+
+####################################################################################
+
+def test_bulk_export_retries_and_reports(fake, tmp_path):
+    #EURUSD raises on its first request, USDJPY never returns data, GBPUSD always works
+    fake.fail = {"EURUSD": 1, "USDJPY": -1}
+    symbols = ["GBPUSD", "EURUSD", "USDJPY"]
+    timeframes = ["H4", "H1"]
+
+    done, failed = mt5_data_export.export_bulk(symbols, timeframes, str(tmp_path), days_back(), True,
+                                               mt5_data_export.Mt5Source(), max_workers=3, retries=2, backoff=0)
+
+    assert set(done) == {(s, tf) for s in ("GBPUSD", "EURUSD") for tf in timeframes}
+    assert all(bars > 0 for bars in done.values())
+    assert set(failed) == {("USDJPY", "H4"), ("USDJPY", "H1")}
+    assert all("no data after 3 attempts" in error for error in failed.values())
+
+    #one request per pair, one retry for the failed EURUSD request, every attempt for USDJPY
+    assert fake.calls == {"GBPUSD": 2, "EURUSD": 3, "USDJPY": 6}
+    for symbol, timeframe in done:
+        assert os.path.exists(tmp_path / f"MT5_{symbol}_{timeframe}_data.csv")
+    assert not os.path.exists(tmp_path / "MT5_USDJPY_H4_data.csv")
+
+####################################################################################
+
+class Interrupted(mt5_data_export.Mt5Source):
+    """Mt5Source whose connection drops after a number of page requests"""
+
+    def __init__(self, pages):
+        super().__init__()
+        self.pages = pages
+
+    def copy_rates(self, symbol, timeframe, start_date, end_date):
+        if self.pages == 0:
+            raise OSError("fake: connection lost")
+        self.pages -= 1
+        return super().copy_rates(symbol, timeframe, start_date, end_date)
+
+def download(path, source, days=20, page_bars=10):
+    return mt5_data_export.download_history("GBPUSD", "H4", path, days_back(days), source=source,
+                                            page_bars=page_bars)
+
+def cache_columns(path):
+    cache_dir = data_cache.cache_dir_for(path)
+    return {name: read(os.path.join(cache_dir, f"{name}.bin")) for name in data_cache.COLUMNS}
+
+def test_interrupted_download_resumes_to_a_full_pull(fake, tmp_path, capsys):
+    reference = str(tmp_path / "full" / "MT5_GBPUSD_H4_data.csv")
+    os.makedirs(os.path.dirname(reference))
+    assert download(reference, mt5_data_export.Mt5Source()) == 120
+
+    path = str(tmp_path / "MT5_GBPUSD_H4_data.csv")
+    assert download(path, Interrupted(5)) is None
+    assert not os.path.exists(path)
+    #a page half written when it stopped
+    with open(path + ".part", "ab") as f:
+        f.write(b"2023-11-01 00:00:00,1.2")
+
+    assert download(path, mt5_data_export.Mt5Source()) == 120
+    assert "resuming from" in capsys.readouterr().out
+    assert read(path) == read(reference)
+    assert cache_columns(path) == cache_columns(reference)
+    assert not os.path.exists(path + ".progress.json")
+
+def test_resume_needs_the_same_range(fake, tmp_path, capsys):
+    path = str(tmp_path / "MT5_GBPUSD_H4_data.csv")
+    assert download(path, Interrupted(3)) is None
+    capsys.readouterr()
+
+    #asked for 10 days now - the 20 day progress must not be reused
+    assert download(path, mt5_data_export.Mt5Source(), days=10) == 60
+    out = capsys.readouterr().out
+    assert "resuming from" not in out and "another range" in out
+
+def test_empty_range_leaves_nothing_to_resume(fake, tmp_path, capsys):
+    path = str(tmp_path / "MT5_GBPUSD_H4_data.csv")
+    fake.until = T - 40 * 86400
+    assert download(path, mt5_data_export.Mt5Source()) is None
+    assert [n for n in os.listdir(tmp_path) if n.startswith("MT5_")] == []
+    cache_dir = data_cache.cache_dir_for(path)
+    assert not [n for n in os.listdir(cache_dir) if n.endswith(".download")]
+
+    #bars show up - the next call downloads the whole range instead of resuming past it
+    fake.until = T
+    assert download(path, mt5_data_export.Mt5Source()) == 120
+    assert "resuming from" not in capsys.readouterr().out
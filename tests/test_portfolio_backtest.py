@@ -0,0 +1,19 @@
+#test_portfolio_backtest.py
+#Portfolio runs over exports that hold no bars
+
+import pytest
+
+from portfolio_backtest import run_portfolio
+from test_cost_sensitivity import synthetic_data
+
+def test_empty_feed_is_skipped():
+    data = synthetic_data(3000, 1)
+    empty = {name: values[:0] for name, values in data.items()}
+
+    result = run_portfolio({"A": data, "E": empty})
+    assert result["empty"] == ["E"]
+    assert list(result["symbols"]) == ["A"]
+    assert result["final_value"] == run_portfolio({"A": data})["final_value"]
+
+    with pytest.raises(ValueError):
+        run_portfolio({"E": empty})
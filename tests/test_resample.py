@@ -0,0 +1,35 @@
+#test_resample.py
+#D1 bars around the weekend gap
+
+import numpy as np
+
+from resample import resample_all
+
+H = 3600
+FRIDAY = 1_704_412_800  # 2024-01-05 00:00 UTC
+SUNDAY = FRIDAY + 2 * 86400
+MONDAY = FRIDAY + 3 * 86400
+
+def m1_bars(*ranges):
+    """M1 column arrays over the given [start, end) epoch second ranges, price = bar number"""
+    times = np.concatenate([np.arange(start, end, 60, dtype=np.int64) for start, end in ranges])
+    price = np.arange(len(times), dtype=np.float64)
+    return {"time": times, "open": price, "high": price + 0.5, "low": price - 0.5, "close": price,
+            "volume": np.ones(len(times))}
+
+def test_negative_offset_keeps_friday_late_session_on_friday():
+    #Friday until 22:00, Sunday open at 22:00 and Monday - a -3h offset pushes Friday 21:00+ past midnight
+    m1 = m1_bars((FRIDAY + 18 * H, FRIDAY + 22 * H), (SUNDAY + 22 * H, SUNDAY + 24 * H), (MONDAY, MONDAY + 2 * H))
+    d1 = resample_all(m1, ["D1"], session_offset=-3 * H)["D1"]
+
+    friday = (m1["time"] < SUNDAY)
+    assert list(d1["time"]) == [FRIDAY - 3 * H, MONDAY - 3 * H]
+    assert list(d1["volume"]) == [friday.sum(), (~friday).sum()]
+    assert d1["close"][0] == m1["close"][friday][-1]
+    assert d1["open"][1] == m1["open"][~friday][0]
+
+def test_sunday_session_folds_into_monday():
+    m1 = m1_bars((FRIDAY + 20 * H, FRIDAY + 22 * H), (SUNDAY + 22 * H, SUNDAY + 24 * H), (MONDAY, MONDAY + H))
+    d1 = resample_all(m1, ["D1"])["D1"]
+    assert list(d1["time"]) == [FRIDAY, MONDAY]
+    assert list(d1["volume"]) == [120, 180]
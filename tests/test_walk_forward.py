@@ -0,0 +1,19 @@
+#test_walk_forward.py
+#Which parameter set a train window keeps
+
+from fast_backtest import run_fast_backtest
+from param_sweep import param_grid, summarize
+from test_cost_sensitivity import synthetic_data
+from walk_forward import optimize
+
+CONFIG = dict(cash=100000.0, commission=0.0001, slippage=0.00005)
+
+def test_optimize_ranks_lower_is_better_metrics_ascending():
+    data = synthetic_data(6000, 3)
+    grid = param_grid(pfast=[3, 5, 8], pslow=[10, 20, 30])
+    drawdowns = [summarize(run_fast_backtest(data, p, **CONFIG), CONFIG["cash"])["max_drawdown"] for p in grid]
+
+    params, row = optimize(data, grid, CONFIG, "max_drawdown", ascending=True)
+    assert row["max_drawdown"] == min(drawdowns)
+    params, row = optimize(data, grid, CONFIG, "max_drawdown")
+    assert row["max_drawdown"] == max(drawdowns)
@@ -0,0 +1,105 @@
+#test_watch_scheduler.py
+#Claims shared by several schedulers on one in_use folder
+
+import os
+import time
+from concurrent.futures import Future
+
+import pytest
+
+import watch_scheduler
+from watch_scheduler import abandoned_claims, claim, hand_back, move_unique, owner_file, refresh
+
+NAME = "MT5_GBPUSD_H4_data.csv"
+
+@pytest.fixture
+def folders(tmp_path):
+    data_dir = tmp_path / "data_save"
+    in_use = data_dir / "in_use"
+    in_use.mkdir(parents=True)
+    (data_dir / NAME).write_text("export")
+    return str(data_dir), str(in_use)
+
+def age(path, seconds):
+    old = time.time() - seconds
+    os.utime(owner_file(path), (old, old))
+
+def test_only_one_scheduler_claims_an_export(folders):
+    data_dir, in_use = folders
+    first = claim(os.path.join(data_dir, NAME), in_use, "a:1")
+    assert first == os.path.join(in_use, NAME)
+    assert claim(os.path.join(data_dir, NAME), in_use, "b:2") is None
+    with open(owner_file(first)) as f:
+        assert f.read() == "a:1"
+
+    #a new export of the same name waits until the running one is done
+    with open(os.path.join(data_dir, NAME), "w") as f:
+        f.write("newer export")
+    assert claim(os.path.join(data_dir, NAME), in_use, "b:2") is None
+
+def test_live_claims_are_not_recovered(folders):
+    data_dir, in_use = folders
+    path = claim(os.path.join(data_dir, NAME), in_use, "a:1")
+    assert abandoned_claims(in_use, lease=60) == []
+
+    age(path, 120)
+    refresh([path])
+    assert abandoned_claims(in_use, lease=60) == []
+
+def test_abandoned_claim_is_handed_back(folders):
+    data_dir, in_use = folders
+    path = claim(os.path.join(data_dir, NAME), in_use, "a:1")
+    age(path, 120)
+
+    assert abandoned_claims(in_use, lease=60) == [path]
+    assert hand_back(path, data_dir) == os.path.join(data_dir, NAME)
+    assert os.listdir(in_use) == []
+    assert claim(os.path.join(data_dir, NAME), in_use, "b:2") == path
+
+def test_move_unique_of_a_moved_export(folders, tmp_path):
+    data_dir, in_use = folders
+    path = claim(os.path.join(data_dir, NAME), in_use, "a:1")
+    archive = str(tmp_path / "archive")
+    assert move_unique(path, archive) == os.path.join(archive, NAME)
+    assert move_unique(path, archive) is None
+
+class InlinePool:
+    """ProcessPoolExecutor stand-in running each task as it is submitted"""
+
+    def __init__(self, max_workers=None, initializer=None):
+        pass
+
+    def submit(self, func, *args):
+        future = Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+def test_scheduler_leaves_other_claims_alone(folders, tmp_path, monkeypatch):
+    data_dir, in_use = folders
+    other = claim(os.path.join(data_dir, NAME), in_use, "elsewhere:1")
+    stale = os.path.join(in_use, "MT5_EURUSD_H4_data.csv")
+    with open(stale, "w") as f:
+        f.write("export")
+    with open(owner_file(stale), "w") as f:
+        f.write("gone:2")
+    age(stale, 120)
+
+    ran = []
+    def fake_backtest(data_file, results_dir, cache=True):
+        ran.append(os.path.basename(data_file))
+        return None
+    monkeypatch.setattr(watch_scheduler, "ProcessPoolExecutor", InlinePool)
+    monkeypatch.setattr(watch_scheduler, "run_backtest_job", fake_backtest)
+
+    counts = watch_scheduler.run_scheduler(data_dir, str(tmp_path / "results"), workers=1, once=True,
+                                           settle=0, poll=0.01, dashboards=False)
+    assert ran == ["MT5_EURUSD_H4_data.csv"]
+    assert counts == {"archived": 1, "failed": 0}
+    assert os.path.exists(other) and os.path.exists(owner_file(other))
+    assert not os.path.exists(owner_file(stale))
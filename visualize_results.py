@@ -1,57 +1,78 @@
 #visualize_results.py
-import matplotlib.pyplot as plt
-import pandas as pd
 import numpy as np
+import argparse
 import os
-from datetime import datetime, timedelta
-from sma_backtest import SmaCrossStrategy # importing sma strategy
-import backtrader as bt
-import shutil
-
-def create_performance_dashboard(strat, results):
+from datetime import datetime
+from backtest_results import load_results, results_path # saved by sma_backtest.py - no backtrader needed here
+import profiling
+from config import load_config
+from monte_carlo import run_monte_carlo
+from metrics import drawdown_series
+
+def create_performance_dashboard(results, out_dir=".", show=True):
     """
-    Creates a professional performance dashboard from backtest results
+    Creates a professional performance dashboard from saved backtest results
+    saved as performance_dashboard_<symbol>_<timeframe>.png in out_dir, returns the image path
     """
+    import matplotlib.pyplot as plt
 
     #create figure with subplots
     plt.figure(figsize=(16,12))
 
-    symbol = getattr(strat, "symbol", "unknown")
-    timeframe = getattr(strat, "timeframe", "unknown")
+    symbol = results.get("symbol", "unknown")
+    timeframe = results.get("timeframe", "unknown")
     plt.suptitle(f"Algorithmic Trading Performance Dashboard\n{symbol} - {timeframe}", fontsize=16, fontweight="bold")
 
     #plot 1: Equity Curve
     plt.subplot(3, 2, 1)
-    plot_equity_curve(strat)
+    with profiling.phase("equity_curve"):
+        plot_equity_curve(results)
 
     #plot 2: Drawdown
     plt.subplot(3, 2, 2)
-    plot_drawdown(strat)
+    with profiling.phase("drawdown"):
+        plot_drawdown(results)
 
     #plot 3: Trade Analysis
     plt.subplot(3, 2, 3)
-    plot_trade_analysis(strat)
+    with profiling.phase("trade_analysis"):
+        plot_trade_analysis(results)
 
     #plot 4: Monthly Returns
     plt.subplot(3, 2, 4)
-    plot_monthly_returns(strat)
-
-    plt.tight_layout()
-    plt.savefig(f"performance_dashboard_{symbol}_{timeframe}.png", dpi=300, bbox_inches="tight")
-    plt.show()
+    with profiling.phase("monthly_returns"):
+        plot_monthly_returns(results)
+
+    #plot 5: Monte Carlo
+    plt.subplot(3, 2, 5)
+    with profiling.phase("monte_carlo"):
+        plot_monte_carlo(results)
+
+    image = os.path.join(out_dir, f"performance_dashboard_{symbol}_{timeframe}.png")
+    with profiling.phase("savefig"):
+        plt.tight_layout()
+        plt.savefig(image, dpi=300, bbox_inches="tight")
+    if show:
+        with profiling.phase("show_window"):
+            plt.show()
+    else:
+        #headless (watch_scheduler.py) - free the figure, a long running worker draws many
+        plt.close("all")
+    return image
 
 ####################################################################################
 
 def find_data_file():
     """Automatically find the most recent MT5 data file"""
     try:
-        # Look in the data_save directory for the most recent file
-        --- USER SETUP: Change this path to your desired data directory ---
-        data_dir = "c:\\Users\\Tshepo\\Desktop\\Trading_Backtesting_Project\\data_save\\in_use"
+        # Look in the in_use directory (where sma_backtest.py moved it) for the most recent file
+        #--- USER SETUP: in_use_dir in backtest_config.json (see config.py) ---
+        data_dir = load_config()["in_use_dir"]
         all_files = [f for f in os.listdir(data_dir) if f.startswith('MT5_') and f.endswith('_data.csv')]
         
         if not all_files:
             # Fallback: check current directory
+            data_dir = "."
             all_files = [f for f in os.listdir('.') if f.startswith('MT5_') and f.endswith('_data.csv')]
             if not all_files:
                 print("Error: No data file found!")
@@ -75,22 +96,33 @@ def find_data_file():
 
 ####################################################################################
 
-def plot_equity_curve(strat):
-    """Plot actual equity curve from strat """
+def equity_axis(results, equity_data):
+    """Bar timestamps for the x axis when they were recorded, plain bar numbers otherwise"""
+    import pandas as pd
+
+    times = results.get("equity_time", [])
+    if len(times) == len(equity_data):
+        return pd.to_datetime(times, unit="s"), "Date"
+    return np.arange(len(equity_data)), "Time (Bars)"
+
+def plot_equity_curve(results):
+    """Plot actual equity curve from the saved results """
+    import matplotlib.pyplot as plt
+
     #check if strategy recorded equity data
     try:
-        if hasattr(strat, "equity") and strat.equity:
-            equity_data = strat.equity
+        if len(results.get("equity", [])):
+            equity_data = results["equity"]
             print(f"Plotting {len(equity_data)} equity points...")
         else:
-            final_value = strat.broker.getvalue()
-            equity_data = [10000, final_value]
+            equity_data = [results["start_cash"], results["final_value"]]
             print("Using simplified equity curve (enable recording in strategy)")
 
         #create plot
-        plt.plot(equity_data, linewidth=2, color="blue", alpha=0.7)
+        x, xlabel = equity_axis(results, equity_data)
+        plt.plot(x, equity_data, linewidth=2, color="blue", alpha=0.7)
         plt.title("Equity Curve", fontweight="bold")
-        plt.xlabel("Time (Bars)")
+        plt.xlabel(xlabel)
         plt.ylabel("Portfolio Value ($)")
         plt.grid(True, alpha=0.3)
         
@@ -117,31 +149,30 @@ def plot_equity_curve(strat):
 
 ####################################################################################
 
-def plot_drawdown(strat):
+def plot_drawdown(results):
     """Plot portfolio drawdown overtime"""
+    import matplotlib.pyplot as plt
+
     try:
-        if not hasattr(strat, "equity") or not strat.equity:
+        if not len(results.get("equity", [])):
             plt.text(0.5, 0.5, "Drawdown data not available\nEnable equity recording staregy",
                      transform=plt.gca().transAxes, ha="center", va="center")
             plt.title("Drawdown - Data Required", fontweight="bold")
             return
         
-        equity_data = strat.equity
-        equity_array = np.array(equity_data)
+        equity_data = results["equity"]
 
-        #calc running max equity(peak)
-        running_max = np.maximum.accumulate(equity_data)
-
-        #calc drawdown in percentage
-        drawdown_pct = (equity_array - running_max) / running_max * 100
+        #drawdown in percentage from the running peak
+        drawdown_pct = drawdown_series(equity_data)
 
         #create plot
-        plt.fill_between(range(len(drawdown_pct)), drawdown_pct, 0,
+        x, xlabel = equity_axis(results, equity_data)
+        plt.fill_between(x, drawdown_pct, 0,
                          color="red", alpha=0.3, label="Drawdown")
-        plt.plot(drawdown_pct, color="darkred", linewidth=1.5, alpha=0.5)
+        plt.plot(x, drawdown_pct, color="darkred", linewidth=1.5, alpha=0.5)
 
         plt.title("Portfolio Dradown", fontweight="bold")
-        plt.xlabel("Time (bars)")
+        plt.xlabel(xlabel)
         plt.ylabel("Drawdown (%)")
         plt.grid(True, alpha=0.3)
 
@@ -167,16 +198,17 @@ def plot_drawdown(strat):
 
 
 ###################################################################################
-def plot_trade_analysis(strat):
+def plot_trade_analysis(results):
     """Plot trade performance stats"""
+    import matplotlib.pyplot as plt
+
     try:
-        if not hasattr(strat, "analyzers") or not strat.analyzers.ta:
+        ta = results.get("analyzers", {}).get("ta")
+        if not ta:
             plt.text(0.5, 0.5, "Trade data not available\nRun backtest with TradeAnalyzer",
                      transform=plt.gca().transAxes, ha='center', va='center')
             plt.title("Trade Analysis - Data Required", fontweight="bold")
             return
-    
-        ta = strat.analyzers.ta.get_analysis()
 
         total_trades = ta.get("total", {}).get("total", 0)
         winning_trades = ta.get("won", {}).get("total", 0)
@@ -222,31 +254,29 @@ def plot_trade_analysis(strat):
 
 ###################################################################################
 
-def plot_monthly_returns(strat):
+def plot_monthly_returns(results):
     """Plot calendar heatmap of monthly returns"""
+    import matplotlib.pyplot as plt
+    import pandas as pd
+
     try:
-        if not hasattr(strat, "equity") or not strat.equity:
+        if not len(results.get("equity", [])):
             plt.text(0.5, 0.5, "Equity data not available\nEnable equity recording in strategy",
                     transform=plt.gca().transAxes, ha="center", va="center")
             plt.title("Monthly Returns - Data Required", fontweight="bold")
             return
         
-        equity_data = strat.equity
-
-        df = pd.DataFrame({"equity": equity_data})
-        
-        #dates for heatmap
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=365)
-        df["date"] = pd.date_range(start=start_date, end=end_date, periods=len(equity_data))[:len(equity_data)]
-        df.set_index("date", inplace=True)
-
-        df["returns"] = df["equity"].pct_change()
+        #one equity point per bar, indexed by the real bar times
+        equity = pd.Series(results["equity"], index=pd.to_datetime(results["equity_time"], unit="s"))
 
-        monthly_returns = df["returns"].resample("M").apply(lambda x: (1 + x).prod() - 1)
+        #month on month change of the month end equity (first month against the starting equity)
+        month_end = equity.groupby(equity.index.to_period("M")).last()
+        previous = month_end.shift(1)
+        previous.iloc[0] = equity.iloc[0]
+        monthly_returns = month_end / previous - 1
 
         monthly_returns_df = pd.DataFrame({
-            "returns": monthly_returns,
+            "returns": monthly_returns.values,
             "year": monthly_returns.index.year,
             "month": monthly_returns.index.month
         })
@@ -256,7 +286,7 @@ def plot_monthly_returns(strat):
             index="year",
             columns="month",
             aggfunc="mean"
-        )
+        ).reindex(columns=range(1, 13))  # keep all 12 columns so months line up with the ticks
 
         #filter out future years that shouldnt exist in data
         current_year = datetime.now().year
@@ -286,70 +316,91 @@ def plot_monthly_returns(strat):
                  transform=plt.gca().transAxes, ha="center", va="center")
         plt.title("Monthly Returns - Error", fontweight="bold")
 
-##################################################################################
+###################################################################################
+
+def plot_monte_carlo(results, n_paths=10000):
+    """Plot the max drawdown spread over resampled trade sequences"""
+    import matplotlib.pyplot as plt
 
-def get_backtest_results():
-    """Load and run backtest for results"""
     try:
-        cerebro = bt.Cerebro()
-        cerebro.addstrategy(SmaCrossStrategy)
+        out = run_monte_carlo(results, n_paths=n_paths, seed=42)
+        if out is None:
+            plt.text(0.5, 0.5, "No closed trades to resample",
+                     transform=plt.gca().transAxes, ha="center", va="center")
+            plt.title("Monte Carlo - No Trades", fontweight="bold")
+            return
+        paths, summary = out
+
+        plt.hist(paths["max_drawdown"], bins=50, color="darkred", alpha=0.6)
+        plt.title(f"Monte Carlo Max Drawdown\n({summary['paths']} bootstrapped trade sequences)", fontweight="bold")
+        plt.xlabel("Max Drawdown (%)")
+        plt.ylabel("Paths")
+        plt.grid(True, alpha=0.3)
+
+        #the drawdown this run actually had, against the spread
+        if len(results.get("equity", [])):
+            actual_dd = np.min(drawdown_series(results["equity"]))
+            plt.axvline(actual_dd, color="black", linestyle="--", linewidth=2, label=f"This run {actual_dd:.2f}%")
+            plt.legend(loc="center left")
+
+        stats_text = "\n".join([
+            f"Median DD: {summary['max_drawdown'][50]:.2f}%",
+            f"5% worst DD: {summary['max_drawdown'][5]:.2f}%",
+            f"Median End: ${summary['final_equity'][50]:.2f}",
+            f"Chance of loss: {summary['prob_loss'] * 100:.1f}%",
+            f"Risk of ruin: {summary['risk_of_ruin'] * 100:.2f}%",
+        ])
+        plt.text(0.02, 0.95, stats_text, transform=plt.gca().transAxes, ha="left", va="top",
+                 bbox=dict(boxstyle="round", facecolor="white", alpha=0.8))
+
+    except Exception as e:
+        print(f"Error plotting monte carlo: {e}")
+        plt.text(0.5, 0.5, "Error running monte carlo",
+                 transform=plt.gca().transAxes, ha="center", va="center")
+        plt.title("Monte Carlo - Error", fontweight="bold")
+
+##################################################################################
 
+def load_backtest_results():
+    """Load the results sma_backtest.py saved for the most recent data file"""
+    try:
         data_file, symbol, timeframe = find_data_file()
         if data_file is None:
-            return None, None
-
-        print(f"Backtesting {symbol} on {timeframe} timeframe... wait tep u mug")      
-
-        data = bt.feeds.GenericCSVData(
-            dataname=data_file,  
-            dtformat=("%Y-%m-%d %H:%M:%S"),
-            timeframe=bt.TimeFrame.Minutes,
-            compression=15,
-            open=1,   #column 1: Open (0 based indexing: 0=date, 1=Open, 2=High, etc)
-            high=2,   #column 2: High
-            low=3,    #column 3: Low
-            close=4,  #column 4: Close
-            volume=5,    #column 5: Volume
-            openinterest=-1,   #no open interest column
-            reverse=False
-        )
-
-        cerebro.adddata(data)
-        cerebro.broker.setcash(100000.0)
-        cerebro.broker.setcommission(commission=0.0001)
-        cerebro.broker.set_slippage_perc(0.00005)
-        cerebro.addanalyzer(bt.analyzers.SharpeRatio, _name="sharpe_ratio")
-        cerebro.addanalyzer(bt.analyzers.DrawDown, _name="drawdown")
-        cerebro.addanalyzer(bt.analyzers.TradeAnalyzer, _name="ta")
-        cerebro.addanalyzer(bt.analyzers.Transactions, _name="txn")
-
-        print("Running backtest...")
-        results = cerebro.run()
-        strat = results[0]
-        print("Visualization Backtest Done")
-
-        #store symbol info in strategy for later use
-        strat.symbol = symbol
-        strat.timeframe = timeframe
-
-        return strat, results
+            return None
+
+        path = results_path(symbol, timeframe, load_config()["results_dir"])
+        if not os.path.exists(path):
+            print(f"No saved results at {path}")
+            return None
+
+        print(f"Loading {symbol} {timeframe} results from {path}...")
+        return load_results(path)
     
     except Exception as e:
-        print(f"Error running backtest: {e}")
-        return None, None
+        print(f"Error loading backtest results: {e}")
+        return None
                             
 ####################################################################################
 
-if __name__ == "__main__":
+def main(argv=None):
+    """Command line entry - dashboard of the latest backtest, saved next to its results"""
+    parser = argparse.ArgumentParser(description="Performance dashboard of the latest sma_backtest.py run")
+    parser.parse_args(argv)
+
     print("Generating Performance Dashboard...")
-    strat, results = get_backtest_results()
+    with profiling.phase("load_results"):
+        results = load_backtest_results()
 
-    if strat is not None and results is not None:
-        create_performance_dashboard(strat, results)
+    if results is not None:
+        with profiling.phase("dashboard"):
+            create_performance_dashboard(results, out_dir=load_config()["results_dir"])
         print("Dashboard saved with symbol/timeframe in filename!`")
+        if profiling.enabled():
+            profile_file = profiling.save(f"profile_dashboard_{results['symbol']}_{results['timeframe']}.json")
+            print(f"Profile saved to {profile_file}")
     else:
-        print("Please run mt5_data_export.py first to generate results!")
+        print("Please run mt5_data_export.py and sma_backtest.py first to generate results!")
         print("Then run this visualization tool.")
 
-        
-
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+#walk_forward.py
+#Walk-forward optimization for the SMA Crossover Strategy
+#split the data into train/test windows (rolling or anchored), pick the best parameters on each
+#train window, run them on the following unseen test window and stitch the out-of-sample equity
+#windows are independent so they run concurrently over one shared, loaded dataset
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import param_sweep
+from fast_backtest import TREND_PERIOD, VOLUME_PERIOD, load_ohlcv, run_fast_backtest
+from metrics import compute_metrics
+from param_sweep import param_grid, release_data, share_data, summarize
+
+####################################################################################
+
+def make_windows(n_bars, train_bars, test_bars, anchored=False):
+    """(train_start, train_end, test_start, test_end) bar ranges - rolling or anchored at bar 0"""
+    windows = []
+    train_start = 0
+    train_end = train_bars
+    while train_end + test_bars <= n_bars:
+        windows.append((train_start, train_end, train_end, train_end + test_bars))
+        train_end += test_bars
+        if not anchored:
+            train_start += test_bars
+    return windows
+
+def slice_data(data, start, end):
+    """Views of every column between two bars (no copies)"""
+    return {name: values[start:end] for name, values in data.items()}
+
+def warmup_bars(params):
+    """Bars before the first one the strategy can trade on"""
+    return max(max(params["pfast"], params["pslow"]) + 1, VOLUME_PERIOD, TREND_PERIOD) - 1
+
+def optimize(data, param_sets, config, rank_by="sharpe", ascending=False):
+    """Best parameter set on data - highest rank_by, lowest with ascending - returns (params, summary row)"""
+    best = None
+    for params in param_sets:
+        row = summarize(run_fast_backtest(data, params, **config), config["cash"])
+        score = row[rank_by]
+        if np.isnan(score):
+            continue
+        if best is None or (score < best[1][rank_by] if ascending else score > best[1][rank_by]):
+            best = (params, row)
+    return best
+
+def run_window(data, window, param_sets, config, rank_by="sharpe", ascending=False):
+    """Optimize on the train part of one window and evaluate the winner out of sample"""
+    train_start, train_end, test_start, test_end = window
+    best = optimize(slice_data(data, train_start, train_end), param_sets, config, rank_by, ascending)
+    if best is None:
+        return None
+    params, in_sample = best
+
+    #start early enough that the indicators are warm on the first test bar
+    start = max(0, test_start - warmup_bars(params))
+    result = run_fast_backtest(slice_data(data, start, test_end), params, **config)
+    offset = test_start - start
+    trades = result["trades"]
+    oos = {
+        "equity": result["equity"][offset:],
+        "time": result["time"][offset:],
+        "position": result["position"][offset:],
+        "trades": trades[trades["entry_idx"] >= offset],
+        "final_value": result["final_value"],
+    }
+
+    return {
+        "window": window,
+        "params": params,
+        "in_sample": in_sample,
+        "out_of_sample": summarize(oos, config["cash"]),
+        "equity": oos["equity"],
+        "time": oos["time"],
+        "position": oos["position"],
+        "pnls": oos["trades"]["pnlcomm"],
+    }
+
+def _run_window_task(args):
+    """Worker task - one window against the shared data"""
+    window, param_sets, rank_by, ascending = args
+    return run_window(param_sweep._worker_data, window, param_sets, param_sweep._worker_config, rank_by, ascending)
+
+####################################################################################
+
+def stitch_equity(window_results, cash):
+    """Chain each window's test equity so every window starts where the previous ended"""
+    capital = cash
+    times = []
+    curves = []
+    for res in window_results:
+        curve = res["equity"] / cash * capital
+        curves.append(curve)
+        times.append(res["time"])
+        capital = curve[-1]
+    if not curves:
+        return np.array([], dtype=np.int64), np.array([])
+    return np.concatenate(times), np.concatenate(curves)
+
+def parameter_stability(window_results):
+    """Per parameter: mean, std, coefficient of variation and share of windows on the most common value"""
+    table = pd.DataFrame([res["params"] for res in window_results])
+    rows = []
+    for name in table.columns:
+        values = table[name]
+        mean = values.mean()
+        rows.append({
+            "param": name,
+            "mean": mean,
+            "std": values.std(ddof=0),
+            "cv": values.std(ddof=0) / mean if mean else np.nan,
+            "mode_share": values.value_counts().iloc[0] / len(values),
+        })
+    return pd.DataFrame(rows)
+
+def walk_forward(data, param_sets, train_bars, test_bars, anchored=False, workers=None,
+                 cash=100000.0, commission=0.0001, slippage=0.00005, rank_by="sharpe", ascending=False):
+    """
+    Run the full walk-forward
+
+    Each train window keeps the parameter set with the highest rank_by, or the lowest with
+    ascending (max_drawdown, where smaller is better).
+    Returns a dict with the per-window table, parameter stability, the stitched
+    out-of-sample equity (time, equity) and its overall metrics.
+    """
+    if isinstance(data, (str, os.PathLike)):
+        data = load_ohlcv(data)
+
+    config = dict(cash=cash, commission=commission, slippage=slippage)
+    param_sets = [dict(p) for p in param_sets]
+    windows = make_windows(len(data["close"]), train_bars, test_bars, anchored)
+    workers = min(workers or os.cpu_count() or 1, max(len(windows), 1))
+    tasks = [(window, param_sets, rank_by, ascending) for window in windows]
+
+    if workers == 1:
+        results = [run_window(data, window, param_sets, config, rank_by, ascending) for window in windows]
+    else:
+        spec, blocks = share_data(data)
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=param_sweep._init_worker,
+                                     initargs=(spec, config)) as pool:
+                results = list(pool.map(_run_window_task, tasks))
+        finally:
+            release_data(blocks)
+
+    results = [res for res in results if res is not None]
+    times = data["time"]
+    rows = []
+    for i, res in enumerate(results):
+        train_start, train_end, test_start, test_end = res["window"]
+        row = {
+            "window": i,
+            "train_from": pd.to_datetime(times[train_start], unit="s"),
+            "test_from": pd.to_datetime(times[test_start], unit="s"),
+            "test_to": pd.to_datetime(times[test_end - 1], unit="s"),
+        }
+        row.update(res["params"])
+        row["is_" + rank_by] = res["in_sample"][rank_by]
+        row.update({"oos_" + k: v for k, v in res["out_of_sample"].items()})
+        rows.append(row)
+
+    oos_time, oos_equity = stitch_equity(results, cash)
+    overall = None
+    if len(oos_equity):
+        #trade P&L scaled like the window's equity in stitch_equity
+        pnls = []
+        capital = cash
+        for res in results:
+            pnls.append(res["pnls"] * capital / cash)
+            capital = res["equity"][-1] / cash * capital
+        overall = compute_metrics(oos_equity, oos_time, np.concatenate(pnls),
+                                  np.concatenate([res["position"] for res in results]), cash)
+
+    return {
+        "windows": pd.DataFrame(rows),
+        "stability": parameter_stability(results) if results else pd.DataFrame(),
+        "oos_time": oos_time,
+        "oos_equity": oos_equity,
+        "oos_metrics": overall,
+    }
+
+####################################################################################
+
+def _parse_list(text, cast):
+    return [cast(x) for x in text.split(",") if x.strip()]
+
+if __name__ == "__main__":
+    from config import load_config
+
+    parser = argparse.ArgumentParser(description="Walk-forward optimization for SmaCrossStrategy")
+    parser.add_argument("data_file", help="MT5_<symbol>_<tf>_data.csv export")
+    parser.add_argument("--train-bars", type=int, required=True)
+    parser.add_argument("--test-bars", type=int, required=True)
+    parser.add_argument("--anchored", action="store_true", help="grow the train window from bar 0 instead of rolling it")
+    parser.add_argument("--pfast", default="3,5,8")
+    parser.add_argument("--pslow", default="10,20,30")
+    parser.add_argument("--stop-loss-pct", default="0.15")
+    parser.add_argument("--take-profit-pct", default="0.35")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--rank-by", default="sharpe")
+    args = parser.parse_args()
+
+    grid = param_grid(
+        pfast=_parse_list(args.pfast, int),
+        pslow=_parse_list(args.pslow, int),
+        stop_loss_pct=_parse_list(args.stop_loss_pct, float),
+        take_profit_pct=_parse_list(args.take_profit_pct, float),
+    )
+    settings = load_config()
+    report = walk_forward(args.data_file, grid, args.train_bars, args.test_bars, anchored=args.anchored,
+                          workers=args.workers, cash=settings["cash"], commission=settings["commission"],
+                          slippage=settings["slippage"], rank_by=args.rank_by,
+                          ascending=args.rank_by == "max_drawdown")
+
+    print("=" * 50)
+    print("WALK-FORWARD WINDOWS")
+    print("=" * 50)
+    print(report["windows"].to_string())
+    print("\nPARAMETER STABILITY")
+    print(report["stability"].to_string())
+    print("\nOUT-OF-SAMPLE")
+    print(report["oos_metrics"])
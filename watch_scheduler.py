@@ -0,0 +1,335 @@
+#watch_scheduler.py
+#Long running scheduler for the data_save -> in_use -> archive pipeline
+#watches data_save for new MT5_*_data.csv exports, claims each one into in_use (atomically, so two
+#schedulers never take the same file), runs its backtest and then its dashboard on a process pool
+#with a concurrency limit, and moves it to archive once both are done - no manual steps, a nightly
+#batch of exports goes through as fast as the workers allow
+#
+#each claim has an in_use/<export>.owner file naming its scheduler (host:pid), refreshed while the
+#scheduler runs - an export whose owner file has gone stale belongs to a scheduler that died and is
+#handed back to data_save to be claimed again, claims of running schedulers are never touched
+#
+#every export gets a log (the strategy's prints) next to its results artifact and dashboard in
+#the results directory; an export whose backtest fails is moved to data_save/failed instead
+#folders and the broker setup come from backtest_config.json (config.py)
+#
+#python watch_scheduler.py --workers 4            (keeps watching, Ctrl+C to stop)
+#python watch_scheduler.py --workers 4 --once     (process what is there now and exit)
+
+import argparse
+import os
+import signal
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from config import load_config
+
+#an export has to sit unchanged this many seconds before it is claimed (MT5 may still be writing it)
+SETTLE_SECONDS = 5.0
+
+#seconds between scans of data_save
+POLL_SECONDS = 2.0
+
+#seconds a claim stays valid without its scheduler refreshing the owner file
+CLAIM_LEASE_SECONDS = 60.0
+
+####################################################################################
+
+def is_export(name):
+    return name.startswith("MT5_") and name.endswith("_data.csv")
+
+def pending_exports(data_dir, settle=SETTLE_SECONDS):
+    """Exports in data_dir (not its sub folders) that nobody has written to for settle seconds, oldest first"""
+    found = []
+    now = time.time()
+    try:
+        entries = list(os.scandir(data_dir))
+    except FileNotFoundError:
+        return found
+    for entry in entries:
+        if not (entry.is_file() and is_export(entry.name)):
+            continue
+        try:
+            mtime = entry.stat().st_mtime
+        except FileNotFoundError:
+            continue  # claimed by another scheduler meanwhile
+        if now - mtime >= settle:
+            found.append((mtime, entry.path))
+    return [path for _, path in sorted(found)]
+
+def owner_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def owner_file(path):
+    """Sidecar naming the scheduler that claimed the export at path"""
+    return path + ".owner"
+
+def _move_exclusive(path, target):
+    """
+    Move path to target unless target exists, True when this call moved it
+
+    link + unlink rather than a rename: the link fails if the name is already taken, where a
+    rename would overwrite it, and only one of two processes racing for the file can link it.
+    """
+    try:
+        os.link(path, target)
+    except (FileExistsError, FileNotFoundError):
+        return False  # name taken, or another scheduler got there first
+    except OSError:
+        #file systems without hard links - fall back to a plain rename
+        if os.path.exists(target):
+            return False
+        try:
+            os.rename(path, target)
+        except FileNotFoundError:
+            return False
+        return True
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    return True
+
+def claim(path, in_use_dir, owner=None):
+    """
+    Move an export into in_use, returns its new path or None when it can't be claimed now
+
+    The owner file is created first and exclusively, so it exists for as long as the export is in
+    in_use. The claim fails if the name is already there (an earlier export of the same
+    symbol/timeframe still running).
+    """
+    target = os.path.join(in_use_dir, os.path.basename(path))
+    try:
+        fd = os.open(owner_file(target), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return None
+    with os.fdopen(fd, "w") as f:
+        f.write(owner or owner_id())
+    if not _move_exclusive(path, target):
+        release(target)
+        return None
+    return target
+
+def release(path):
+    """Drop the claim on an export that has left in_use"""
+    try:
+        os.remove(owner_file(path))
+    except FileNotFoundError:
+        pass
+
+def refresh(paths):
+    """Renew this scheduler's claims on paths"""
+    for path in paths:
+        try:
+            os.utime(owner_file(path))
+        except FileNotFoundError:
+            pass
+
+def is_abandoned(path, lease=CLAIM_LEASE_SECONDS):
+    """True when the export at path has no owner file, or one its scheduler stopped refreshing"""
+    try:
+        return time.time() - os.stat(owner_file(path)).st_mtime > lease
+    except FileNotFoundError:
+        return True
+
+def abandoned_claims(in_use_dir, lease=CLAIM_LEASE_SECONDS):
+    """Exports in in_use whose scheduler is gone"""
+    try:
+        names = sorted(os.listdir(in_use_dir))
+    except FileNotFoundError:
+        return []
+    paths = [os.path.join(in_use_dir, name) for name in names if is_export(name)]
+    return [path for path in paths if is_abandoned(path, lease)]
+
+def hand_back(path, data_dir):
+    """Return a claimed export to data_dir so it is claimed like a new one, returns the new path or None"""
+    target = os.path.join(data_dir, os.path.basename(path))
+    if not _move_exclusive(path, target):
+        return None
+    release(path)
+    return target
+
+def move_unique(path, folder):
+    """Move path into folder, adding a timestamp to the name when it is already taken - None when path is already gone"""
+    os.makedirs(folder, exist_ok=True)
+    name = os.path.basename(path)
+    target = os.path.join(folder, name)
+    if os.path.exists(target):
+        stem, ext = os.path.splitext(name)
+        target = os.path.join(folder, f"{stem}_{time.strftime('%Y%m%dT%H%M%S')}{ext}")
+    try:
+        os.replace(path, target)
+    except FileNotFoundError:
+        return None  # moved by another scheduler
+    return target
+
+def _log_path(results_dir, data_file):
+    return os.path.join(results_dir, os.path.splitext(os.path.basename(data_file))[0] + ".log")
+
+####################################################################################
+
+def _init_worker():
+    #Ctrl+C is for the scheduler - it lets the running jobs finish rather than killing them
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def run_backtest_job(data_file, results_dir, cache=True):
+    """Worker task - backtest one export with the configured broker setup, save its artifact and index it, returns the artifact path"""
+    import contextlib
+
+    from backtest_results import results_path, save_results
+    from results_db import parse_export_name, save_backtest
+
+    symbol, timeframe = parse_export_name(data_file)
+    with open(_log_path(results_dir, data_file), "a") as log, contextlib.redirect_stdout(log):
+        import sma_backtest
+
+        print(f"Backtesting {symbol} on {timeframe} timeframe...")
+        settings = load_config()
+        results, _ = sma_backtest.backtest_export(data_file, symbol, timeframe, cache=cache, cash=settings["cash"],
+                                                  commission=settings["commission"], slippage=settings["slippage"])
+        print("Final Portfolio Value: $%.2f" % results["final_value"])
+        path = save_results(results, results_path(symbol, timeframe, results_dir))
+        try:
+            print(f"Run stored in results database as #{save_backtest(results, data_file)}")
+        except Exception as e:
+            print(f"Results database error: {e}")
+    return path
+
+def run_dashboard_job(data_file, results_file, results_dir):
+    """Worker task - draw the dashboard of a saved artifact without opening a window, returns the image path"""
+    import contextlib
+
+    import matplotlib
+    matplotlib.use("Agg")
+
+    from backtest_results import load_results
+    from visualize_results import create_performance_dashboard
+
+    with open(_log_path(results_dir, data_file), "a") as log, contextlib.redirect_stdout(log):
+        return create_performance_dashboard(load_results(results_file), out_dir=results_dir, show=False)
+
+####################################################################################
+
+def run_scheduler(data_dir=None, results_dir=None, workers=None, once=False,
+                  settle=SETTLE_SECONDS, poll=POLL_SECONDS, dashboards=True, cache=True, lease=CLAIM_LEASE_SECONDS):
+    """
+    Watch data_dir and push every export through backtest -> dashboard -> archive
+
+    data_dir and results_dir default to the configured folders. At most workers jobs run at a time.
+    Exports left in in_use by a scheduler that died go back to data_dir once their claim is lease
+    seconds old. Ctrl+C stops claiming, hands back the claims not started yet and returns once the
+    running jobs are done, with once it returns when data_dir is empty and all work is done.
+    Returns {"archived": n, "failed": n}.
+    """
+    settings = load_config()
+    if data_dir is None:
+        data_dir, in_use_dir, archive_dir = settings["data_save_dir"], settings["in_use_dir"], settings["archive_dir"]
+    else:
+        in_use_dir, archive_dir = os.path.join(data_dir, "in_use"), os.path.join(data_dir, "archive")
+    results_dir = results_dir or settings["results_dir"]
+    failed_dir = os.path.join(data_dir, "failed")
+    for folder in (in_use_dir, archive_dir, results_dir):
+        os.makedirs(folder, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+
+    owner = owner_id()
+    queue = []
+    running = {}  # future -> (stage, in_use path)
+    counts = {"archived": 0, "failed": 0}
+
+    stopping = []
+    def request_stop(signum, frame):
+        if not stopping:
+            print("Stopping - finishing the running jobs, nothing new is claimed")
+        stopping.append(signum)
+    previous_handler = signal.signal(signal.SIGINT, request_stop)
+
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+    try:
+        while True:
+            refresh(queue + [data_file for _, data_file in running.values()])
+
+            #claims of a scheduler that died go back to data_save and are claimed again below
+            if not stopping:
+                for path in abandoned_claims(in_use_dir, lease):
+                    if hand_back(path, data_dir) is not None:
+                        print(f"Recovered {os.path.basename(path)} from a stopped scheduler")
+
+            #claim only what the pool can start soon, leave the rest for other schedulers
+            if not stopping and len(queue) < workers:
+                for path in pending_exports(data_dir, settle):
+                    claimed = claim(path, in_use_dir, owner)
+                    if claimed is not None:
+                        print(f"Claimed {os.path.basename(path)}")
+                        queue.append(claimed)
+                    if len(queue) >= workers:
+                        break
+
+            while queue and len(running) < workers and not stopping:
+                data_file = queue.pop(0)
+                running[pool.submit(run_backtest_job, data_file, results_dir, cache)] = ("backtest", data_file)
+
+            if not running:
+                if once or stopping:
+                    return counts
+                time.sleep(poll)
+                continue
+
+            finished, _ = wait(running, timeout=poll, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, data_file = running.pop(future)
+                name = os.path.basename(data_file)
+                try:
+                    output = future.result()
+                except Exception as e:
+                    print(f"{name}: {stage} failed ({e}), see {_log_path(results_dir, data_file)}")
+                    if stage == "backtest":
+                        move_unique(data_file, failed_dir)
+                        release(data_file)
+                        counts["failed"] += 1
+                        continue
+                    output = None
+
+                if stage == "backtest" and dashboards:
+                    print(f"{name}: backtest done")
+                    running[pool.submit(run_dashboard_job, data_file, output, results_dir)] = ("dashboard", data_file)
+                    continue
+                if output is not None:
+                    print(f"{name}: {stage} done -> {output}")
+                archived = move_unique(data_file, archive_dir)
+                release(data_file)
+                if archived is None:
+                    print(f"{name}: already moved out of in_use, not archived")
+                    continue
+                print(f"{name}: archived to {archived}")
+                counts["archived"] += 1
+    finally:
+        for data_file in queue:
+            hand_back(data_file, data_dir)
+        pool.shutdown(wait=True)
+        signal.signal(signal.SIGINT, previous_handler)
+
+####################################################################################
+
+def main(argv=None):
+    """Command line entry - run the scheduler until Ctrl+C (or until idle with --once)"""
+    parser = argparse.ArgumentParser(description="Backtest and archive every MT5 export dropped into data_save")
+    parser.add_argument("--data-dir", default=None, help="the data_save folder to watch (default: from the config)")
+    parser.add_argument("--results-dir", default=None, help="where artifacts, dashboards and logs go (default: from the config)")
+    parser.add_argument("--workers", type=int, default=None, help="jobs running at once (default: CPU count)")
+    parser.add_argument("--once", action="store_true", help="process the exports there now, then exit")
+    parser.add_argument("--settle", type=float, default=SETTLE_SECONDS,
+                        help="seconds an export must be unchanged before it is claimed")
+    parser.add_argument("--no-dashboard", action="store_true", help="backtest and archive only")
+    parser.add_argument("--no-cache", action="store_true", help="always run cerebro, even for runs in the run cache")
+    args = parser.parse_args(argv)
+
+    print(f"Watching {args.data_dir or load_config()['data_save_dir']} ({args.workers or os.cpu_count()} workers)...")
+    start = time.perf_counter()
+    counts = run_scheduler(args.data_dir, args.results_dir, args.workers, args.once, args.settle,
+                           dashboards=not args.no_dashboard, cache=not args.no_cache)
+    print(f"{counts['archived']} exports archived, {counts['failed']} failed in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()